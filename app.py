@@ -169,6 +169,35 @@ def create_app(test_config: dict | None = None):
     if os.getenv("AUTO_CREATE_SCHEMA", "1") in ("1", "true", "yes", "on"):
         Base.metadata.create_all(engine, checkfirst=True)
 
+    # monthly audit_log partitions for this month and the next ones (PG only)
+    try:
+        from models.audit_archive import ensure_audit_partitions
+        ensure_audit_partitions()
+    except Exception:
+        app.logger.exception("Could not ensure audit_log partitions")
+
+    # default rate tiers (once per process; later reads come from the cache)
+    try:
+        from models.rates_store import seed_rates
+        seed_rates()
+    except Exception:
+        app.logger.exception("Could not seed default rates")
+
+    # one-off backfill of GL period balances for ledgers posted before them
+    try:
+        from services.gl_balances import ensure_account_balances
+        ensure_account_balances()
+    except Exception:
+        app.logger.exception("Could not backfill GL account balances")
+
+    # forum thread counters on databases created before them
+    # (search columns: scripts/rebuild_forum_counters.py --upgrade)
+    try:
+        from models.forum_store import ensure_thread_counter_columns
+        ensure_thread_counter_columns()
+    except Exception:
+        app.logger.exception("Could not ensure forum thread counters")
+
     with app.app_context():
         # seed admin (optional)
         admin_pwd = os.getenv("ADMIN_PASSWORD")
@@ -6,18 +6,23 @@ from models.gl import AccountingPeriod
 from services.accounting_export import run_formal_gl_export
 from services.gl_posting import close_period, reopen_period, post_service_accruals_for_period, bootstrap_periods
 from datetime import date, datetime, timezone
-from weasyprint import HTML
-from flask import current_app, flash, make_response
+from flask import make_response
 # add at top if not imported
-from models.billing_store import get_receipt_with_items, list_receipts, revert_receipt_to_pending
+from models.billing_store import get_receipt_summary, list_receipts, revert_receipt_to_pending
 from calendar import monthrange
 from services.forecast import build_daily_series, multi_horizon_forecast
-from services.accounting import derive_journal, trial_balance, income_statement, balance_sheet
+from services.forecast import build_daily_panel, forecast_panel
+from services.accounting import derive_journal, trial_balance
+from services.accounting import income_statement_from_tb, balance_sheet_from_tb
+from services.gl_balances import posted_trial_balance
 from flask import jsonify
 from datetime import timedelta
-from services.org_info import ORG_INFO, ORG_INFO_TH
+from services.invoice_pdf import render_invoice_pdf, schedule_invoice_pdfs
+from services.pdf_render import start_invoice_batch, pdf_batch_status, pdf_batch_zip_path
+from services.pdf_render import render_paged_pdf
 from services.pricing_sim import build_pricing_components, simulate_vs_current
 import io
+import os
 from datetime import date
 import pandas as pd
 from flask import Blueprint, render_template, request, redirect, url_for, Response
@@ -41,9 +46,8 @@ from services.metrics import (
 from datetime import date, timedelta
 import pandas as pd
 import json
-from services.datetimex import APP_TZ
 from models.tiers_store import load_overrides_dict
-from services.billing import classify_user_type
+from services.billing import effective_tiers
 from models.base import session_scope
 from models.schema import User
 from services.data_sources import fetch_jobs_with_fallbacks
@@ -56,6 +60,9 @@ from services.gl_posting import (
 
 admin_bp = Blueprint("admin", __name__)
 
+# journal lines shown on /admin/ledger (posted mode); the CSV has them all
+LEDGER_JOURNAL_PREVIEW_ROWS = int(os.getenv("LEDGER_JOURNAL_PREVIEW_ROWS", "500"))
+
 
 def _to_utc_day_end(ts_date: str) -> pd.Timestamp:
     """Inclusive day end in UTC (23:59:59)."""
@@ -151,9 +158,13 @@ def _collect_all_users_for_datalist(before_iso: str) -> list[str]:
 
 
 # controllers/admin.py  (ADD)
-def _load_posted_journal(start_iso: str, end_iso: str) -> pd.DataFrame:
-    """Read posted GL (gl_entries joined to gl_batches) for the window."""
-    from sqlalchemy import select
+def _load_posted_journal(start_iso: str, end_iso: str, limit: int | None = None) -> pd.DataFrame:
+    """
+    Read posted GL (gl_entries joined to gl_batches) for the window.
+    With `limit`, only the most recent `limit` lines (still in date order);
+    df.attrs["total_lines"] then holds the window's full line count.
+    """
+    from sqlalchemy import select, func
     from models.gl import JournalBatch, GLEntry
 
     def _to_utc_start(diso: str) -> datetime:
@@ -167,27 +178,41 @@ def _load_posted_journal(start_iso: str, end_iso: str) -> pd.DataFrame:
     start_utc = _to_utc_start(start_iso)
     end_utc = _to_utc_end_inclusive(end_iso)
 
+    q = (
+        select(
+            GLEntry.date,
+            GLEntry.ref,
+            GLEntry.memo,
+            GLEntry.account_id,
+            GLEntry.account_name,
+            GLEntry.account_type,
+            GLEntry.debit,
+            GLEntry.credit,
+        )
+        .join(JournalBatch, GLEntry.batch_id == JournalBatch.id)
+        .where(GLEntry.date >= start_utc, GLEntry.date <= end_utc)
+    )
+    total = None
     with session_scope() as s:
-        rows = s.execute(
-            select(
-                GLEntry.date,
-                GLEntry.ref,
-                GLEntry.memo,
-                GLEntry.account_id,
-                GLEntry.account_name,
-                GLEntry.account_type,
-                GLEntry.debit,
-                GLEntry.credit,
-            )
-            .join(JournalBatch, GLEntry.batch_id == JournalBatch.id)
-            .where(GLEntry.date >= start_utc, GLEntry.date <= end_utc)
-            .order_by(GLEntry.date, GLEntry.ref, GLEntry.account_id)
-        ).all()
+        if limit:
+            # the full count rides along as a window count
+            rows = s.execute(
+                q.add_columns(func.count().over())
+                .order_by(GLEntry.date.desc(), GLEntry.ref.desc(),
+                          GLEntry.account_id.desc()).limit(limit)
+            ).all()[::-1]
+            total = rows[0][-1] if rows else 0
+            rows = [r[:-1] for r in rows]
+        else:
+            rows = s.execute(
+                q.order_by(GLEntry.date, GLEntry.ref, GLEntry.account_id)
+            ).all()
 
     df = pd.DataFrame(rows, columns=[
         "date", "ref", "memo", "account_id", "account_name",
         "account_type", "debit", "credit"
     ])
+    df.attrs["total_lines"] = len(df) if total is None else int(total)
     if df.empty:
         return df
     # Pretty dates + numeric safety
@@ -843,14 +868,11 @@ def admin_form():
             usernames = sorted((db_map.get(k) or job_map.get(
                 k) or ov_map.get(k) or k) for k in keys)
 
-            def current_tier_for(u: str) -> str:
-                t = ov.get(u.strip().lower())
-                return t if t else classify_user_type(u)
-
+            tiers_now = effective_tiers(usernames, ov)
             tier_rows = [
-                {"username": u, "tier": current_tier_for(
-                    u), "overridden": (u.strip().lower() in ov)}
-                for u in usernames
+                {"username": u, "tier": t,
+                    "overridden": (u.strip().lower() in ov)}
+                for u, t in zip(usernames, tiers_now)
             ]
 
             return render_template(
@@ -947,6 +969,7 @@ def mark_paid(rid: int):
     ok = mark_receipt_paid(rid, current_user.username)
     if ok:
         RECEIPT_MARKED_PAID.labels(actor_type="admin").inc()
+        schedule_invoice_pdfs(rid)
         try:
             gl_ok = post_receipt_paid(rid, current_user.username)
             audit("gl.payment.result", target_type="receipt", target_id=str(rid),
@@ -1047,6 +1070,7 @@ def create_self_receipt():
     rid, total, _ = create_receipt_from_rows(
         current_user.username, start_d, end_d, df.to_dict(orient="records"))
     RECEIPT_CREATED.labels(scope="admin").inc()
+    schedule_invoice_pdfs(rid)
 
     # NEW: post issuance to GL (idempotent)
     try:
@@ -1166,12 +1190,15 @@ def ledger_page():
     mode = (request.args.get("mode") or "posted").strip().lower()
     if mode == "derived":
         j = derive_journal(start_q, end_q)  # preview, ignores locks
+        tb = trial_balance(j)
     else:
-        # authoritative, respects locks
-        j = _load_posted_journal(start_q, end_q)
-    tb = trial_balance(j)
-    pnl = income_statement(j)
-    bs = balance_sheet(j)
+        # authoritative, respects locks; totals come from period balances,
+        # the journal table only shows the latest lines (full set via CSV)
+        j = _load_posted_journal(
+            start_q, end_q, limit=LEDGER_JOURNAL_PREVIEW_ROWS)
+        tb = posted_trial_balance(start_q, end_q)
+    pnl = income_statement_from_tb(tb)
+    bs = balance_sheet_from_tb(tb)
 
     # ---- new: paid receipts within window + safety flags ----
     def _to_utc_start(diso: str) -> datetime:
@@ -1315,6 +1342,7 @@ def ledger_page():
         "admin/ledger.html",
         start=start_q, end=end_q,
         journal=j.to_dict(orient="records"),
+        journal_total=j.attrs.get("total_lines", len(j)),
         tb=tb.to_dict(orient="records"),
         tb_meta=tb_meta,
         pnl=pnl.to_dict(orient="records")[0] if not pnl.empty else {
@@ -1473,6 +1501,21 @@ def save_tiers():
     return redirect(url_for("admin.admin_form", section="tiers"))
 
 
+def _costed_training_window(before: str, train_days: int) -> pd.DataFrame:
+    """Costed jobs ending in the train_days up to and including `before`."""
+    start_d = (date.fromisoformat(before) -
+               timedelta(days=train_days-1)).isoformat()
+    raw_df, _, _ = fetch_jobs_with_fallbacks(start_d, before)
+    costed = compute_costs(raw_df)
+
+    if "End" in costed.columns:
+        end_series = pd.to_datetime(costed["End"], errors="coerce", utc=True)
+        cutoff_utc = _to_utc_day_end(before)
+        costed = costed[end_series.notna() & (end_series <= cutoff_utc)].copy()
+        costed["End"] = end_series
+    return costed
+
+
 @admin_bp.get("/admin/forecast.json")
 @login_required
 @admin_required
@@ -1492,23 +1535,13 @@ def forecast_json():
     except Exception:
         return jsonify({"error": "bad parameters"}), 400
 
-    start_d = (date.fromisoformat(before) -
-               timedelta(days=train_days-1)).isoformat()
-    raw_df, _, _ = fetch_jobs_with_fallbacks(start_d, before)
-    costed = compute_costs(raw_df)
-
-    if "End" in costed.columns:
-        end_series = pd.to_datetime(costed["End"], errors="coerce", utc=True)
-        cutoff_utc = _to_utc_day_end(before)
-        costed = costed[end_series.notna() & (end_series <= cutoff_utc)].copy()
-        costed["End"] = end_series
-
+    costed = _costed_training_window(before, train_days)
     daily = build_daily_series(
         costed, metric=metric, end_date=before, train_days=train_days)
     if daily.empty:
         return jsonify({"metric": metric, "history": {"labels": [], "values": []}, "forecasts": {}}), 200
 
-    f = multi_horizon_forecast(daily, horizons=(30, 60, 90))
+    f = multi_horizon_forecast(daily, horizons=(30, 60, 90), metric=metric)
     return jsonify({
         "metric": metric,
         "history": {"labels": f.history_labels, "values": f.history_values},
@@ -1516,6 +1549,45 @@ def forecast_json():
     }), 200
 
 
+@admin_bp.get("/admin/forecast_panel.json")
+@login_required
+@admin_required
+def forecast_panel_json():
+    """
+    Forecasts for every metric, split per tier and per top user, from one
+    ingest of the training window.
+    Query:
+      ?before=YYYY-MM-DD              (default: today)
+      ?train_days=180                 (default: 180)
+      ?top_users=5                    (default: FORECAST_PANEL_TOP_USERS)
+    """
+    try:
+        before = (request.args.get("before")
+                  or date.today().isoformat()).strip()
+        date.fromisoformat(before)
+        train_days = int(request.args.get("train_days") or 180)
+        top_users = request.args.get("top_users")
+        top_users = int(top_users) if top_users else None
+    except Exception:
+        return jsonify({"error": "bad parameters"}), 400
+
+    costed = _costed_training_window(before, train_days)
+    panel = build_daily_panel(costed, end_date=before,
+                              train_days=train_days, top_users=top_users)
+    results = forecast_panel(panel, horizons=(30, 60, 90))
+    return jsonify({
+        "before": before,
+        "train_days": train_days,
+        "series": {
+            name: {
+                "history": {"labels": f.history_labels, "values": f.history_values},
+                "forecasts": {str(k): v for k, v in f.horizons.items()},
+            }
+            for name, f in results.items()
+        },
+    }), 200
+
+
 @admin_bp.post("/admin/invoices/create_month")
 @login_required
 @fresh_login_required
@@ -1588,6 +1660,7 @@ def create_month_invoices():
                         orient="records")
                 )
                 RECEIPT_CREATED.labels(scope="admin_bulk").inc()
+                schedule_invoice_pdfs(rid)
 
                 ok = False
                 try:
@@ -1644,7 +1717,7 @@ def create_month_invoices():
 @login_required
 @admin_required
 def admin_receipt_pdf(rid: int):
-    rec, items = get_receipt_with_items(rid)
+    rec, totals = get_receipt_summary(rid)
     if not rec:
         audit(
             "invoice.pdf",
@@ -1654,14 +1727,7 @@ def admin_receipt_pdf(rid: int):
         )
         return redirect(url_for("admin.admin_form", section="billing", bview="invoices"))
 
-    html = render_template(
-        "invoices/invoice.html",
-        r=rec,
-        rows=items,
-        org=ORG_INFO(),
-        DISPLAY_TZ=APP_TZ,
-    )
-    pdf = HTML(string=html, base_url=current_app.static_folder).write_pdf()
+    pdf = render_invoice_pdf(rec, totals, "en")
     resp = make_response(pdf)
     resp.headers["Content-Type"] = "application/pdf"
     resp.headers["Content-Disposition"] = f'attachment; filename=invoice_{rec["id"]}.pdf'
@@ -1670,6 +1736,59 @@ def admin_receipt_pdf(rid: int):
     return resp
 
 
+@admin_bp.post("/admin/invoices/pdf_batch")
+@login_required
+@admin_required
+def start_invoice_pdf_batch():
+    """Render all invoices of a month into one ZIP in the background."""
+    try:
+        y = int((request.form.get("year") or "").strip())
+        m = int((request.form.get("month") or "").strip())
+        if not (2000 <= y <= 2100 and 1 <= m <= 12):
+            raise ValueError("Invalid year/month")
+    except Exception:
+        return jsonify({"error": "bad_month"}), 400
+    locale = (request.form.get("locale") or "en").strip().lower()
+    if locale not in ("en", "th"):
+        return jsonify({"error": "bad_locale"}), 400
+
+    job_id = start_invoice_batch(y, m, locale)
+    audit("invoice.pdf_batch.start", target_type="month", target_id=f"{y}-{m:02d}",
+          outcome="success", status=202, extra={"note": f"job={job_id} locale={locale}"})
+    return jsonify({
+        "job_id": job_id,
+        "status_url": url_for("admin.invoice_pdf_batch_status", job_id=job_id),
+        "download_url": url_for("admin.invoice_pdf_batch_zip", job_id=job_id),
+    }), 202
+
+
+@admin_bp.get("/admin/invoices/pdf_batch/<job_id>.json")
+@login_required
+@admin_required
+def invoice_pdf_batch_status(job_id: str):
+    st = pdf_batch_status(job_id)
+    if not st:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify(st), 200
+
+
+@admin_bp.get("/admin/invoices/pdf_batch/<job_id>.zip")
+@login_required
+@admin_required
+def invoice_pdf_batch_zip(job_id: str):
+    from flask import send_file
+    st = pdf_batch_status(job_id)
+    if not st:
+        return jsonify({"error": "not_found"}), 404
+    if st.get("status") != "done":
+        return jsonify(st), 409
+    audit("invoice.pdf_batch.download", target_type="month",
+          target_id=f"{st['year']}-{int(st['month']):02d}", outcome="success", status=200,
+          extra={"note": f"job={job_id}"})
+    return send_file(pdf_batch_zip_path(job_id), mimetype="application/zip", as_attachment=True,
+                     download_name=f"invoices_{st['year']}-{int(st['month']):02d}_{st['locale']}.zip")
+
+
 @admin_bp.post("/admin/invoices/revert_month")
 @login_required
 @fresh_login_required
@@ -1722,23 +1841,18 @@ def admin_receipt_etax_json(rid: int):
 def admin_receipt_etax_zip(rid: int):
     from io import BytesIO
     from zipfile import ZipFile, ZIP_DEFLATED
-    from weasyprint import HTML
-    from models.billing_store import get_receipt_with_items, build_etax_payload
-    from services.org_info import ORG_INFO
-    from flask import current_app, make_response
+    from models.billing_store import build_etax_payload
+    from flask import make_response
 
-    rec, items = get_receipt_with_items(rid)
+    rec, totals = get_receipt_summary(rid)
     if not rec:
         return jsonify({"error": "not_found"}), 404
 
     # 1) JSON payload
     payload = build_etax_payload(rid)
 
-    # 2) PDF (current layout)
-    html = render_template("invoices/invoice.html",
-                           r=rec, rows=items, org=ORG_INFO(), DISPLAY_TZ=APP_TZ)
-    pdf_bytes = HTML(
-        string=html, base_url=current_app.static_folder).write_pdf()
+    # 2) PDF (current layout, shared with the invoice download cache)
+    pdf_bytes = render_invoice_pdf(rec, totals, "en")
 
     # 3) ZIP it
     mem = BytesIO()
@@ -1758,16 +1872,35 @@ def admin_receipt_etax_zip(rid: int):
     return resp
 
 
+@admin_bp.get("/admin/etax/<int:year>-<int:month>.zip")
+@login_required
+@admin_required
+def admin_etax_period_zip(year: int, month: int):
+    """All e-Tax payloads of a month in one signed ZIP (manifest + signature)."""
+    import tempfile
+    from flask import send_file
+    from services.accounting_export import write_etax_period_zip
+
+    if not (2000 <= year <= 2100 and 1 <= month <= 12):
+        return jsonify({"error": "bad_month"}), 400
+
+    spool = tempfile.TemporaryFile(suffix=".zip")
+    n, mhash = write_etax_period_zip(year, month, spool)
+    spool.seek(0)
+    audit("etax.export.period", target_type="month", target_id=f"{year}-{month:02d}",
+          outcome="success", status=200, extra={"count": n, "note": mhash})
+    return send_file(spool, mimetype="application/zip", as_attachment=True,
+                     download_name=f"etax_export_{year}-{month:02d}.zip")
+
+
 @admin_bp.get("/admin/receipts/<int:rid>.th.pdf")
 @login_required
 @admin_required
 def admin_receipt_pdf_th(rid: int):
-    rec, items = get_receipt_with_items(rid)
+    rec, totals = get_receipt_summary(rid)
     if not rec:
         return redirect(url_for("admin.admin_form", section="billing", bview="invoices"))
-    html = render_template("invoices/invoice_th.html",
-                           r=rec, rows=items, org=ORG_INFO_TH(), DISPLAY_TZ=APP_TZ)
-    pdf = HTML(string=html, base_url=current_app.static_folder).write_pdf()
+    pdf = render_invoice_pdf(rec, totals, "th")
     resp = make_response(pdf)
     resp.headers["Content-Type"] = "application/pdf"
     resp.headers["Content-Disposition"] = f'attachment; filename=invoice_{rec["id"]}_th.pdf'
@@ -1784,7 +1917,10 @@ def audit_verify_json():
     try:
         # optional ?limit= param for quick checks
         limit = request.args.get("limit", type=int)
-        result = verify_chain(limit=limit)
+        # ?full=1 re-verifies from genesis instead of the last checkpoint;
+        # parallel verification is CLI-only (scripts/archive_audit.py)
+        full = request.args.get("full", "0").lower() in ("1", "true", "yes")
+        result = verify_chain(limit=limit, full=full)
         status = 200 if result.get("ok") else 409
         audit(
             "audit.verify_chain",
@@ -1935,15 +2071,16 @@ def ui_bootstrap_periods():
 def export_gl_formal_zip():
     start = (request.form.get("start") or "1970-01-01").strip()
     end = (request.form.get("end") or date.today().isoformat()).strip()
-    fname, blob = run_formal_gl_export(
+    from flask import send_file
+    fname, path = run_formal_gl_export(
         start, end, current_user.username, kind="posted_gl_csv")
-    if not blob:
+    if not path:
         flash("Nothing to export for the selected window.", "info")
         return redirect(url_for("admin.ledger_page", start=start, end=end))
     audit("export.formal.download", target_type="window", target_id=f"{start}:{end}",
           outcome="success", status=200, extra={"filename": fname})
-    return Response(blob, mimetype="application/zip",
-                    headers={"Content-Disposition": f'attachment; filename="{fname}"'})
+    return send_file(path, mimetype="application/zip", as_attachment=True,
+                     download_name=fname)
 
 
 @admin_bp.get("/admin/export/runs")
@@ -1971,10 +2108,16 @@ def list_export_runs():
 def redownload_export_run(run_id: int):
     """
     Re-download the EXACT same file (no re-selection; no double-export).
+    Served from the run's on-disk artifact; runs without one are rebuilt
+    from the batches linked to the run.
     """
+    from flask import send_file
     from sqlalchemy import select
-    from models.gl import ExportRun, ExportRunBatch, GLEntry
-    import io
+    from models.gl import ExportRun, ExportRunBatch
+    from services.accounting_export import (
+        export_artifact_path, artifact_matches_run, write_gl_lines_csv,
+    )
+    import tempfile
     import zipfile
     import json
     with session_scope() as s:
@@ -1983,37 +2126,17 @@ def redownload_export_run(run_id: int):
         if not run:
             return jsonify({"error": "not_found"}), 404
 
+        path = export_artifact_path(run.id)
+        if path.is_file() and artifact_matches_run(path, run):
+            return send_file(path, mimetype="application/zip", as_attachment=True,
+                             download_name=f"gl_export_run_{run.id}_redownload.zip")
+
         # rebuild from *the exact batches linked to this run*
-        bids = [rb.batch_id for rb in s.execute(select(ExportRunBatch).where(
-            ExportRunBatch.run_id == run_id)).scalars().all()]
+        bids = s.execute(select(ExportRunBatch.batch_id).where(
+            ExportRunBatch.run_id == run_id)).scalars().all()
         if not bids:
             return jsonify({"error": "run_empty"}), 404
 
-        # deterministic order: (batch_id, seq_in_batch, id)
-        lines = s.execute(
-            select(
-                GLEntry.date, GLEntry.ref, GLEntry.memo,
-                GLEntry.account_id, GLEntry.account_name, GLEntry.account_type,
-                GLEntry.debit, GLEntry.credit, GLEntry.batch_id, GLEntry.seq_in_batch,
-                GLEntry.external_txn_id
-            ).where(GLEntry.batch_id.in_(bids))
-             .order_by(GLEntry.batch_id, GLEntry.seq_in_batch, GLEntry.id)
-        ).all()
-
-        import csv
-        o = io.StringIO()
-        w = csv.writer(o)
-        w.writerow(["date", "ref", "memo", "account_id", "account_name", "account_type",
-                   "debit", "credit", "batch_id", "line_seq", "external_txn_id"])
-        for r in lines:
-            w.writerow([
-                r.date.date().isoformat(), r.ref, r.memo, r.account_id, r.account_name, r.account_type,
-                float(r.debit or 0), float(
-                    r.credit or 0), r.batch_id, int(r.seq_in_batch or 0),
-                r.external_txn_id or f"B{r.batch_id:08d}-L{int(r.seq_in_batch or 0):05d}",
-            ])
-        csv_bytes = o.getvalue().encode("utf-8")
-
         # include the original evidence stored on the run
         manifest = {
             "run_id": run.id, "kind": run.kind, "criteria": run.criteria,
@@ -2021,16 +2144,26 @@ def redownload_export_run(run_id: int):
             "signature": run.signature, "key_id": run.key_id, "redownloaded_at": datetime.now(timezone.utc).isoformat()
         }
 
-        mem = io.BytesIO()
-        with zipfile.ZipFile(mem, "w", zipfile.ZIP_DEFLATED) as z:
-            z.writestr(f"gl_export_run_{run.id}.csv", csv_bytes)
+        spool = tempfile.TemporaryFile(suffix=".zip")
+        with zipfile.ZipFile(spool, "w", zipfile.ZIP_DEFLATED) as z:
+            write_gl_lines_csv(s, z, f"gl_export_run_{run.id}.csv", bids)
             z.writestr(f"manifest_run_{run.id}.json", json.dumps(
                 manifest, sort_keys=True, separators=(",", ":"), ensure_ascii=False))
             z.writestr(
                 f"signature_run_{run.id}.txt", f"key_id={run.key_id}\nsha256={run.file_sha256}\nsignature={run.signature}\n")
-        mem.seek(0)
-        return Response(mem.read(), mimetype="application/zip",
-                        headers={"Content-Disposition": f'attachment; filename="gl_export_run_{run.id}_redownload.zip"'})
+        spool.seek(0)
+        return send_file(spool, mimetype="application/zip", as_attachment=True,
+                         download_name=f"gl_export_run_{run.id}_redownload.zip")
+
+
+def _ledger_csv_bytes(df: pd.DataFrame) -> bytes:
+    """Canonical CSV of the ledger lines (what the PDF digest is computed over)."""
+    cols = ["date", "ref", "memo", "account_id",
+            "account_name", "account_type", "debit", "credit"]
+    out = df.reindex(columns=cols).copy()
+    out["debit"] = out["debit"].astype(float)
+    out["credit"] = out["credit"].astype(float)
+    return out.to_csv(index=False, lineterminator="\r\n").encode("utf-8")
 
 
 @admin_bp.get("/admin/export/ledger.pdf")
@@ -2041,11 +2174,8 @@ def export_ledger_pdf():
     from hashlib import sha256
     import secrets
     import socket
-    import csv
-    import io
     import json
     from datetime import datetime, timezone, date
-    from weasyprint import HTML
 
     # local imports (pandas etc.)
     import pandas as pd
@@ -2080,18 +2210,7 @@ def export_ledger_pdf():
         df[col] = pd.to_numeric(df[col].fillna(0), errors="coerce").fillna(0.0)
 
     # --- canonical CSV bytes for hashing (mode/window included) ---
-    csv_buf = io.StringIO()
-    w = csv.writer(csv_buf)
-    w.writerow(["date", "ref", "memo", "account_id",
-                "account_name", "account_type", "debit", "credit"])
-    for _, r in df.iterrows():
-        w.writerow([
-            r.get("date", ""), r.get("ref", ""), r.get("memo", ""),
-            r.get("account_id", ""), r.get("account_name", ""),
-            r.get("account_type", ""), float(r.get("debit") or 0.0),
-            float(r.get("credit") or 0.0)
-        ])
-    csv_bytes = csv_buf.getvalue().encode("utf-8")
+    csv_bytes = _ledger_csv_bytes(df)
 
     # --- run metadata ---
     now = datetime.now(timezone.utc)
@@ -2203,10 +2322,11 @@ def export_ledger_pdf():
           outcome="success", status=200,
           extra={"run_id": run_id, "mode": criteria["mode"], "doc_sha256": doc_digest})
 
-    # --- render HTML -> PDF ---
-    html = render_template(
+    # --- render HTML -> PDF (long ledgers in parts, see render_paged_pdf) ---
+    pdf = render_paged_pdf(
         "admin/ledger_pdf.html",
-        pages=pages,
+        pages,
+        base_url=current_app.static_folder,
         total_pages=total_pages,
         doc_digest=doc_digest,
         doc_digest_short=doc_digest_short,
@@ -2224,7 +2344,6 @@ def export_ledger_pdf():
         bs=bs,
         coa_legend=coa_legend,
     )
-    pdf = HTML(string=html, base_url=current_app.static_folder).write_pdf()
 
     fname = f"general_ledger_{criteria['mode']}_{start}_to_{end}_{run_id}.pdf"
     return Response(pdf, mimetype="application/pdf",
@@ -2237,9 +2356,8 @@ def export_ledger_pdf():
 def export_ledger_th_pdf():
     from flask import current_app
     from hashlib import sha256
-    import secrets, socket, csv, io, json, re
+    import secrets, socket, json, re
     from datetime import datetime, timezone, date
-    from weasyprint import HTML
     import pandas as pd
 
     # --- inputs / mode ---
@@ -2354,16 +2472,7 @@ def export_ledger_th_pdf():
         return en_name
 
     # -------- canonical CSV/hash from EN df (unchanged; keeps digest stable) --------
-    csv_buf = io.StringIO()
-    w = csv.writer(csv_buf)
-    w.writerow(["date","ref","memo","account_id","account_name","account_type","debit","credit"])
-    for _, r in df.iterrows():
-        w.writerow([
-            r.get("date",""), r.get("ref",""), r.get("memo",""),
-            r.get("account_id",""), r.get("account_name",""), r.get("account_type",""),
-            float(r.get("debit") or 0.0), float(r.get("credit") or 0.0)
-        ])
-    csv_bytes = csv_buf.getvalue().encode("utf-8")
+    csv_bytes = _ledger_csv_bytes(df)
 
     # --- run metadata ---
     now = datetime.now(timezone.utc)
@@ -2460,10 +2569,14 @@ def export_ledger_th_pdf():
           outcome="success", status=200,
           extra={"run_id": run_id, "mode": criteria["mode"], "doc_sha256": doc_digest})
 
-    # --- render HTML -> PDF ---
-    html = render_template(
+    # --- render HTML -> PDF (long ledgers in parts, see render_paged_pdf) ---
+    pdf = render_paged_pdf(
         "admin/ledger_pdf_th.html",
-        pages=pages,
+        pages,
+        base_url=current_app.static_folder,
+        page_label="หน้า ",
+        label_font='"TH Sarabun New", "Noto Sans Thai", sans-serif',
+        label_size="10pt",
         total_pages=total_pages,
         doc_digest=doc_digest,
         doc_digest_short=doc_digest_short,
@@ -2480,8 +2593,6 @@ def export_ledger_th_pdf():
         bs=bs,
         coa_legend=coa_legend,                        # Thai legend
     )
-
-    pdf = HTML(string=html, base_url=current_app.static_folder).write_pdf()
     fname = f"general_ledger_{criteria['mode']}_{start}_to_{end}_{run_id}.pdf"
     return Response(pdf, mimetype="application/pdf",
                     headers={"Content-Disposition": f'attachment; filename="{fname}"'})
@@ -1,11 +1,17 @@
 # controllers/copilot.py
-from flask import Blueprint, request, jsonify, current_app, send_from_directory
+from flask import Blueprint, request, jsonify, current_app, send_from_directory, Response, stream_with_context
 import os
-from services.copilot import ask, rebuild
+import json
+from services.copilot import ask, ask_stream, rebuild
 
 copilot_bp = Blueprint("copilot", __name__)
 
 
+def _client_ip() -> str:
+    return request.headers.get(
+        "X-Forwarded-For", request.remote_addr or "0.0.0.0").split(",")[0].strip()
+
+
 @copilot_bp.post("/copilot/ask")
 def copilot_ask():
     if not current_app.config.get("COPILOT_ENABLED", True):
@@ -13,15 +19,40 @@ def copilot_ask():
     q = (request.json or {}).get("q", "").strip()
     if not q:
         return jsonify({"answer_html": "Ask me something about this app.", "sources": []})
-    ip = request.headers.get(
-        "X-Forwarded-For", request.remote_addr or "0.0.0.0").split(",")[0].strip()
     try:
-        return jsonify(ask(ip, q))
+        return jsonify(ask(_client_ip(), q))
     except Exception as e:
         current_app.logger.exception("copilot ask failed")
         return jsonify({"answer_html": f"Copilot error: {e}", "sources": []}), 500
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@copilot_bp.post("/copilot/ask/stream")
+def copilot_ask_stream():
+    # Server-Sent Events: sources, token*, html*, then done (or error)
+    if not current_app.config.get("COPILOT_ENABLED", True):
+        return jsonify({"answer_html": "Copilot disabled.", "sources": []}), 503
+    q = (request.json or {}).get("q", "").strip()
+    if not q:
+        events = iter([("done", {"answer_html": "Ask me something about this app.", "sources": []})])
+    else:
+        events = ask_stream(_client_ip(), q)
+
+    def _relay():
+        try:
+            for event, data in events:
+                yield _sse(event, data)
+        except Exception as e:
+            current_app.logger.exception("copilot stream failed")
+            yield _sse("error", {"answer_html": f"Copilot error: {e}", "sources": []})
+
+    return Response(stream_with_context(_relay()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @copilot_bp.post("/copilot/reindex")
 def copilot_reindex():
     # optionally restrict behind admin auth if you like
@@ -1,13 +1,13 @@
 from __future__ import annotations
 from models.audit_store import audit  # <-- uses the audit() you pasted
 # add ForumThreadVote
-from models.schema import ForumThread, ForumComment, User, ForumThreadVote
+from models.schema import ForumThread, ForumComment, ForumThreadVote
 from models.schema import (
-    ForumThread, ForumComment, ForumSolution, User,
+    ForumThread, ForumComment, ForumSolution,
     ForumThreadVote, ForumCommentVote
 )
-from sqlalchemy import select, func, and_
-from models.schema import ForumSolution, ForumThread, ForumComment, User
+from sqlalchemy import select, func
+from models.schema import ForumSolution, ForumThread, ForumComment
 from flask import Blueprint, render_template, request, redirect, url_for, abort, current_app
 from flask_login import login_required, current_user
 from sqlalchemy import select
@@ -16,14 +16,20 @@ from models.schema import ForumThread, ForumComment
 from controllers.auth import admin_required  # you already define this
 from sqlalchemy import select, func
 from datetime import datetime, timezone
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func
 from urllib.parse import urlencode
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func
 from urllib.parse import urlencode
-from models.schema import ForumThread, ForumComment, ForumThreadVote, User
+from models.schema import ForumThread, ForumComment, ForumThreadVote
+from models.forum_store import (
+    add_thread_score, comment_added, comment_removed, comment_page, load_thread_view,
+)
+from models.search_store import matches, search
 
 forum_bp = Blueprint("forum", __name__, url_prefix="/forum")
 COMMENT_MAX = 2000
+# top-level comments per thread page (replies ride along with their root)
+COMMENTS_PER_PAGE = 50
 THREAD_TITLE_MAX = 200
 THREAD_BODY_MAX = 10000
 
@@ -78,85 +84,64 @@ def thread_list():
     solved_only = request.args.get("solved") in ("1", "true", "on", "yes")
 
     # --- new: sort ---
-    sort = (request.args.get("sort") or "latest_post").strip()
-    # allowed: latest_post | latest_comment | most_upvoted | most_downvoted
+    sort = (request.args.get("sort") or ("relevance" if q_title else "latest_post")).strip()
+    # allowed: relevance (needs q) | latest_post | latest_comment | most_upvoted | most_downvoted
+    if sort == "relevance" and not q_title:
+        sort = "latest_post"
+    after = request.args.get("after")
 
     filters = []
-    if q_title:
-        filters.append(ForumThread.title.ilike(f"%{q_title}%"))
+    if q_title and sort != "relevance":
+        # full-text match on title, body and comments (GIN index)
+        filters.append(matches(ForumThread, q_title))
     if q_op:
         filters.append(ForumThread.author_username.ilike(f"%{q_op}%"))
     if solved_only:
         filters.append(ForumThread.is_solved.is_(True))
 
-    # Aggregates for sorting
-    vote_sum_sq = (
-        select(ForumThreadVote.thread_id,
-               func.coalesce(func.sum(ForumThreadVote.value), 0).label("score"))
-        .group_by(ForumThreadVote.thread_id)
-        .subquery()
-    )
-    last_comment_sq = (
-        select(ForumComment.thread_id,
-               func.max(ForumComment.created_at).label("last_comment_at"))
-        .group_by(ForumComment.thread_id)
-        .subquery()
-    )
-
+    # score / last_comment_at are kept on the thread (models.forum_store);
+    # each order matches one ix_forum_threads_sort_* index
+    if sort == "latest_comment":
+        order_key = (ForumThread.last_comment_at.desc(),)
+    elif sort == "most_upvoted":
+        order_key = (ForumThread.score.desc(), ForumThread.created_at.desc())
+    elif sort == "most_downvoted":
+        order_key = (ForumThread.score.asc(), ForumThread.created_at.desc())
+    else:  # latest_post (default)
+        order_key = (ForumThread.created_at.desc(),)
+
+    snippets = {}
+    next_after = None
     with session_scope() as s:
-        base = (
-            select(
-                ForumThread,
-                func.coalesce(vote_sum_sq.c.score, 0).label("score"),
-                func.coalesce(last_comment_sq.c.last_comment_at,
-                              ForumThread.created_at)
-                .label("last_comment_at"),
-            )
-            .join(vote_sum_sq, vote_sum_sq.c.thread_id == ForumThread.id, isouter=True)
-            .join(last_comment_sq, last_comment_sq.c.thread_id == ForumThread.id, isouter=True)
-        )
-        if filters:
-            base = base.where(and_(*filters))
-
-        # Order key by sort mode; pinned always first
-        if sort == "latest_comment":
-            order_key = (func.coalesce(
-                last_comment_sq.c.last_comment_at, ForumThread.created_at).desc(),)
-        elif sort == "most_upvoted":
-            order_key = (func.coalesce(vote_sum_sq.c.score,
-                         0).desc(), ForumThread.created_at.desc())
-        elif sort == "most_downvoted":
-            order_key = (func.coalesce(vote_sum_sq.c.score,
-                         0).asc(), ForumThread.created_at.desc())
-        else:  # latest_post (default)
-            order_key = (ForumThread.created_at.desc(),)
-
-        q = (
-            base.order_by(ForumThread.is_pinned.desc(), *order_key)
+        if sort == "relevance":
+            # ranked, keyset-paged (models.search_store); no total
+            hits, next_after = search(s, ForumThread, q_title, where=filters,
+                                      limit=per_page, after=after,
+                                      hidden=ForumThread.is_deleted)
+            items = [t for t, _rank, _snip in hits]
+            snippets = {t.id: snip for t, _rank, snip in hits}
+            total = None
+        else:
+            # the filtered total rides along as a window count
+            q = (
+                select(ForumThread, func.count().over().label("total"))
+                .where(*filters)
+                .order_by(ForumThread.is_pinned.desc(), *order_key)
                 .offset((page - 1) * per_page)
                 .limit(per_page)
-        )
-        rows = s.execute(q).all()
-        # Extract ORM objects & aggregates
-        items = [r[0] for r in rows]
-        thread_scores = {r[0].id: r[1] for r in rows}  # id -> score
-
-        # total count with same filters
-        total = s.execute(
-            (select(func.count()).select_from(ForumThread).where(and_(*filters)))
-            if filters else select(func.count()).select_from(ForumThread)
-        ).scalar_one()
+            )
+            rows = s.execute(q).unique().all()
+            items = [r[0] for r in rows]
+            if rows:
+                total = rows[0][1]
+            else:
+                total = s.execute(
+                    select(func.count()).select_from(ForumThread).where(*filters)
+                ).scalar_one()
 
-        # admin labels for authors on this page
-        page_authors = {t.author_username for t in items}
-        page_admins = set(
-            s.execute(
-                select(User.username).where(
-                    User.username.in_(list(page_authors)),
-                    User.role == "admin",
-                )
-            ).scalars()
-        )
+        # authors are joined in (ForumThread.author), no extra lookup
+        page_admins = {t.author_username for t in items
+                       if t.author is not None and t.author.role == "admin"}
 
     # preserve filters in pagination links
     qs_dict = {}
@@ -173,11 +158,12 @@ def thread_list():
     return render_template(
         "forum/list.html",
         threads=items,
+        snippets=snippets,
+        next_after=next_after,
         page=page,
         per_page=per_page,
         total=total,
         page_admin_usernames=page_admins,
-        thread_scores=thread_scores,
         q=q_title,
         op=q_op,
         solved_only=solved_only,
@@ -261,33 +247,24 @@ def thread_new_submit():
 
 @forum_bp.get("/<int:thread_id>")
 def thread_view(thread_id: int):
+    page = max(int(request.args.get("page", 1) or 1), 1)
+    comment_id = request.args.get("comment", type=int)
+    viewer = current_user.id if current_user.is_authenticated else None
+
     with session_scope() as s:
-        t = s.get(ForumThread, thread_id)
-        if not t:
+        if comment_id and "page" not in request.args:
+            # deep link to a comment (redirects below): open its page
+            page = comment_page(s, thread_id, comment_id, COMMENTS_PER_PAGE) or page
+        # thread + solutions, then one page of comment trees (models.forum_store)
+        v = load_thread_view(s, thread_id, viewer, page, COMMENTS_PER_PAGE)
+        if v is None:
             abort(404)
+        t = v.thread
 
-        # comments (flat)
-        comments = s.execute(
-            select(ForumComment)
-            .where(ForumComment.thread_id == thread_id)
-            .order_by(ForumComment.created_at.asc())
-        ).scalars().all()
-
-        # admin set for labels
-        usernames = {t.author_username, *[c.author_username for c in comments]}
-        admin_usernames = set(
-            s.execute(
-                select(User.username).where(User.username.in_(
-                    list(usernames)), User.role == "admin")
-            ).scalars()
-        )
+        # authors are joined in, so the admin labels need no lookup
+        admin_usernames = {u.username for u in (t.author, *(c.author for c in v.comments))
+                           if u is not None and u.role == "admin"}
 
-        # solutions (joined to comments)
-        sols = s.execute(
-            select(ForumSolution)
-            .where(ForumSolution.thread_id == thread_id)
-            .order_by(ForumSolution.created_at.asc())
-        ).scalars().all()
         # materialize a lightweight list for templates
         solved_snippets = [
             {
@@ -296,60 +273,22 @@ def thread_view(thread_id: int):
                 "body": sol.comment.body,
                 "created_at": sol.created_at,
             }
-            for sol in sols
-            if sol.comment and not sol.comment.is_deleted
+            for sol in v.solutions
         ]
 
-    # after you’ve loaded `comments`
-    comment_ids = [c.id for c in comments]
-
-    with session_scope() as s2:
-        # thread score + my vote
-        thread_score = s2.execute(
-            select(func.coalesce(func.sum(ForumThreadVote.value), 0))
-            .where(ForumThreadVote.thread_id == thread_id)
-        ).scalar_one()
-
-        my_thread_vote = 0
-        if current_user.is_authenticated:
-            mv = s2.execute(
-                select(ForumThreadVote.value)
-                .where(ForumThreadVote.thread_id == thread_id, ForumThreadVote.username == current_user.id)
-            ).scalar_one_or_none()
-            my_thread_vote = mv or 0
-
-        # comment scores
-        comment_scores = {}
-        if comment_ids:
-            for cid, score in s2.execute(
-                select(ForumCommentVote.comment_id,
-                       func.coalesce(func.sum(ForumCommentVote.value), 0))
-                .where(ForumCommentVote.comment_id.in_(comment_ids))
-                .group_by(ForumCommentVote.comment_id)
-            ):
-                comment_scores[cid] = score
-
-        # my votes on these comments
-        my_comment_votes = {}
-        if current_user.is_authenticated and comment_ids:
-            for cid, val in s2.execute(
-                select(ForumCommentVote.comment_id, ForumCommentVote.value)
-                .where(ForumCommentVote.comment_id.in_(comment_ids),
-                       ForumCommentVote.username == current_user.id)
-            ):
-                my_comment_votes[cid] = val
-
     return render_template(
         "forum/thread.html",
         thread=t,
-        comments=comments,
+        comments=v.comments,
         admin_usernames=admin_usernames,
         op_username=t.author_username,
         solved_snippets=solved_snippets,
-        thread_score=thread_score,
-        thread_user_vote=my_thread_vote,
-        comment_scores=comment_scores,
-        comment_user_votes=my_comment_votes,
+        thread_score=t.score,
+        thread_user_vote=v.my_vote,
+        comment_scores=v.comment_scores,
+        comment_user_votes=v.my_comment_votes,
+        page=v.page,
+        pages=v.pages,
     )
 
 
@@ -464,10 +403,11 @@ def comment_create(thread_id: int):
         )
         s.add(c)
         s.flush()
+        comment_added(s, thread_id, c.created_at)
         _audit_ok("forum.comment.create", "comment", c.id,
                   thread_id=thread_id, parent_id=parent_id)
         cid = c.id
-    return redirect(url_for("forum.thread_view", thread_id=thread_id) + f"#c{cid}")
+    return redirect(url_for("forum.thread_view", thread_id=thread_id, comment=cid) + f"#c{cid}")
 
 
 @forum_bp.post("/comment/<int:comment_id>/delete")
@@ -477,7 +417,8 @@ def comment_delete(comment_id: int):
        - When thread is locked: nobody can delete comments (even admin).
        - When unlocked: owner or admin may delete."""
     with session_scope() as s:
-        c = s.get(ForumComment, comment_id)
+        # row lock: a concurrent delete must see is_deleted before it decrements
+        c = s.get(ForumComment, comment_id, with_for_update={"of": ForumComment})
         if not c:
             _audit_blocked("forum.comment.delete", "comment",
                            comment_id, 404, "not_found")
@@ -499,11 +440,15 @@ def comment_delete(comment_id: int):
                            comment_id, 403, "forbidden_not_owner_or_admin")
             abort(403, "Not allowed")
 
+        was_deleted = c.is_deleted
         c.is_deleted = True
         c.deleted_by_admin = _is_admin() and not is_owner
         c.deleted_at = _utcnow()
         c.deleted_by_username = current_user.id
         s.add(c)
+        if not was_deleted:
+            s.flush()
+            comment_removed(s, c.thread_id)
         _audit_ok("forum.comment.delete", "comment", comment_id,
                   by_admin=bool(c.deleted_by_admin), thread_id=c.thread_id)
         tid = c.thread_id
@@ -563,7 +508,7 @@ def mark_solution(thread_id: int, comment_id: int):
         s.add(t)
         _audit_ok("forum.solution.mark", "thread",
                   thread_id, comment_id=comment_id)
-    return redirect(url_for("forum.thread_view", thread_id=thread_id) + f"#c{comment_id}")
+    return redirect(url_for("forum.thread_view", thread_id=thread_id, comment=comment_id) + f"#c{comment_id}")
 
 
 @forum_bp.post("/<int:thread_id>/unsolve/<int:comment_id>")
@@ -601,7 +546,7 @@ def unmark_solution(thread_id: int, comment_id: int):
             t.is_solved = False
             s.add(t)
         _audit_ok("forum.solution.unmark", "thread", thread_id, comment_id=comment_id)
-    return redirect(url_for("forum.thread_view", thread_id=thread_id) + f"#c{comment_id}")
+    return redirect(url_for("forum.thread_view", thread_id=thread_id, comment=comment_id) + f"#c{comment_id}")
 
 
 def _clamp_vote(v: int) -> int:
@@ -613,7 +558,9 @@ def _clamp_vote(v: int) -> int:
 def thread_vote(thread_id: int):
     v = _clamp_vote(request.form.get("v", type=int) or 0)
     with session_scope() as s:
-        t = s.get(ForumThread, thread_id)
+        # lock the thread first so this user's vote row is read and changed
+        # by one request at a time (score deltas come from that read)
+        t = s.get(ForumThread, thread_id, with_for_update={"of": ForumThread})
         if not t:
             _audit_blocked("forum.thread.vote", "thread",
                            thread_id, 404, "thread_not_found", v=v)
@@ -631,6 +578,7 @@ def thread_vote(thread_id: int):
         ).scalars().first()
 
         if v == 0 and existing:
+            add_thread_score(s, thread_id, -existing.value)
             s.delete(existing)
             _audit_ok("forum.thread.vote.clear", "thread", thread_id)
         elif v != 0:
@@ -638,11 +586,13 @@ def thread_vote(thread_id: int):
                 before = existing.value
                 existing.value = v
                 s.add(existing)
+                add_thread_score(s, thread_id, v - before)
                 _audit_ok("forum.thread.vote.change", "thread",
                           thread_id, before=before, after=v)
             else:
                 s.add(ForumThreadVote(thread_id=thread_id,
                       username=current_user.id, value=v))
+                add_thread_score(s, thread_id, v)
                 _audit_ok("forum.thread.vote.set",
                           "thread", thread_id, value=v)
     return redirect(url_for("forum.thread_view", thread_id=thread_id))
@@ -686,4 +636,4 @@ def comment_vote(comment_id: int):
                       username=current_user.id, value=v))
                 _audit_ok("forum.comment.vote.set", "comment",
                           comment_id, thread_id=c.thread_id, value=v)
-    return redirect(url_for("forum.thread_view", thread_id=c.thread_id) + f"#c{comment_id}")
+    return redirect(url_for("forum.thread_view", thread_id=c.thread_id, comment=comment_id) + f"#c{comment_id}")
@@ -5,6 +5,7 @@ from sqlalchemy import select, func, and_, or_
 from models.base import session_scope
 from models.schema import Ticket, TicketComment, User
 from models.audit_store import audit
+from models.search_store import matches, search
 from datetime import datetime, timezone
 
 tickets_bp = Blueprint("tickets", __name__, url_prefix="/tickets")
@@ -48,8 +49,11 @@ def list_tickets():
     mine = request.args.get("mine") in ("1", "true", "on")
     assigned_to_me = request.args.get("assigned") in (
         "1", "true", "on")  # admin: tickets I’m assigned
-    # latest | priority | updated
-    sort = (request.args.get("sort") or "latest").strip()
+    # relevance (needs q) | latest | priority | updated
+    sort = (request.args.get("sort") or ("relevance" if q_title else "latest")).strip()
+    if sort == "relevance" and not q_title:
+        sort = "latest"
+    after = request.args.get("after")
 
     filters = []
     # visibility: users see only their tickets, admins see all unless filter says otherwise
@@ -61,8 +65,9 @@ def list_tickets():
         if assigned_to_me:
             filters.append(Ticket.assignee_username == current_user.id)
 
-    if q_title:
-        filters.append(Ticket.title.ilike(f"%{q_title}%"))
+    if q_title and sort != "relevance":
+        # full-text match on title, body and public comments (GIN index)
+        filters.append(matches(Ticket, q_title))
     if status_f:
         filters.append(Ticket.status == status_f)
 
@@ -77,24 +82,35 @@ def list_tickets():
     elif sort == "updated":
         order = [Ticket.updated_at.desc(), Ticket.created_at.desc()]
 
+    snippets = {}
+    next_after = None
     with session_scope() as s:
-        base = select(Ticket)
-        if filters:
-            base = base.where(and_(*filters))
-        rows = s.execute(
-            base.order_by(*order)
-                .offset((page-1)*per_page)
-                .limit(per_page)
-        ).scalars().all()
-
-        total = s.execute(
-            (select(func.count()).select_from(Ticket).where(and_(*filters))
-             if filters else select(func.count()).select_from(Ticket))
-        ).scalar_one()
+        if sort == "relevance":
+            # ranked, keyset-paged (models.search_store); no total
+            hits, next_after = search(s, Ticket, q_title, where=filters,
+                                      limit=per_page, after=after)
+            rows = [t for t, _rank, _snip in hits]
+            snippets = {t.id: snip for t, _rank, snip in hits}
+            total = None
+        else:
+            base = select(Ticket)
+            if filters:
+                base = base.where(and_(*filters))
+            rows = s.execute(
+                base.order_by(*order)
+                    .offset((page-1)*per_page)
+                    .limit(per_page)
+            ).scalars().all()
+
+            total = s.execute(
+                (select(func.count()).select_from(Ticket).where(and_(*filters))
+                 if filters else select(func.count()).select_from(Ticket))
+            ).scalar_one()
 
     return render_template(
         "tickets/list.html",
         tickets=rows, page=page, per_page=per_page, total=total,
+        snippets=snippets, next_after=next_after,
         q=q_title, status_f=status_f, mine=mine, assigned_to_me=assigned_to_me, sort=sort,
         is_admin=_is_admin(),
     )
@@ -1,8 +1,7 @@
 # controllers/user.py
-from flask import current_app, make_response
-from weasyprint import HTML
+from flask import make_response
 import pandas as pd
-from models.billing_store import list_receipts, get_receipt_with_items
+from models.billing_store import list_receipts, get_receipt_summary, iter_receipt_items
 from flask import Blueprint, render_template, request, Response, url_for, redirect
 from flask_login import login_required, current_user
 from datetime import date
@@ -11,9 +10,8 @@ from services.data_sources import fetch_jobs_with_fallbacks
 from services.billing import compute_costs
 from models.billing_store import billed_job_ids, canonical_job_id
 from models.audit_store import audit
-from services.datetimex import APP_TZ
 from services.metrics import CSV_DOWNLOADS
-from services.org_info import ORG_INFO, ORG_INFO_TH
+from services.invoice_pdf import render_invoice_pdf
 from models.billing_store import _tax_cfg
 user_bp = Blueprint("user", __name__)
 
@@ -30,7 +28,7 @@ def my_receipts():
 @user_bp.get("/me/receipts/<int:rid>")
 @login_required
 def view_receipt(rid: int):
-    rec, items = get_receipt_with_items(rid)
+    rec, _totals = get_receipt_summary(rid)
     is_admin = getattr(current_user, "is_admin", False)
     if not rec or (rec.get("username") != current_user.username and not is_admin):
         audit(
@@ -39,7 +37,7 @@ def view_receipt(rid: int):
             outcome="failure", status=403
         )
         return redirect(url_for("user.my_receipts"))
-    return render_template("user/receipt_detail.html", r=rec, rows=items,
+    return render_template("user/receipt_detail.html", r=rec, rows=iter_receipt_items(rid),
                            is_owner=(rec.get("username") == current_user.username))
 
 
@@ -294,7 +292,7 @@ def my_usage_csv():
 @user_bp.get("/me/receipts/<int:rid>.pdf")
 @login_required
 def receipt_pdf(rid: int):
-    rec, items = get_receipt_with_items(rid)
+    rec, totals = get_receipt_summary(rid)
     is_admin = getattr(current_user, "is_admin", False)
     if not rec or (rec["username"] != current_user.username and not is_admin):
         audit(
@@ -305,14 +303,7 @@ def receipt_pdf(rid: int):
         )
         return redirect(url_for("user.my_receipts"))
 
-    html = render_template(
-        "invoices/invoice.html",
-        r=rec,
-        rows=items,
-        org=ORG_INFO(),   # see helper below
-        DISPLAY_TZ=APP_TZ,
-    )
-    pdf = HTML(string=html, base_url=current_app.static_folder).write_pdf()
+    pdf = render_invoice_pdf(rec, totals, "en")
     resp = make_response(pdf)
     resp.headers["Content-Type"] = "application/pdf"
     resp.headers["Content-Disposition"] = f'attachment; filename=invoice_{rec["id"]}.pdf'
@@ -324,7 +315,7 @@ def receipt_pdf(rid: int):
 @user_bp.get("/me/receipts/<int:rid>.th.pdf")
 @login_required
 def receipt_pdf_th(rid: int):
-    rec, items = get_receipt_with_items(rid)
+    rec, totals = get_receipt_summary(rid)
     is_admin = getattr(current_user, "is_admin", False)
     if not rec or (rec["username"] != current_user.username and not is_admin):
         audit(
@@ -335,14 +326,7 @@ def receipt_pdf_th(rid: int):
         )
         return redirect(url_for("user.my_receipts"))
 
-    html = render_template(
-        "invoices/invoice_th.html",  # your Thai template
-        r=rec,
-        rows=items,
-        org=ORG_INFO_TH(),           # Thai-preferred org labels
-        DISPLAY_TZ=APP_TZ,
-    )
-    pdf = HTML(string=html, base_url=current_app.static_folder).write_pdf()
+    pdf = render_invoice_pdf(rec, totals, "th")
     resp = make_response(pdf)
     resp.headers["Content-Type"] = "application/pdf"
     resp.headers["Content-Disposition"] = f'attachment; filename=invoice_{rec["id"]}_th.pdf'
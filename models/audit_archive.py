@@ -0,0 +1,355 @@
+# models/audit_archive.py
+"""
+Hot/cold tiers for the audit log.
+
+Hot:  `audit_log`, range-partitioned by month on Postgres (see
+      models.schema.AuditLog). Inserts and "recent activity" queries only touch
+      the current partitions' indexes.
+Cold: closed months exported to gzip'd JSONL segment files plus a signed
+      manifest, recorded in `audit_archive_segments`. Each segment starts from
+      the previous segment's last hash, so the chain stays verifiable across
+      every boundary (verify_archive / verify_audit_segment).
+
+Events keep the time they happened, so chain order (id) and ts can
+disagree: a replayed spool or a skewed worker appends rows for an earlier
+month after newer ones. A segment is therefore the id run from the previous
+segment through the last row of the archived month; rows of later months
+inside that run travel with it. Archiving detaches + drops the closed months'
+partitions when every row in them is archived, and deletes the other
+archived rows (default partition, later months, or a plain non-partitioned
+audit_log from an older deployment); where the append-only trigger forbids
+that, they are kept and reported as retained.
+"""
+import os
+import gzip
+import json
+import hashlib
+import logging
+from types import SimpleNamespace
+from typing import Optional
+from datetime import date, datetime, timezone
+from sqlalchemy import select, func, delete, text
+from models.base import session_scope, init_engine_and_session
+from models.schema import AuditLog, AuditArchiveSegment
+from models.audit_store import (
+    APP_SECRET, SIGNING_KEY_ID, AUDIT_VERIFY_YIELD_PER,
+    _load_keyring, _check_row, _ts_to_payload_str,
+    _segment_sig, _segment_sig_ok, _latest_segment, _SEGMENT_SIGNED_FIELDS,
+)
+
+AUDIT_ARCHIVE_DIR = os.getenv("AUDIT_ARCHIVE_DIR", "./instance/audit_archive")
+
+log = logging.getLogger(__name__)
+
+_PARTITION_PREFIX = "audit_log_p"  # audit_log_pYYYYMM
+
+
+def _month_start(y: int, m: int) -> datetime:
+    return datetime(y, m, 1, tzinfo=timezone.utc)
+
+
+def _next_month(y: int, m: int) -> tuple[int, int]:
+    return (y + 1, 1) if m == 12 else (y, m + 1)
+
+
+def _is_partitioned(conn) -> bool:
+    kind = conn.execute(text(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass('audit_log')"
+    )).scalar()
+    return kind == "p"
+
+
+def _monthly_partitions(conn) -> list[str]:
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('audit_log') ORDER BY c.relname"
+    )).scalars().all()
+    return [n for n in names
+            if n.startswith(_PARTITION_PREFIX) and n[len(_PARTITION_PREFIX):].isdigit()]
+
+
+def ensure_audit_partitions(months_ahead: int = 2, since: Optional[date] = None) -> list[str]:
+    """
+    Create monthly partitions from `since` (default: this month) through
+    `months_ahead` months from now. Returns the names created. No-op when
+    audit_log is not partitioned.
+
+    Rows that already landed in audit_log_default for a month (a process
+    that outlived its partitions) are moved into the new partition before it
+    is attached. Runs at startup and periodically from the audit writer
+    (AUDIT_PARTITION_CHECK_SEC); `scripts/archive_audit.py --ensure-partitions`
+    does the same from cron.
+    """
+    today = datetime.now(timezone.utc).date()
+    y, m = (since or today).year, (since or today).month
+    ey, em = today.year, today.month
+    for _ in range(months_ahead):
+        ey, em = _next_month(ey, em)
+
+    engine, _ = init_engine_and_session()
+    created = []
+    with engine.begin() as conn:
+        if conn.dialect.name != "postgresql" or not _is_partitioned(conn):
+            return []
+        has_default = conn.execute(text(
+            "SELECT to_regclass('audit_log_default') IS NOT NULL")).scalar()
+        while (y, m) <= (ey, em):
+            name = f"{_PARTITION_PREFIX}{y:04d}{m:02d}"
+            lo, hi = _month_start(y, m), _month_start(*_next_month(y, m))
+            exists = conn.execute(
+                text("SELECT to_regclass(:n) IS NOT NULL"), {"n": name}).scalar()
+            if not exists:
+                stray = 0
+                if has_default:
+                    stray = conn.execute(text(
+                        "SELECT count(*) FROM audit_log_default WHERE ts >= :lo AND ts < :hi"
+                    ), {"lo": lo, "hi": hi}).scalar()
+                # DDL cannot take bind params; bounds are generated, not user input
+                bounds = f"FOR VALUES FROM ('{lo.isoformat()}') TO ('{hi.isoformat()}')"
+                if not stray:
+                    conn.execute(text(f"CREATE TABLE {name} PARTITION OF audit_log {bounds}"))
+                    created.append(name)
+                elif _move_from_default(conn, name, bounds, lo, hi):
+                    log.info("audit: moved %s rows from audit_log_default into %s",
+                             stray, name)
+                    created.append(name)
+            y, m = _next_month(y, m)
+    return created
+
+
+def _move_from_default(conn, name: str, bounds: str, lo: datetime, hi: datetime) -> bool:
+    """
+    Build partition `name` from the default partition's rows in [lo, hi) and
+    attach it. False (nothing changed) when the rows cannot be moved, e.g. the
+    append-only trigger forbids the DELETE.
+    """
+    try:
+        with conn.begin_nested():
+            conn.execute(text(
+                f"CREATE TABLE {name} (LIKE audit_log INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+            conn.execute(text(
+                f"WITH moved AS (DELETE FROM audit_log_default "
+                f"WHERE ts >= :lo AND ts < :hi RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"), {"lo": lo, "hi": hi})
+            conn.execute(text(f"ALTER TABLE audit_log ATTACH PARTITION {name} {bounds}"))
+        return True
+    except Exception:
+        log.warning("audit: could not move rows for %s out of audit_log_default; "
+                    "leaving them there", name, exc_info=True)
+        return False
+
+
+def _row_to_dict(r) -> dict:
+    d = {c.name: getattr(r, c.name) for c in AuditLog.__table__.columns}
+    d["ts"] = _ts_to_payload_str(r.ts)
+    return d
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _manifest_path(path: str) -> str:
+    return path + ".manifest.json"
+
+
+def archive_audit_month(year: int, month: int, out_dir: Optional[str] = None,
+                        purge: bool = True) -> dict:
+    """
+    Export every not-yet-archived row up to the end of (year, month) into one
+    signed segment, then drop it from the hot tier (`purge`). The segment
+    runs through the last id stamped before the month end, so it also holds
+    any later-month rows chained in between. Only closed months can be
+    archived. The rows are re-verified while being written; a broken chain
+    aborts the export.
+    """
+    month_end = _month_start(*_next_month(year, month))
+    now = datetime.now(timezone.utc)
+    if month_end > _month_start(now.year, now.month):
+        raise ValueError("only closed months can be archived")
+
+    ring = _load_keyring()
+    out_dir = out_dir or AUDIT_ARCHIVE_DIR
+    label = f"{year:04d}-{month:02d}"
+
+    with session_scope() as s:
+        seg = _latest_segment(s, ring)
+        start_id, prev, base = (
+            (seg.last_id, seg.last_hash, seg.verified_count) if seg else (0, "", 0))
+        last_id = s.execute(
+            select(func.max(AuditLog.id))
+            .where(AuditLog.id > start_id, AuditLog.ts < month_end)
+        ).scalar()
+        if last_id is None:
+            return {"ok": True, "month": label, "archived": 0, "file": None,
+                    "dropped_partitions": [], "purged": 0, "retained": 0}
+        first_id = s.execute(
+            select(func.min(AuditLog.id)).where(AuditLog.id > start_id)).scalar()
+
+    os.makedirs(out_dir, exist_ok=True)
+    fname = f"audit-{year:04d}{month:02d}-{first_id}-{last_id}.jsonl.gz"
+    path = os.path.join(out_dir, fname)
+    tmp = path + ".part"
+
+    seg_prev = prev
+    count = 0
+    bad = None
+    with session_scope() as s, gzip.open(tmp, "wt", encoding="utf-8") as gz:
+        rows = s.execute(
+            select(*AuditLog.__table__.c)
+            .where(AuditLog.id > start_id, AuditLog.id <= last_id)
+            .order_by(AuditLog.id)
+            .execution_options(stream_results=True, yield_per=AUDIT_VERIFY_YIELD_PER)
+        )
+        for r in rows:
+            reason = _check_row(r, prev, ring)
+            if reason:
+                bad = {"first_bad_id": r.id, "reason": reason}
+                break
+            gz.write(json.dumps(_row_to_dict(r), separators=(",", ":"),
+                                ensure_ascii=False, default=str) + "\n")
+            prev = r.hash or ""
+            count += 1
+    if bad:
+        os.remove(tmp)
+        return {"ok": False, "month": label, "archived": 0, **bad}
+
+    os.replace(tmp, path)
+    manifest = {
+        "month": label, "first_id": first_id, "last_id": last_id,
+        "prev_hash": seg_prev, "last_hash": prev,
+        "row_count": count, "verified_count": base + count,
+        "file": fname, "sha256": _file_sha256(path), "key_id": SIGNING_KEY_ID,
+    }
+    manifest["signature"] = _segment_sig(APP_SECRET, manifest)
+    with open(_manifest_path(path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    with session_scope() as s:
+        s.add(AuditArchiveSegment(
+            created_at=datetime.now(timezone.utc), **manifest))
+
+    dropped, purged, retained = ([], 0, 0)
+    if purge:
+        dropped, purged, retained = _purge_hot(month_end, start_id, last_id)
+    return {"ok": True, "month": label, "archived": count, "file": path,
+            "dropped_partitions": dropped, "purged": purged, "retained": retained}
+
+
+def _purge_hot(month_end: datetime, start_id: int,
+               last_id: int) -> tuple[list[str], int, int]:
+    """Drop archived rows (start_id, last_id] from the hot tier. Returns (dropped, deleted, retained)."""
+    engine, _ = init_engine_and_session()
+    dropped = []
+    with engine.begin() as conn:
+        if _is_partitioned(conn):
+            for name in _monthly_partitions(conn):
+                yyyymm = name[len(_PARTITION_PREFIX):]
+                if _month_start(int(yyyymm[:4]), int(yyyymm[4:])) >= month_end:
+                    continue
+                # a late row chained in after the export stays until the next one
+                conn.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+                newer = conn.execute(text(
+                    f"SELECT count(*) FROM {name} WHERE id > :last"), {"last": last_id}).scalar()
+                if newer:
+                    continue
+                # whole closed months: no row-level DELETE, no bloat
+                conn.execute(
+                    text(f"ALTER TABLE audit_log DETACH PARTITION {name}"))
+                conn.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+
+    archived = (AuditLog.id > start_id, AuditLog.id <= last_id)
+    leftover = delete(AuditLog).where(*archived)
+    try:
+        with engine.begin() as conn:
+            deleted = conn.execute(leftover).rowcount or 0
+        return dropped, deleted, 0
+    except Exception:
+        # append-only trigger / missing DELETE grant: cold copy exists, hot copy stays
+        log.warning("audit: could not delete archived rows from audit_log; kept in hot tier",
+                    exc_info=True)
+        with session_scope() as s:
+            retained = s.execute(
+                select(func.count()).select_from(AuditLog).where(*archived)
+            ).scalar_one()
+        return dropped, 0, retained
+
+
+def verify_audit_segment(path: str, prev_hash: Optional[str] = None) -> dict:
+    """
+    Offline check of one segment file against its signed manifest: signature,
+    file digest, and every row's hash/signature. `prev_hash`, if given, must
+    match the manifest (i.e. the previous segment's last hash).
+    """
+    ring = _load_keyring()
+    with open(_manifest_path(path), encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    def fail(reason: str, checked: int = 0, bad_id=None) -> dict:
+        return {"ok": False, "checked": checked, "first_bad_id": bad_id,
+                "reason": reason, "last_hash": None}
+
+    if not _segment_sig_ok(manifest, ring):
+        return fail("manifest_signature_mismatch")
+    if prev_hash is not None and manifest["prev_hash"] != prev_hash:
+        return fail("segment_link_mismatch")
+    if _file_sha256(path) != manifest["sha256"]:
+        return fail("file_digest_mismatch")
+
+    prev = manifest["prev_hash"]
+    checked = 0
+    last_id = None
+    with gzip.open(path, "rt", encoding="utf-8") as gz:
+        for line in gz:
+            r = SimpleNamespace(**json.loads(line))
+            reason = _check_row(r, prev, ring)
+            if reason:
+                return fail(reason, checked, r.id)
+            prev = r.hash or ""
+            last_id = r.id
+            checked += 1
+
+    if (checked != manifest["row_count"] or last_id != manifest["last_id"]
+            or prev != manifest["last_hash"]):
+        return fail("manifest_mismatch", checked)
+    return {"ok": True, "checked": checked, "first_bad_id": None,
+            "reason": None, "last_hash": prev}
+
+
+def verify_archive(out_dir: Optional[str] = None, check_files: bool = True) -> dict:
+    """
+    Walk all recorded segments in chain order: manifests must be signed and
+    each must start where the previous one ended. With `check_files`, every
+    segment file is re-verified row by row as well.
+    """
+    ring = _load_keyring()
+    out_dir = out_dir or AUDIT_ARCHIVE_DIR
+    with session_scope() as s:
+        segs = s.execute(
+            select(AuditArchiveSegment).order_by(AuditArchiveSegment.last_id)
+        ).scalars().all()
+
+    prev = ""
+    checked = 0
+    for seg in segs:
+        m = {k: getattr(seg, k) for k in _SEGMENT_SIGNED_FIELDS}
+        m["signature"] = seg.signature
+        base = {"ok": False, "segments": checked, "month": seg.month}
+        if not _segment_sig_ok(m, ring):
+            return {**base, "reason": "manifest_signature_mismatch"}
+        if seg.prev_hash != prev:
+            return {**base, "reason": "segment_link_mismatch"}
+        if check_files:
+            res = verify_audit_segment(
+                os.path.join(out_dir, seg.file), prev_hash=prev)
+            if not res["ok"]:
+                return {**base, "reason": res["reason"], "first_bad_id": res["first_bad_id"]}
+        prev = seg.last_hash
+        checked += 1
+    return {"ok": True, "segments": checked, "reason": None}
@@ -2,15 +2,21 @@
 from contextlib import contextmanager
 from sqlalchemy import asc
 import os
+import glob
 import json
 import hmac
+import uuid
+import atexit
 import hashlib
+import logging
+import threading
+import time
 from typing import Any, Optional
 from datetime import datetime, timezone
 from flask import request, has_request_context, g, current_app
-from sqlalchemy import select, func
+from sqlalchemy import select, func, insert, delete, text
 from models.base import session_scope
-from models.schema import AuditLog
+from models.schema import AuditLog, AuditCheckpoint, AuditArchiveSegment
 from flask_login import current_user
 from sqlalchemy.orm import sessionmaker
 from models.base import get_engine_audit_writer
@@ -50,6 +56,36 @@ SIGNING_KEY_ID = os.getenv("AUDIT_HMAC_KEY_ID", "k1")
 _ALLOWED_EXTRA_KEYS = {"reason", "note",
                        "diff", "count", "totals", "old", "new"}
 
+# Buffered writer: events are spooled locally, then chained + inserted in
+# batches by a background thread (see _writer_loop).
+AUDIT_SPOOL_DIR = os.getenv("AUDIT_SPOOL_DIR", "./instance/audit_spool")
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL_SEC = float(os.getenv("AUDIT_FLUSH_INTERVAL_SEC", "0.5"))
+AUDIT_SPOOL_FSYNC = os.getenv("AUDIT_SPOOL_FSYNC", "0") == "1"
+# events held in memory while the DB is unreachable; beyond this the spool
+# file is the only copy and the writer replays it from disk
+AUDIT_PENDING_MAX = int(os.getenv("AUDIT_PENDING_MAX", "10000"))
+# how often the writer makes sure next months' audit_log partitions exist
+AUDIT_PARTITION_CHECK_SEC = float(os.getenv("AUDIT_PARTITION_CHECK_SEC", "3600"))
+# pg_advisory_xact_lock key serializing chain appends across processes
+AUDIT_CHAIN_LOCK_KEY = 0x61756469746C6F67  # b"auditlog"
+# rows fetched per round-trip while streaming the chain
+AUDIT_VERIFY_YIELD_PER = int(os.getenv("AUDIT_VERIFY_YIELD_PER", "2000"))
+# signed checkpoints kept (newest first); older ones are pruned
+AUDIT_CHECKPOINT_KEEP = int(os.getenv("AUDIT_CHECKPOINT_KEEP", "100"))
+
+log = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes
+    fcntl = None
+
+
+def _async_enabled() -> bool:
+    # read per call so tests/ops can flip it without re-importing
+    return os.getenv("AUDIT_ASYNC", "1").strip().lower() in ("1", "true", "yes", "on")
+
 
 def _load_keyring() -> dict[str, bytes]:
     ring: dict[str, bytes] = {}
@@ -117,72 +153,59 @@ def _rebuild_payload_from_row(r: AuditLog) -> dict:
     }
 
 
-def verify_chain(limit: Optional[int] = None) -> dict:
+def _check_row(r, prev: str, ring: dict[str, bytes]) -> Optional[str]:
+    """Return the failure reason for one row given the previous hash, or None."""
+    if r.prev_hash != prev:
+        return "prev_hash_mismatch"
+
+    payload = _rebuild_payload_from_row(r)
+    exp_hash = _compute_hash(prev, payload)
+    if r.hash != exp_hash:
+        return "hash_mismatch"
+
+    kid = payload.get("key_id") or SIGNING_KEY_ID
+    key = ring.get(kid)
+    if not key:
+        return f"missing_key:{kid}"
+
+    exp_sig = hmac.new(key, exp_hash.encode(
+        "utf-8"), hashlib.sha256).hexdigest()
+    if r.signature != exp_sig:
+        return "signature_mismatch"
+    return None
+
+
+def _verify_range(lo: int, hi: Optional[int], prev: str, limit: Optional[int] = None) -> dict:
     """
-    Return:
-      {
-        "ok": bool,
-        "checked": int,
-        "last_ok_id": int | None,
-        "first_bad_id": int | None,
-        "reason": str | None
-      }
+    Verify rows with lo < id <= hi (hi=None: to the end), where `prev` is the
+    stored hash of the row just before the range. Rows are streamed with a
+    server-side cursor, so memory stays flat regardless of table size.
     """
     ring = _load_keyring()
-    prev = ""
     checked = 0
     last_ok = None
 
-    with session_scope() as s:
-        q = s.execute(select(AuditLog).order_by(asc(AuditLog.id)))
-        rows = q.scalars().all()
-        if limit:
-            rows = rows[: int(limit)]
+    q = select(*AuditLog.__table__.c).where(
+        AuditLog.id > lo).order_by(asc(AuditLog.id))
+    if hi is not None:
+        q = q.where(AuditLog.id <= hi)
+    if limit:
+        q = q.limit(int(limit))
 
+    with session_scope() as s:
+        rows = s.execute(q.execution_options(
+            stream_results=True, yield_per=AUDIT_VERIFY_YIELD_PER))
         for r in rows:
-            payload = _rebuild_payload_from_row(r)
-            exp_hash = _compute_hash(prev, payload)
-
-            if r.prev_hash != prev:
-                return {
-                    "ok": False,
-                    "checked": checked,
-                    "last_ok_id": last_ok,
-                    "first_bad_id": r.id,
-                    "reason": "prev_hash_mismatch",
-                }
-
-            if r.hash != exp_hash:
+            reason = _check_row(r, prev, ring)
+            if reason:
                 return {
                     "ok": False,
                     "checked": checked,
                     "last_ok_id": last_ok,
                     "first_bad_id": r.id,
-                    "reason": "hash_mismatch",
+                    "reason": reason,
+                    "last_hash": prev,
                 }
-
-            kid = payload.get("key_id") or SIGNING_KEY_ID
-            key = ring.get(kid)
-            if not key:
-                return {
-                    "ok": False,
-                    "checked": checked,
-                    "last_ok_id": last_ok,
-                    "first_bad_id": r.id,
-                    "reason": f"missing_key:{kid}",
-                }
-
-            exp_sig = hmac.new(key, exp_hash.encode(
-                "utf-8"), hashlib.sha256).hexdigest()
-            if r.signature != exp_sig:
-                return {
-                    "ok": False,
-                    "checked": checked,
-                    "last_ok_id": last_ok,
-                    "first_bad_id": r.id,
-                    "reason": "signature_mismatch",
-                }
-
             # advance
             checked += 1
             last_ok = r.id
@@ -194,18 +217,220 @@ def verify_chain(limit: Optional[int] = None) -> dict:
         "last_ok_id": last_ok,
         "first_bad_id": None,
         "reason": None,
+        "last_hash": prev,
     }
 
 
+def _verify_range_task(args: tuple) -> dict:
+    # top-level so a spawned worker process can unpickle it
+    return _verify_range(*args)
+
+
+def _verify_parallel(start_id: int, prev: str, workers: int) -> dict:
+    """
+    Split (start_id, max_id] into disjoint id ranges and verify them on
+    `workers` processes. Each range starts from the *stored* hash of the row
+    before it; the neighbouring range proves that stored hash is genuine.
+    Checkpoint ids are used as cut points when there are enough of them.
+    """
+    import math
+    import multiprocessing as mp
+    from concurrent.futures import ProcessPoolExecutor
+
+    with session_scope() as s:
+        max_id = s.execute(select(func.max(AuditLog.id))).scalar()
+        if not max_id or max_id <= start_id:
+            return _verify_range(start_id, None, prev)
+        cuts = s.execute(
+            select(AuditCheckpoint.last_id).distinct()
+            .where(AuditCheckpoint.last_id > start_id, AuditCheckpoint.last_id < max_id)
+            .order_by(AuditCheckpoint.last_id)
+        ).scalars().all()
+        n_ranges = workers * 4
+        if len(cuts) >= n_ranges:
+            cuts = cuts[::math.ceil(len(cuts) / n_ranges)]
+        else:
+            step = max(1, math.ceil((max_id - start_id) / n_ranges))
+            cuts = list(range(start_id + step, max_id, step))
+        bounds = [start_id] + list(cuts) + [max_id]
+
+        tasks = []
+        for lo, hi in zip(bounds, bounds[1:]):
+            if lo == start_id:
+                p = prev
+            else:
+                p = s.execute(
+                    select(AuditLog.hash).where(AuditLog.id <= lo)
+                    .order_by(AuditLog.id.desc()).limit(1)
+                ).scalar_one_or_none() or ""
+            tasks.append((lo, hi, p))
+
+    checked = 0
+    last_ok = None
+    last_hash = prev
+    # spawn: workers build their own engine instead of inheriting pooled sockets
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as ex:
+        for res in ex.map(_verify_range_task, tasks):
+            checked += res["checked"]
+            if res["last_ok_id"] is not None:
+                last_ok = res["last_ok_id"]
+                last_hash = res["last_hash"]
+            if not res["ok"]:
+                return {**res, "checked": checked, "last_ok_id": last_ok, "last_hash": last_hash}
+
+    return {
+        "ok": True,
+        "checked": checked,
+        "last_ok_id": last_ok,
+        "first_bad_id": None,
+        "reason": None,
+        "last_hash": last_hash,
+    }
+
+
+def _checkpoint_sig(key: bytes, last_id: int, last_hash: str, verified_count: int) -> str:
+    msg = f"{last_id}|{last_hash}|{verified_count}"
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def _latest_checkpoint(s, ring: dict[str, bytes]) -> Optional[AuditCheckpoint]:
+    """
+    Newest checkpoint that is still trustworthy: its signature checks out and
+    the anchored row still carries the checkpointed hash. Anything else is
+    ignored, which makes the caller fall back to verifying from genesis.
+    """
+    cp = s.execute(
+        select(AuditCheckpoint).order_by(
+            AuditCheckpoint.last_id.desc(), AuditCheckpoint.id.desc()).limit(1)
+    ).scalars().first()
+    if cp is None:
+        return None
+    key = ring.get(cp.key_id or SIGNING_KEY_ID)
+    if not key or not hmac.compare_digest(
+            cp.signature or "", _checkpoint_sig(key, cp.last_id, cp.last_hash, cp.verified_count)):
+        return None
+    anchor = s.execute(
+        select(AuditLog.hash).where(AuditLog.id == cp.last_id)
+    ).scalar_one_or_none()
+    if anchor != cp.last_hash:
+        return None
+    return cp
+
+
+def _save_checkpoint(last_id: int, last_hash: str, verified_count: int) -> None:
+    """Record a checkpoint unless the newest one already covers `last_id`; prune old ones."""
+    with session_scope() as s:
+        newest = s.execute(
+            select(func.max(AuditCheckpoint.last_id))).scalar()
+        if newest == last_id:
+            return
+        s.add(AuditCheckpoint(
+            last_id=last_id, last_hash=last_hash, verified_count=verified_count,
+            created_at=datetime.now(timezone.utc), key_id=SIGNING_KEY_ID,
+            signature=_checkpoint_sig(
+                APP_SECRET, last_id, last_hash, verified_count),
+        ))
+        s.flush()
+        keep = (select(AuditCheckpoint.id)
+                .order_by(AuditCheckpoint.last_id.desc(), AuditCheckpoint.id.desc())
+                .limit(max(1, AUDIT_CHECKPOINT_KEEP)))
+        s.execute(delete(AuditCheckpoint).where(AuditCheckpoint.id.not_in(keep)))
+
+
+_SEGMENT_SIGNED_FIELDS = ("month", "first_id", "last_id", "prev_hash", "last_hash",
+                          "row_count", "verified_count", "file", "sha256", "key_id")
+
+
+def _segment_sig(key: bytes, manifest: dict) -> str:
+    body = {k: manifest.get(k) for k in _SEGMENT_SIGNED_FIELDS}
+    msg = json.dumps(body, separators=(",", ":"), sort_keys=True)
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def _segment_sig_ok(manifest: dict, ring: dict[str, bytes]) -> bool:
+    key = ring.get(manifest.get("key_id") or SIGNING_KEY_ID)
+    return bool(key) and hmac.compare_digest(
+        manifest.get("signature") or "", _segment_sig(key, manifest))
+
+
+def _latest_segment(s, ring: dict[str, bytes]) -> Optional[AuditArchiveSegment]:
+    """Newest archived segment, if its manifest signature holds."""
+    seg = s.execute(
+        select(AuditArchiveSegment).order_by(
+            AuditArchiveSegment.last_id.desc()).limit(1)
+    ).scalars().first()
+    if seg is None:
+        return None
+    m = {k: getattr(seg, k) for k in _SEGMENT_SIGNED_FIELDS}
+    m["signature"] = seg.signature
+    return seg if _segment_sig_ok(m, ring) else None
+
+
+def verify_chain(limit: Optional[int] = None, *, full: bool = False, workers: int = 1) -> dict:
+    """
+    Verify the chain incrementally from the latest signed checkpoint
+    (or from the archive boundary / genesis when `full` is set or no valid
+    checkpoint exists), then checkpoint the verified prefix. An unchanged log
+    costs a few index lookups. Archived segments are checked separately by
+    models.audit_archive.verify_archive(); a forged boundary shows up here as
+    a prev_hash mismatch on the first hot row.
+
+    `limit` caps the number of rows examined in this run; `workers` > 1
+    verifies disjoint ranges in parallel processes (CLI/ops only: ignored
+    inside a request, capped at the CPU count).
+
+    Return:
+      {
+        "ok": bool,
+        "checked": int,                 # rows verified in this run
+        "last_ok_id": int | None,
+        "first_bad_id": int | None,
+        "reason": str | None,
+        "verified_total": int,          # rows verified from genesis
+        "from_checkpoint": int | None,  # id the run resumed after
+        "archived_through": int | None, # last id held in cold segments
+      }
+    """
+    _flush_pending_quietly()
+    ring = _load_keyring()
+    start_id, prev, base = 0, "", 0
+    archived_through = None
+    with session_scope() as s:
+        seg = _latest_segment(s, ring)
+        if seg is not None:
+            start_id, prev, base = seg.last_id, seg.last_hash, seg.verified_count
+            archived_through = seg.last_id
+        if not full:
+            cp = _latest_checkpoint(s, ring)
+            if cp is not None and cp.last_id > start_id:
+                start_id, prev, base = cp.last_id, cp.last_hash, cp.verified_count
+
+    # never fork a process pool from a web worker
+    workers = 1 if has_request_context() else min(int(workers or 1), os.cpu_count() or 1)
+    if workers > 1 and not limit:
+        res = _verify_parallel(start_id, prev, workers)
+    else:
+        res = _verify_range(start_id, None, prev, limit)
+
+    last_hash = res.pop("last_hash")
+    if res["last_ok_id"] is not None:
+        _save_checkpoint(res["last_ok_id"], last_hash, base + res["checked"])
+
+    res["verified_total"] = base + res["checked"]
+    res["from_checkpoint"] = start_id or None
+    res["archived_through"] = archived_through
+    if res["last_ok_id"] is None and start_id:
+        res["last_ok_id"] = start_id
+    return res
+
+
 def _now_isoz() -> str:
     return datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
 
 
 def _latest_hash() -> str:
     with session_scope() as s:
-        row = s.execute(select(AuditLog).order_by(
-            AuditLog.id.desc()).limit(1)).scalars().first()
-        return row.hash or "" if row else ""
+        return _latest_hash_with(s)
 
 
 def _compute_hash(prev_hash: str, payload: dict) -> str:
@@ -259,10 +484,446 @@ def _clean_extra(extra: Optional[dict[str, Any]]) -> dict:
 
 
 def _latest_hash_with(s) -> str:
+    """Hash of the chain tip; falls back to the newest archived segment."""
     row = s.execute(
-        select(AuditLog).order_by(AuditLog.id.desc()).limit(1)
-    ).scalars().first()
-    return row.hash or "" if row else ""
+        select(AuditLog.hash).order_by(AuditLog.id.desc()).limit(1)
+    ).first()
+    if row is not None:
+        return row.hash or ""
+    seg = s.execute(
+        select(AuditArchiveSegment.last_hash).order_by(
+            AuditArchiveSegment.last_id.desc()).limit(1)
+    ).scalar_one_or_none()
+    return seg or ""
+
+
+def _build_payload(
+    action: str,
+    *,
+    target_type: str | None,
+    target_id: str | None,
+    outcome: str | None,
+    status: int | None,
+    error_code: str | None,
+    extra: Optional[dict[str, Any]],
+    actor: Optional[str],
+) -> dict:
+    """Capture the event (incl. request context) without touching the DB."""
+    ts = _now_isoz()
+
+    ip = ua = method = path = req_id = sess_id = None
+    if has_request_context():
+        try:
+            fwd = request.headers.get("X-Forwarded-For", "")
+            ip = (fwd.split(",")[0].strip() or request.remote_addr)
+        except Exception:
+            ip = None
+        method = request.method
+        path = request.path
+        req_id = getattr(g, "request_id", None) or request.headers.get(
+            "X-Request-ID")
+        cookie_name = getattr(
+            current_app, "session_cookie_name", None) or "session"
+        sess_raw = request.cookies.get(cookie_name, None)
+        sess_id = _fingerprint(sess_raw, 64)
+        ua_full = request.user_agent.string if request.user_agent else None
+        ua = ua_full if RAW_UA else _ua_fingerprint(ua_full)
+        ip = _anon_ip(ip)
+
+    if actor is None:
+        try:
+            actor = getattr(current_user, "username", None) or "anonymous"
+            actor_role = getattr(current_user, "role", None)
+        except Exception:
+            actor, actor_role = "anonymous", None
+    else:
+        actor_role = None
+
+    return {
+        "ts": ts, "actor": actor, "actor_role": actor_role,
+        "request_id": req_id, "session_id": sess_id,
+        "ip": ip, "ua": ua, "method": method, "path": path,
+        "action": action, "target_type": target_type, "target_id": target_id,
+        "outcome": outcome, "status": status, "error_code": error_code,
+        "extra": _clean_extra(extra or {}),
+        "schema_version": SCHEMA_VERSION,
+        "key_id": SIGNING_KEY_ID,
+    }
+
+
+def _write_batch(payloads: list[dict]) -> None:
+    """
+    Chain + insert payloads in order, in one transaction.
+    The advisory lock makes the read of the latest hash and the inserts atomic
+    with respect to every other writer (other threads, workers and hosts).
+    """
+    if not payloads:
+        return
+    with audit_session_scope() as s:
+        s.execute(text("SELECT pg_advisory_xact_lock(:k)"),
+                  {"k": AUDIT_CHAIN_LOCK_KEY})
+        prev = _latest_hash_with(s)
+        rows = []
+        for p in payloads:
+            # ts is when the event happened, even if it chains in after newer
+            # ones (replayed spools, skewed workers); partitions route on it
+            h = _compute_hash(prev, p)
+            rows.append({
+                "ts": p["ts"],
+                "actor": p["actor"], "actor_role": p["actor_role"],
+                "request_id": p["request_id"], "session_id": p["session_id"],
+                "ip": p["ip"], "ua_fingerprint": (p["ua"] if not RAW_UA else None),
+                "method": p["method"], "path": p["path"],
+                "action": p["action"], "target_type": p["target_type"],
+                "target_id": p["target_id"], "outcome": p["outcome"],
+                "status": p["status"], "error_code": p["error_code"],
+                "extra": p["extra"],
+                "prev_hash": prev, "hash": h, "signature": _sign(h),
+                "schema_version": p["schema_version"], "key_id": p["key_id"],
+            })
+            prev = h
+        # single multi-row INSERT; ids are assigned in list order
+        s.execute(insert(AuditLog), rows)
+
+
+# ---- in-process buffer + durable local spool ----------------------------
+#
+# Every process owns a spool "token". Events are appended to
+#   <AUDIT_SPOOL_DIR>/audit-<token>.jsonl
+# before being buffered, so a crash loses nothing that audit() returned for.
+# When the writer drains the buffer it rotates that file to
+#   audit-<token>-<n>.inflight
+# and deletes it only after the batch has committed. A process holds an flock
+# on audit-<token>.lock for its lifetime; any spool whose lock can be taken
+# belongs to a dead process and is replayed by recover_audit_spool(), which
+# keeps holding that lock until the replay is done. Replays record their
+# progress per file in <file>.offset after every committed batch.
+# Delivery is at-least-once: a crash between COMMIT and recording progress
+# replays one batch.
+
+_BUF_LOCK = threading.Lock()      # guards _PENDING / spool file handle
+_FLUSH_LOCK = threading.Lock()    # one drain at a time per process
+_PENDING: list[dict] = []
+_OVERFLOW = False                 # _PENDING hit AUDIT_PENDING_MAX; replay from disk
+_INFLIGHT: list[str] = []
+_WAKE = threading.Event()
+_STOP = threading.Event()
+_WRITER: threading.Thread | None = None
+_WRITER_PID: int | None = None
+_TOKEN: str | None = None
+_LOCK_FH = None
+_SPOOL_FH = None
+_SPOOL_SEQ = 0
+
+
+def _spool_file(suffix: str) -> str:
+    return os.path.join(AUDIT_SPOOL_DIR, f"audit-{_TOKEN}{suffix}")
+
+
+def _reset_after_fork() -> None:
+    # buffers/locks inherited from a parent belong to the parent's spool
+    global _WRITER, _WRITER_PID, _TOKEN, _LOCK_FH, _SPOOL_FH, _SPOOL_SEQ, _OVERFLOW
+    _PENDING.clear()
+    _OVERFLOW = False
+    _INFLIGHT.clear()
+    _WAKE.clear()
+    _STOP.clear()
+    _WRITER = None
+    _WRITER_PID = os.getpid()
+    _TOKEN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    _LOCK_FH = _SPOOL_FH = None
+    _SPOOL_SEQ = 0
+
+
+def _ensure_writer() -> None:
+    """Start (or restart after fork) this process's writer. Call under _BUF_LOCK."""
+    global _WRITER, _LOCK_FH
+    if _WRITER_PID != os.getpid():
+        _reset_after_fork()
+    if _WRITER is not None and _WRITER.is_alive():
+        return
+    os.makedirs(AUDIT_SPOOL_DIR, exist_ok=True)
+    if _LOCK_FH is None:
+        _LOCK_FH = open(_spool_file(".lock"), "a+")
+        if fcntl is not None:
+            fcntl.flock(_LOCK_FH.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    _STOP.clear()
+    _WRITER = threading.Thread(
+        target=_writer_loop, name="audit-writer", daemon=True)
+    _WRITER.start()
+
+
+def _enqueue(payload: dict) -> None:
+    global _SPOOL_FH, _OVERFLOW
+    line = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+    with _BUF_LOCK:
+        _ensure_writer()
+        if _SPOOL_FH is None:
+            _SPOOL_FH = open(_spool_file(".jsonl"), "a", encoding="utf-8")
+        _SPOOL_FH.write(line + "\n")
+        _SPOOL_FH.flush()
+        if AUDIT_SPOOL_FSYNC:
+            os.fsync(_SPOOL_FH.fileno())
+        if _OVERFLOW or len(_PENDING) >= AUDIT_PENDING_MAX:
+            # DB down for a while: stop growing memory, the spool has it
+            _OVERFLOW = True
+            _PENDING.clear()
+            full = True
+        else:
+            _PENDING.append(payload)
+            full = len(_PENDING) >= AUDIT_BATCH_SIZE
+    if full:
+        _WAKE.set()
+
+
+def _drain_once() -> int:
+    """Write everything currently buffered as one batch. Returns #events written."""
+    global _SPOOL_FH, _SPOOL_SEQ, _OVERFLOW
+    with _FLUSH_LOCK:
+        with _BUF_LOCK:
+            overflow = _OVERFLOW
+            if not _PENDING and not overflow:
+                return 0
+            batch = list(_PENDING)
+            _PENDING.clear()
+            _OVERFLOW = False
+            if _SPOOL_FH is not None:
+                _SPOOL_FH.close()
+                _SPOOL_FH = None
+                _SPOOL_SEQ += 1
+                inflight = _spool_file(f"-{_SPOOL_SEQ}.inflight")
+                os.replace(_spool_file(".jsonl"), inflight)
+                _INFLIGHT.append(inflight)
+            files = list(_INFLIGHT)
+        if overflow:
+            # the inflight files hold exactly the unwritten events, in order
+            written = 0
+            try:
+                for fp in files:
+                    written += _replay_file(fp)
+                    with _BUF_LOCK:
+                        _INFLIGHT.remove(fp)
+            except Exception:
+                with _BUF_LOCK:
+                    _OVERFLOW = True
+                raise
+            return written
+        try:
+            _write_batch(batch)
+        except Exception:
+            with _BUF_LOCK:
+                _PENDING[:0] = batch  # keep chain order for the retry
+            raise
+        with _BUF_LOCK:
+            for fp in files:
+                _remove_quietly(fp)
+                if fp in _INFLIGHT:
+                    _INFLIGHT.remove(fp)
+        return len(batch)
+
+
+def _ensure_partitions() -> None:
+    # a long-lived process must not run past its partitions into the default one
+    from models.audit_archive import ensure_audit_partitions
+    try:
+        ensure_audit_partitions()
+    except Exception:
+        log.exception("audit partition check failed")
+
+
+def _writer_loop() -> None:
+    try:
+        recover_audit_spool()
+    except Exception:
+        log.exception("audit spool recovery failed")
+    backoff = AUDIT_FLUSH_INTERVAL_SEC
+    # startup (app.py) just did the first check
+    next_check = time.monotonic() + AUDIT_PARTITION_CHECK_SEC
+    while not _STOP.is_set():
+        _WAKE.wait(backoff)
+        _WAKE.clear()
+        if AUDIT_PARTITION_CHECK_SEC > 0 and time.monotonic() >= next_check:
+            next_check = time.monotonic() + AUDIT_PARTITION_CHECK_SEC
+            _ensure_partitions()
+        try:
+            while _drain_once():
+                pass
+            backoff = AUDIT_FLUSH_INTERVAL_SEC
+        except Exception:
+            log.exception("audit batch write failed; events kept in spool")
+            backoff = min(max(backoff * 2, 1.0), 30.0)
+
+
+def flush_audit() -> None:
+    """Synchronously write every buffered event (tests, shutdown, read-your-writes)."""
+    while _drain_once():
+        pass
+
+
+def stop_audit_writer() -> None:
+    """Stop the writer thread and flush what is left (registered atexit)."""
+    global _WRITER, _SPOOL_FH, _LOCK_FH
+    _STOP.set()
+    _WAKE.set()
+    t = _WRITER
+    if t is not None and t is not threading.current_thread():
+        t.join(timeout=5)
+    _WRITER = None
+    try:
+        flush_audit()
+    except Exception:
+        # spool + lock stay on disk; the next process replays them
+        log.exception("final audit flush failed; events kept in spool")
+        return
+    with _BUF_LOCK:
+        if _SPOOL_FH is not None:
+            _SPOOL_FH.close()
+            _SPOOL_FH = None
+        if _LOCK_FH is not None:
+            _LOCK_FH.close()
+            _LOCK_FH = None
+            try:
+                os.remove(_spool_file(".lock"))
+            except OSError:
+                pass
+
+
+atexit.register(stop_audit_writer)
+
+
+def _flush_pending_quietly() -> None:
+    # read-your-writes for events still buffered in this process
+    try:
+        flush_audit()
+    except Exception:
+        log.exception("audit flush before read failed")
+
+
+def _claim_spool(token: str):
+    """
+    Lock file handle of a dead process's spool, held by the caller for the
+    whole replay; None while the owner (or another replayer) holds it.
+    """
+    lock_path = os.path.join(AUDIT_SPOOL_DIR, f"audit-{token}.lock")
+    if fcntl is None:
+        # no flock (dev boxes): a live pid owns its spool
+        pid = int(token.split("-", 1)[0])
+        try:
+            os.kill(pid, 0)
+            return None
+        except OSError:
+            return open(lock_path, "a+")
+    fh = open(lock_path, "a+")
+    try:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # a replayer that just finished unlinked the file we opened
+        if os.fstat(fh.fileno()).st_ino != os.stat(lock_path).st_ino:
+            raise OSError("stale lock file")
+    except OSError:
+        fh.close()
+        return None
+    return fh
+
+
+def _remove_quietly(fp: str) -> None:
+    try:
+        os.remove(fp)
+    except OSError:
+        pass
+
+
+def _read_offset(fp: str) -> int:
+    try:
+        with open(fp + ".offset", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _save_offset(fp: str, offset: int) -> None:
+    tmp = fp + ".offset.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(str(offset))
+    os.replace(tmp, fp + ".offset")
+
+
+def _read_spool(fp: str, offset: int = 0):
+    """Yield (event, end offset) for each complete line after `offset`."""
+    with open(fp, "rb") as f:
+        f.seek(offset)
+        for raw in f:
+            offset += len(raw)
+            line = raw.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line), offset
+            except ValueError:
+                # torn final write from the crash; everything before it is intact
+                return
+
+
+def _replay_file(fp: str) -> int:
+    """
+    Write one spool file in AUDIT_BATCH_SIZE batches, recording progress after
+    each commit, then delete it. Returns #events written by this call.
+    """
+    written = 0
+    batch, end = [], 0
+
+    def _commit():
+        nonlocal written, batch
+        _write_batch(batch)
+        written += len(batch)
+        batch = []
+        _save_offset(fp, end)
+
+    try:
+        for e, end in _read_spool(fp, _read_offset(fp)):
+            batch.append(e)
+            if len(batch) >= AUDIT_BATCH_SIZE:
+                _commit()
+    except FileNotFoundError:
+        return written
+    if batch:
+        _commit()
+    _remove_quietly(fp)
+    _remove_quietly(fp + ".offset")
+    return written
+
+
+def recover_audit_spool() -> int:
+    """Replay spool files left behind by dead processes. Returns #events written."""
+    if not os.path.isdir(AUDIT_SPOOL_DIR):
+        return 0
+    tokens = set()
+    for fp in glob.glob(os.path.join(AUDIT_SPOOL_DIR, "audit-*")):
+        # audit-<pid>-<rand>.jsonl | audit-<pid>-<rand>-<n>.inflight (+ .offset, .lock)
+        parts = os.path.basename(fp)[len("audit-"):].split(".")[0].split("-")
+        if len(parts) >= 2:
+            tokens.add(f"{parts[0]}-{parts[1]}")
+
+    written = 0
+    for token in sorted(tokens):
+        if token == _TOKEN:
+            continue
+        fh = _claim_spool(token)
+        if fh is None:
+            continue
+        try:
+            # listed under the lock, so a finished replay leaves nothing here
+            files = [fp for fp in glob.glob(os.path.join(AUDIT_SPOOL_DIR, f"audit-{token}*"))
+                     if fp.endswith((".jsonl", ".inflight"))]
+            # inflight segments are older than the live .jsonl
+            files.sort(key=lambda p: (p.endswith(".jsonl"), os.path.getmtime(p), p))
+            for fp in files:
+                written += _replay_file(fp)
+            for fp in glob.glob(os.path.join(AUDIT_SPOOL_DIR, f"audit-{token}*.offset*")):
+                _remove_quietly(fp)
+            _remove_quietly(os.path.join(AUDIT_SPOOL_DIR, f"audit-{token}.lock"))
+        finally:
+            fh.close()
+    return written
 
 
 def audit(
@@ -276,69 +937,20 @@ def audit(
     extra: Optional[dict[str, Any]] = None,
     actor: Optional[str] = None
 ) -> None:
-    # open one writer session for the whole operation
-    with audit_session_scope() as s:
-        ts = _now_isoz_from_db(s)  # <-- no extra () and s exists
-
-        # (unchanged) request context / actor extraction
-        ip = ua = method = path = req_id = sess_id = None
-        if has_request_context():
-            try:
-                fwd = request.headers.get("X-Forwarded-For", "")
-                ip = (fwd.split(",")[0].strip() or request.remote_addr)
-            except Exception:
-                ip = None
-            method = request.method
-            path = request.path
-            req_id = getattr(g, "request_id", None) or request.headers.get(
-                "X-Request-ID")
-            cookie_name = getattr(
-                current_app, "session_cookie_name", None) or "session"
-            sess_raw = request.cookies.get(cookie_name, None)
-            sess_id = _fingerprint(sess_raw, 64)
-            ua_full = request.user_agent.string if request.user_agent else None
-            ua = ua_full if RAW_UA else _ua_fingerprint(ua_full)
-            ip = _anon_ip(ip)
-
-        if actor is None:
-            try:
-                actor = getattr(current_user, "username", None) or "anonymous"
-                actor_role = getattr(current_user, "role", None)
-            except Exception:
-                actor, actor_role = "anonymous", None
-        else:
-            actor_role = None
-
-        payload = {
-            "ts": ts, "actor": actor, "actor_role": actor_role,
-            "request_id": req_id, "session_id": sess_id,
-            "ip": ip, "ua": ua, "method": method, "path": path,
-            "action": action, "target_type": target_type, "target_id": target_id,
-            "outcome": outcome, "status": status, "error_code": error_code,
-            "extra": _clean_extra(extra or {}),
-            "schema_version": SCHEMA_VERSION,
-            "key_id": SIGNING_KEY_ID,
-        }
-
-        prev = _latest_hash_with(s)  # reuse same session
-        h = _compute_hash(prev, payload)
-        sig = _sign(h)
-
-        s.add(AuditLog(
-            ts=ts,
-            actor=actor, actor_role=actor_role,
-            request_id=req_id, session_id=sess_id,
-            ip=ip, ua_fingerprint=(ua if not RAW_UA else None),
-            method=method, path=path,
-            action=action, target_type=target_type, target_id=target_id,
-            outcome=outcome, status=status, error_code=error_code,
-            extra=payload["extra"],
-            prev_hash=prev, hash=h, signature=sig, schema_version=SCHEMA_VERSION,
-            key_id=SIGNING_KEY_ID
-        ))
+    payload = _build_payload(
+        action, target_type=target_type, target_id=target_id,
+        outcome=outcome, status=status, error_code=error_code,
+        extra=extra, actor=actor,
+    )
+    if _async_enabled():
+        # request path only appends to the local spool; never waits on the DB
+        _enqueue(payload)
+    else:
+        _write_batch([payload])
 
 
 def list_audit(limit: int = 500) -> list[dict]:
+    _flush_pending_quietly()
     with session_scope() as s:
         rows = s.execute(
             select(AuditLog).order_by(AuditLog.id.desc()).limit(limit)
@@ -368,47 +980,27 @@ def list_audit(limit: int = 500) -> list[dict]:
 
 
 def export_csv() -> tuple[str, str]:
+    """Hot-tier rows only; archived months live in their segment files."""
     import io
     import csv
-    with session_scope() as s:
-        rows = s.execute(
-            select(AuditLog).order_by(AuditLog.id.desc())
-        ).scalars().all()
-
-        # Build tuples using existing columns; prefer ua_fingerprint over ua (which doesn’t exist)
-        data = [(
-            r.id,
-            r.ts,
-            r.actor,
-            r.ip,
-            getattr(r, "ua_fingerprint", None),
-            r.method,
-            r.path,
-            r.action,
-            getattr(r, "target_type", None),
-            getattr(r, "target_id", None),
-            r.status,
-            getattr(r, "outcome", None),
-            getattr(r, "error_code", None),
-            getattr(r, "actor_role", None),
-            getattr(r, "request_id", None),
-            getattr(r, "session_id", None),
-            getattr(r, "schema_version", None),
-            getattr(r, "prev_hash", None),
-            getattr(r, "hash", None),
-            getattr(r, "signature", None),
-            getattr(r, "key_id", None),
-            r.extra,
-        ) for r in rows]
-
-    out = io.StringIO()
-    w = csv.writer(out)
-    w.writerow([
+    _flush_pending_quietly()
+    cols = [
         "id", "ts", "actor", "ip", "ua_fingerprint", "method", "path", "action",
         "target_type", "target_id", "status", "outcome", "error_code", "actor_role",
         "request_id", "session_id", "schema_version", "prev_hash", "hash", "signature",
         "key_id", "extra",
-    ])
-    w.writerows(data)
+    ]
+    out = io.StringIO()
+    w = csv.writer(out)
+    w.writerow(cols)
+    with session_scope() as s:
+        # stream straight into the writer instead of hydrating every row
+        rows = s.execute(
+            select(*(AuditLog.__table__.c[c] for c in cols))
+            .order_by(AuditLog.id.desc())
+            .execution_options(stream_results=True, yield_per=AUDIT_VERIFY_YIELD_PER)
+        )
+        for r in rows:
+            w.writerow(r)
     out.seek(0)
     return ("audit_export.csv", out.read())
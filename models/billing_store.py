@@ -2,7 +2,7 @@
 from services.org_info import ORG_INFO
 import json
 from services.datetimex import now_utc, APP_TZ
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, func, tuple_
 from zoneinfo import ZoneInfo
 from typing import Iterable, Tuple, List
 from datetime import date, datetime, time, timezone
@@ -108,11 +108,33 @@ def list_receipts(username: str | None = None) -> list[dict]:
 
 
 # models/billing_store.py
-def get_receipt_with_items(receipt_id: int) -> tuple[dict, list[dict]]:
-    def _money(x: Decimal | None) -> float:
-        # UI still expects numbers; convert safely
-        return float(D(x).quantize(Decimal("0.01")))
+def _money(x: Decimal | None) -> float:
+    # UI still expects numbers; convert safely
+    return float(D(x).quantize(Decimal("0.01")))
+
+
+def _receipt_dict(r: Receipt) -> dict:
+    return {
+        "id": r.id, "username": r.username, "start": r.start, "end": r.end,
+        "status": r.status, "created_at": r.created_at, "paid_at": r.paid_at,
+        "method": r.method, "tx_ref": r.tx_ref,
+        "invoice_no": r.invoice_no, "approved_by": r.approved_by, "approved_at": r.approved_at,
+        "pricing_tier": r.pricing_tier, "rate_cpu": float(D(r.rate_cpu)),
+        "rate_gpu": float(D(r.rate_gpu)), "rate_mem": float(D(r.rate_mem)),
+        "rates_locked_at": r.rates_locked_at,
+
+        # NEW fields the template needs
+        "currency": r.currency or 'THB',
+        "subtotal": _money(r.subtotal),
+        "tax_label": r.tax_label,
+        "tax_rate": float(D(r.tax_rate)),
+        "tax_amount": _money(r.tax_amount),
+        "total": _money(r.total),        # keep total as gross
+        "tax_inclusive": bool(r.tax_inclusive or 0),
+    }
+
 
+def get_receipt_with_items(receipt_id: int) -> tuple[dict, list[dict]]:
     with session_scope() as s:
         r = s.get(Receipt, receipt_id)
         if not r:
@@ -122,24 +144,7 @@ def get_receipt_with_items(receipt_id: int) -> tuple[dict, list[dict]]:
                                       receipt_id).order_by(ReceiptItem.job_id_display)
         ).scalars().all()
         return (
-            {
-                "id": r.id, "username": r.username, "start": r.start, "end": r.end,
-                "status": r.status, "created_at": r.created_at, "paid_at": r.paid_at,
-                "method": r.method, "tx_ref": r.tx_ref,
-                "invoice_no": r.invoice_no, "approved_by": r.approved_by, "approved_at": r.approved_at,
-                "pricing_tier": r.pricing_tier, "rate_cpu": float(D(r.rate_cpu)),
-                "rate_gpu": float(D(r.rate_gpu)), "rate_mem": float(D(r.rate_mem)),
-                "rates_locked_at": r.rates_locked_at,
-
-                # NEW fields the template needs
-                "currency": r.currency or 'THB',
-                "subtotal": _money(r.subtotal),
-                "tax_label": r.tax_label,
-                "tax_rate": float(D(r.tax_rate)),
-                "tax_amount": _money(r.tax_amount),
-                "total": _money(r.total),        # keep total as gross
-                "tax_inclusive": bool(r.tax_inclusive or 0),
-            },
+            _receipt_dict(r),
             [
                 {
                     "receipt_id": i.receipt_id, "job_key": i.job_key, "job_id_display": i.job_id_display,
@@ -150,6 +155,91 @@ def get_receipt_with_items(receipt_id: int) -> tuple[dict, list[dict]]:
         )
 
 
+RECEIPT_ITEMS_PAGE = int(os.getenv("RECEIPT_ITEMS_PAGE", "2000"))
+
+_NO_ITEMS = {"cpu_core_hours": 0.0, "gpu_hours": 0.0,
+             "mem_gb_hours": 0.0, "cost": 0.0, "lines": 0}
+
+
+def _item_totals_select():
+    return select(
+        ReceiptItem.receipt_id,
+        func.coalesce(func.sum(ReceiptItem.cpu_core_hours), 0),
+        func.coalesce(func.sum(ReceiptItem.gpu_hours), 0),
+        func.coalesce(func.sum(ReceiptItem.mem_gb_hours), 0),
+        func.coalesce(func.sum(ReceiptItem.cost), 0),
+        func.count(),
+    ).group_by(ReceiptItem.receipt_id)
+
+
+def _totals_dict(cpu, gpu, mem, cost, lines) -> dict:
+    return {"cpu_core_hours": float(cpu), "gpu_hours": float(gpu),
+            "mem_gb_hours": float(mem), "cost": _money(cost), "lines": int(lines)}
+
+
+def get_receipt_summary(receipt_id: int) -> tuple[dict, dict]:
+    """
+    -> (receipt dict, resource totals) without loading the item lines.
+    Totals are summed in SQL: cpu_core_hours, gpu_hours, mem_gb_hours, cost, lines.
+    """
+    with session_scope() as s:
+        r = s.get(Receipt, receipt_id)
+        if not r:
+            return {}, {}
+        row = s.execute(_item_totals_select().where(
+            ReceiptItem.receipt_id == receipt_id)).first()
+        return _receipt_dict(r), (_totals_dict(*row[1:]) if row else dict(_NO_ITEMS))
+
+
+def receipt_summaries_for_month(year: int, month: int) -> list[tuple[dict, dict]]:
+    """
+    (receipt dict, totals) of every non-void receipt whose service period
+    starts in local year-month, ordered by receipt id. Two queries in total.
+    """
+    lo, hi = _month_bounds_local_utc(year, month)
+    in_month = (Receipt.start >= lo, Receipt.start <= hi, Receipt.status != "void")
+    with session_scope() as s:
+        recs = [_receipt_dict(r) for r in s.execute(
+            select(Receipt).where(*in_month).order_by(Receipt.id)).scalars()]
+        totals = {
+            row[0]: _totals_dict(*row[1:])
+            for row in s.execute(
+                _item_totals_select()
+                .join(Receipt, Receipt.id == ReceiptItem.receipt_id)
+                .where(*in_month))
+        }
+    return [(rec, totals.get(rec["id"], dict(_NO_ITEMS))) for rec in recs]
+
+
+def iter_receipt_items(receipt_id: int, page_size: int | None = None):
+    """
+    Lazily yield the item dicts of a receipt in job_id_display order,
+    RECEIPT_ITEMS_PAGE rows per query (keyset pagination, no ORM objects).
+    """
+    page_size = page_size or RECEIPT_ITEMS_PAGE
+    cols = (ReceiptItem.receipt_id, ReceiptItem.job_key, ReceiptItem.job_id_display,
+            ReceiptItem.cost, ReceiptItem.cpu_core_hours, ReceiptItem.gpu_hours,
+            ReceiptItem.mem_gb_hours)
+    after = None
+    while True:
+        q = select(*cols).where(ReceiptItem.receipt_id == receipt_id)
+        if after is not None:
+            q = q.where(tuple_(ReceiptItem.job_id_display, ReceiptItem.job_key) > after)
+        q = q.order_by(ReceiptItem.job_id_display,
+                       ReceiptItem.job_key).limit(page_size)
+        with session_scope() as s:
+            rows = s.execute(q).all()
+        for i in rows:
+            yield {
+                "receipt_id": i.receipt_id, "job_key": i.job_key, "job_id_display": i.job_id_display,
+                "cost": _money(i.cost), "cpu_core_hours": float(i.cpu_core_hours or 0),
+                "gpu_hours": float(i.gpu_hours or 0), "mem_gb_hours": float(i.mem_gb_hours or 0),
+            }
+        if len(rows) < page_size:
+            return
+        after = (rows[-1].job_id_display, rows[-1].job_key)
+
+
 def _tz_from_app() -> ZoneInfo:
     # APP_TZ may be a string ("Asia/Bangkok") or a tzinfo (pytz/zoneinfo).
     tzname = getattr(APP_TZ, "key", None) or getattr(
@@ -336,6 +426,39 @@ def admin_list_receipts(status: str | None = None) -> list[dict]:
         return out
 
 
+def journal_receipts_between(start: date, end: date) -> list[dict]:
+    """
+    Receipts that can put a derived journal line in [start, end]: service end,
+    issue (created_at) or payment date inside the window. Bounds are padded a
+    day on each side so the caller can filter by its own calendar date.
+    Only the fields services.accounting needs are loaded.
+    """
+    from datetime import timedelta
+    from sqlalchemy import or_, and_
+
+    lo = _day_start_utc(start - timedelta(days=1))
+    hi = _day_end_utc(end + timedelta(days=1))
+
+    def _in(col):
+        return and_(col >= lo, col <= hi)
+
+    with session_scope() as s:
+        rows = s.execute(
+            select(Receipt.id, Receipt.username, Receipt.start, Receipt.end,
+                   Receipt.status, Receipt.created_at, Receipt.paid_at, Receipt.total)
+            .where(or_(_in(Receipt.end), _in(Receipt.created_at), _in(Receipt.paid_at)))
+            .order_by(Receipt.id)
+        ).all()
+    return [
+        {
+            "id": r.id, "username": r.username, "start": r.start, "end": r.end,
+            "status": r.status, "created_at": r.created_at, "paid_at": r.paid_at,
+            "total": float(D(r.total).quantize(Decimal("0.01"))),
+        }
+        for r in rows
+    ]
+
+
 def mark_receipt_paid(receipt_id: int, actor: str) -> bool:
     """
     Mark a receipt as paid and create:
@@ -703,16 +826,27 @@ def bulk_void_pending_invoices_for_month(year: int, month: int, actor: str, reas
 
 def build_etax_payload(receipt_id: int) -> dict:
     """Return a stable, compliance-ready JSON snapshot for this receipt."""
-    rec, items = get_receipt_with_items(receipt_id)
+    rec, totals = get_receipt_summary(receipt_id)
     if not rec:
         return {}
+    return _etax_payload(rec, totals, ORG_INFO() or {})
 
+
+def etax_payloads_for_month(year: int, month: int):
+    """
+    Yield the e-Tax payload of every non-void receipt whose service period
+    starts in local year-month, ordered by receipt id.
+    """
     org = ORG_INFO() or {}
-    # aggregate lines exactly like the PDF
-    cpu_qty = sum(i["cpu_core_hours"] for i in items)
-    gpu_qty = sum(i["gpu_hours"] for i in items)
-    mem_qty = sum(i["mem_gb_hours"] for i in items)
+    for rec, totals in receipt_summaries_for_month(year, month):
+        yield _etax_payload(rec, totals, org)
+
 
+def _etax_payload(rec: dict, totals: dict, org: dict) -> dict:
+    # aggregate lines exactly like the PDF
+    cpu_qty = totals["cpu_core_hours"]
+    gpu_qty = totals["gpu_hours"]
+    mem_qty = totals["mem_gb_hours"]
     cpu_amt = round(cpu_qty * rec["rate_cpu"], 2)
     gpu_amt = round(gpu_qty * rec["rate_gpu"], 2)
     mem_amt = round(mem_qty * rec["rate_mem"], 2)
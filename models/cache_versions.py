@@ -0,0 +1,85 @@
+# models/cache_versions.py
+"""
+Process-local caches for small, read-mostly tables (rates, tier overrides).
+
+Every write to a cached table calls bump_version(s, name) inside its own
+transaction, which increments a row in cache_versions. A VersionedCache keeps
+the last loaded value with the version it was loaded at; it re-reads the
+version row at most every CACHE_VERSION_CHECK_SEC and reloads only when the
+number moved. Writes made by this process also drop the local copy at once,
+so other workers see a change within the check interval and this one
+immediately.
+"""
+from __future__ import annotations
+import copy
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from models.base import session_scope
+from models.schema import CacheVersion
+
+CACHE_VERSION_CHECK_SEC = float(os.getenv("CACHE_VERSION_CHECK_SEC", "2"))
+
+_caches: list["VersionedCache"] = []
+
+
+def bump_version(s, name: str) -> None:
+    """Increment the version of `name` in the caller's transaction."""
+    ins = pg_insert(CacheVersion).values(
+        name=name, version=1, updated_at=datetime.now(timezone.utc))
+    s.execute(ins.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"version": CacheVersion.version + 1,
+              "updated_at": ins.excluded.updated_at},
+    ))
+
+
+def current_version(name: str) -> int:
+    with session_scope() as s:
+        return int(s.scalar(select(CacheVersion.version)
+                            .where(CacheVersion.name == name)) or 0)
+
+
+class VersionedCache:
+    """Holds loader() for one cache_versions name; get() hands out copies."""
+
+    def __init__(self, name: str, loader, copier=copy.deepcopy):
+        self.name = name
+        self._loader = loader
+        self._copy = copier
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = None
+        self._checked = 0.0
+        _caches.append(self)
+
+    def get(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._value is not None and now - self._checked < CACHE_VERSION_CHECK_SEC:
+                return self._copy(self._value)
+        ver = current_version(self.name)
+        with self._lock:
+            if self._value is not None and ver == self._version:
+                self._checked = now
+                return self._copy(self._value)
+        value = self._loader()
+        with self._lock:
+            self._value, self._version, self._checked = value, ver, now
+        return self._copy(value)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._value = None
+            self._version = None
+
+
+def clear_caches() -> None:
+    """Drop every local copy (tests, or after changing tables by hand)."""
+    for c in _caches:
+        c.invalidate()
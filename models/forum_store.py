@@ -0,0 +1,233 @@
+# models/forum_store.py
+"""
+Denormalized counters on forum_threads, so list pages never aggregate votes
+or comments:
+
+- score: SUM(forum_thread_votes.value)
+- comment_count: comments that are not deleted
+- last_comment_at: newest comment that is not deleted, else the thread's created_at
+
+The helpers below run relative UPDATEs in the caller's transaction (the one
+that writes the vote or comment), so concurrent writers cannot lose an
+increment. rebuild_thread_counters() recomputes everything from the source
+tables (scripts/rebuild_forum_counters.py).
+
+load_thread_view() reads everything the thread page shows in two queries.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import select, update, func, text, tuple_
+from sqlalchemy.orm import joinedload
+
+from models.base import session_scope, init_engine_and_session
+from models.schema import (
+    ForumThread, ForumComment, ForumThreadVote, ForumCommentVote, ForumSolution,
+)
+
+
+def _update_thread(thread_id: int, **values):
+    # keep updated_at for edits of the thread itself
+    return (update(ForumThread)
+            .where(ForumThread.id == thread_id)
+            .values(updated_at=ForumThread.updated_at, **values)
+            .execution_options(synchronize_session="fetch"))
+
+
+def _last_visible_comment(thread_col):
+    return (select(func.max(ForumComment.created_at))
+            .where(ForumComment.thread_id == thread_col,
+                   ForumComment.is_deleted.is_(False))
+            .scalar_subquery())
+
+
+def add_thread_score(s, thread_id: int, delta: int) -> None:
+    if delta:
+        s.execute(_update_thread(thread_id, score=ForumThread.score + delta))
+
+
+def comment_added(s, thread_id: int, created_at: datetime) -> None:
+    s.execute(_update_thread(
+        thread_id,
+        comment_count=ForumThread.comment_count + 1,
+        last_comment_at=func.greatest(ForumThread.last_comment_at, created_at),
+    ))
+
+
+def comment_removed(s, thread_id: int) -> None:
+    """After a comment was soft-deleted (and flushed) in this session."""
+    s.execute(_update_thread(
+        thread_id,
+        comment_count=func.greatest(ForumThread.comment_count - 1, 0),
+        last_comment_at=func.coalesce(_last_visible_comment(ForumThread.id),
+                                      ForumThread.created_at),
+    ))
+
+
+def rebuild_thread_counters(thread_id: int | None = None) -> int:
+    """Recompute the counters of one thread (or all). Returns the rows updated."""
+    score = (select(func.coalesce(func.sum(ForumThreadVote.value), 0))
+             .where(ForumThreadVote.thread_id == ForumThread.id)
+             .scalar_subquery())
+    count = (select(func.count())
+             .where(ForumComment.thread_id == ForumThread.id,
+                    ForumComment.is_deleted.is_(False))
+             .scalar_subquery())
+    stmt = update(ForumThread).values(
+        updated_at=ForumThread.updated_at,
+        score=score,
+        comment_count=count,
+        last_comment_at=func.coalesce(_last_visible_comment(ForumThread.id),
+                                      ForumThread.created_at),
+    )
+    if thread_id is not None:
+        stmt = stmt.where(ForumThread.id == thread_id)
+    with session_scope() as s:
+        return s.execute(stmt.execution_options(synchronize_session=False)).rowcount
+
+
+def _counter_indexes():
+    # only the indexes this module owns; ix_forum_threads_search needs search_doc
+    # and comes from models.search_store.ensure_search_index()
+    for ix in (*ForumThread.__table__.indexes, *ForumComment.__table__.indexes):
+        if (ix.name.startswith("ix_forum_threads_sort_")
+                or ix.name == "ix_forum_comments_thread_created"):
+            yield ix
+
+
+def ensure_thread_counter_columns() -> bool:
+    """
+    Add the counter columns and sort indexes to a forum_threads table created
+    before them and fill the counters. Cheap once they exist (runs at app
+    startup). -> True if the columns had to be added.
+    """
+    engine, _ = init_engine_and_session()
+    with engine.begin() as conn:
+        ready = conn.execute(text(
+            "SELECT count(*) FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = 'forum_threads' "
+            "AND column_name IN ('score', 'comment_count', 'last_comment_at') "
+            "AND is_nullable = 'NO'")).scalar_one() == 3
+        if not ready:
+            conn.execute(text(
+                "ALTER TABLE forum_threads "
+                "ADD COLUMN IF NOT EXISTS score integer NOT NULL DEFAULT 0, "
+                "ADD COLUMN IF NOT EXISTS comment_count integer NOT NULL DEFAULT 0, "
+                "ADD COLUMN IF NOT EXISTS last_comment_at timestamptz"))
+            conn.execute(text(
+                "UPDATE forum_threads SET last_comment_at = created_at "
+                "WHERE last_comment_at IS NULL"))
+            conn.execute(text(
+                "ALTER TABLE forum_threads ALTER COLUMN last_comment_at SET NOT NULL"))
+        for ix in _counter_indexes():
+            ix.create(conn, checkfirst=True)
+    if not ready:
+        rebuild_thread_counters()
+    return not ready
+
+
+# ---- thread page ----
+
+@dataclass
+class ThreadView:
+    thread: ForumThread
+    my_vote: int
+    solutions: list
+    # one page of top-level comments plus all of their replies, oldest first
+    comments: list
+    comment_scores: dict = field(default_factory=dict)
+    my_comment_votes: dict = field(default_factory=dict)
+    page: int = 1
+    pages: int = 1
+
+
+def _root_count(thread_id: int):
+    return (select(func.count())
+            .where(ForumComment.thread_id == thread_id, ForumComment.parent_id.is_(None))
+            .scalar_subquery())
+
+
+def load_thread_view(s, thread_id: int, viewer: str | None, page: int = 1,
+                     per_page: int = 50) -> ThreadView | None:
+    """
+    The thread page in two round trips, paginated by top-level comment:
+
+    1. the thread (author joined), the viewer's vote, the number of
+       top-level comments and the solutions with their comments;
+    2. the page's top-level comments and their reply trees (recursive CTE),
+       each with its vote total and the viewer's vote.
+
+    The thread score is the stored counter. None when the thread does not exist.
+    """
+    my_vote = (select(ForumThreadVote.value)
+               .where(ForumThreadVote.thread_id == thread_id,
+                      ForumThreadVote.username == viewer)
+               .scalar_subquery())
+    row = s.execute(
+        select(ForumThread, func.coalesce(my_vote, 0), _root_count(thread_id))
+        .where(ForumThread.id == thread_id)
+        .options(joinedload(ForumThread.solutions)
+                 .joinedload(ForumSolution.comment))
+    ).unique().first()
+    if row is None:
+        return None
+    t, my, roots = row
+    pages = max(1, -(-roots // per_page))
+    page = min(max(page, 1), pages)
+
+    top = (select(ForumComment.id)
+           .where(ForumComment.thread_id == thread_id, ForumComment.parent_id.is_(None))
+           .order_by(ForumComment.created_at, ForumComment.id)
+           .offset((page - 1) * per_page)
+           .limit(per_page)
+           .subquery())
+    tree = select(top.c.id).cte("tree", recursive=True)
+    tree = tree.union_all(
+        select(ForumComment.id).where(ForumComment.parent_id == tree.c.id))
+    scores = (select(ForumCommentVote.comment_id,
+                     func.sum(ForumCommentVote.value).label("score"))
+              .where(ForumCommentVote.comment_id.in_(select(tree.c.id)))
+              .group_by(ForumCommentVote.comment_id)
+              .subquery())
+    mine = (select(ForumCommentVote.comment_id, ForumCommentVote.value)
+            .where(ForumCommentVote.username == viewer)
+            .subquery())
+    rows = s.execute(
+        select(ForumComment, scores.c.score, mine.c.value)
+        .join(tree, tree.c.id == ForumComment.id)
+        .outerjoin(scores, scores.c.comment_id == ForumComment.id)
+        .outerjoin(mine, mine.c.comment_id == ForumComment.id)
+        .order_by(ForumComment.created_at, ForumComment.id)
+    ).unique().all()
+
+    return ThreadView(
+        thread=t,
+        my_vote=my,
+        solutions=[sol for sol in t.solutions
+                   if sol.comment is not None and not sol.comment.is_deleted],
+        comments=[c for c, _score, _mine in rows],
+        comment_scores={c.id: score for c, score, _mine in rows if score},
+        my_comment_votes={c.id: v for c, _score, v in rows if v},
+        page=page,
+        pages=pages,
+    )
+
+
+def comment_page(s, thread_id: int, comment_id: int, per_page: int = 50) -> int | None:
+    """The load_thread_view() page that shows `comment_id` (None if not in the thread)."""
+    up = (select(ForumComment.id, ForumComment.parent_id, ForumComment.created_at)
+          .where(ForumComment.id == comment_id, ForumComment.thread_id == thread_id)
+          .cte("up", recursive=True))
+    up = up.union_all(
+        select(ForumComment.id, ForumComment.parent_id, ForumComment.created_at)
+        .where(ForumComment.id == up.c.parent_id))
+    root = select(up.c.id, up.c.created_at).where(up.c.parent_id.is_(None)).subquery()
+    before = (select(func.count())
+              .where(ForumComment.thread_id == thread_id,
+                     ForumComment.parent_id.is_(None),
+                     tuple_(ForumComment.created_at, ForumComment.id)
+                     < tuple_(root.c.created_at, root.c.id))
+              .scalar_subquery())
+    n = s.execute(select(before).select_from(root)).scalar_one_or_none()
+    return None if n is None else n // per_page + 1
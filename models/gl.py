@@ -1,11 +1,12 @@
 # models/gl.py
 from __future__ import annotations
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.orm import Mapped, mapped_column, Session
 from sqlalchemy import (
     JSON, String, Integer, Numeric, DateTime, Text, ForeignKey,
-    UniqueConstraint, CheckConstraint, Index
+    UniqueConstraint, CheckConstraint, Index, event, select, func, extract, cast
 )
-from datetime import datetime, date, timezone
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime, timezone
 from models.base import Base
 
 
@@ -145,3 +146,127 @@ class GLEntry(Base):
         Index("idx_gl_acct", "account_id"),
         Index("idx_gl_receipt", "receipt_id"),
     )
+
+
+class AccountBalance(Base):
+    """
+    Running debit/credit totals per (account, UTC month) over gl_entries.
+    Maintained in the same transaction as the GL lines (see listeners below),
+    including ORM bulk delete()/update() and batch deletes that cascade to
+    their lines. SQL run straight on a Connection bypasses the listeners;
+    run services.gl_balances.rebuild_account_balances() after it.
+    """
+    __tablename__ = "gl_account_balances"
+    account_id: Mapped[str] = mapped_column(String(8), primary_key=True)
+    period_year: Mapped[int] = mapped_column(Integer, primary_key=True)
+    period_month: Mapped[int] = mapped_column(Integer, primary_key=True)
+    account_name: Mapped[str] = mapped_column(String(64), nullable=False)
+    account_type: Mapped[str] = mapped_column(String(16), nullable=False)
+    debit: Mapped[float] = mapped_column(
+        Numeric(18, 2), nullable=False, default=0)
+    credit: Mapped[float] = mapped_column(
+        Numeric(18, 2), nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(
+        timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("idx_gl_bal_period", "period_year", "period_month"),
+    )
+
+
+_BAL_COLS = ["account_id", "period_year", "period_month",
+             "account_name", "account_type", "debit", "credit"]
+
+
+def balance_rows_select(*where, sign: int = 1):
+    """SELECT of gl_entries summed per (account, UTC month), shaped like gl_account_balances."""
+    utc = func.timezone("UTC", GLEntry.date)
+    y = cast(extract("year", utc), Integer)
+    m = cast(extract("month", utc), Integer)
+    return (
+        select(
+            GLEntry.account_id, y, m,
+            func.max(GLEntry.account_name), func.max(GLEntry.account_type),
+            sign * func.sum(GLEntry.debit), sign * func.sum(GLEntry.credit),
+        )
+        .where(*where)
+        .group_by(GLEntry.account_id, y, m)
+    )
+
+
+def apply_balance_delta(conn, entry_ids, sign: int = 1) -> None:
+    """Fold the given gl_entries rows into gl_account_balances (sign=-1 removes them)."""
+    if not entry_ids:
+        return
+    ins = pg_insert(AccountBalance).from_select(
+        _BAL_COLS, balance_rows_select(GLEntry.id.in_(list(entry_ids)), sign=sign))
+    conn.execute(ins.on_conflict_do_update(
+        index_elements=["account_id", "period_year", "period_month"],
+        set_={
+            "debit": AccountBalance.debit + ins.excluded.debit,
+            "credit": AccountBalance.credit + ins.excluded.credit,
+            "account_name": ins.excluded.account_name,
+            "account_type": ins.excluded.account_type,
+            "updated_at": func.now(),
+        },
+    ))
+
+
+_BAL_READD_KEY = "_gl_balance_readd"
+
+
+@event.listens_for(Session, "before_flush")
+def _gl_balances_before_flush(session, flush_context, instances):
+    # deleted/edited lines: back out what the DB currently holds for them
+    session.info.pop(_BAL_READD_KEY, None)
+    gone = [o.id for o in session.deleted
+            if isinstance(o, GLEntry) and o.id is not None]
+    batches = [o.id for o in session.deleted
+               if isinstance(o, JournalBatch) and o.id is not None]
+    if batches:
+        # ON DELETE CASCADE removes these lines without the ORM seeing them
+        gone += session.connection().execute(
+            select(GLEntry.id).where(GLEntry.batch_id.in_(batches),
+                                     GLEntry.id.notin_(gone))).scalars().all()
+    edited = [o.id for o in session.dirty
+              if isinstance(o, GLEntry) and o.id is not None
+              and session.is_modified(o, include_collections=False)]
+    if gone or edited:
+        apply_balance_delta(session.connection(), gone + edited, sign=-1)
+    if edited:
+        session.info.setdefault(_BAL_READD_KEY, []).extend(edited)
+
+
+@event.listens_for(Session, "after_flush")
+def _gl_balances_after_flush(session, flush_context):
+    ids = [o.id for o in session.new if isinstance(o, GLEntry)]
+    ids += session.info.pop(_BAL_READD_KEY, [])
+    if ids:
+        apply_balance_delta(session.connection(), ids, sign=1)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _gl_balances_bulk(state):
+    # session.execute(delete(GLEntry)/update(GLEntry)/delete(JournalBatch))
+    if not (state.is_delete or state.is_update) or state.bind_mapper is None:
+        return None
+    model = state.bind_mapper.class_
+    where = state.statement.whereclause
+    if model is GLEntry:
+        ids_q = select(GLEntry.id)
+        if where is not None:
+            ids_q = ids_q.where(where)
+    elif model is JournalBatch and state.is_delete:
+        batch_q = select(JournalBatch.id)
+        if where is not None:
+            batch_q = batch_q.where(where)
+        ids_q = select(GLEntry.id).where(GLEntry.batch_id.in_(batch_q))
+    else:
+        return None
+    conn = state.session.connection()
+    ids = conn.execute(ids_q).scalars().all()
+    apply_balance_delta(conn, ids, sign=-1)
+    result = state.invoke_statement()
+    if state.is_update:
+        apply_balance_delta(conn, ids, sign=1)
+    return result
@@ -4,6 +4,7 @@ from datetime import datetime, timezone
 from decimal import Decimal
 from sqlalchemy import select
 from models.base import session_scope
+from models.cache_versions import VersionedCache, bump_version
 from models.schema import Rate
 
 DEFAULT_RATES = {
@@ -22,29 +23,52 @@ def _D(x) -> Decimal:
     return x if isinstance(x, Decimal) else Decimal(str(x))
 
 
+_seeded = False
+
+
 def _seed_missing():
+    global _seeded
+    if _seeded:
+        return
     with session_scope() as s:
-        existing = {r.tier for r in s.execute(select(Rate)).scalars().all()}
-        for tier, r in DEFAULT_RATES.items():
-            if tier not in existing:
-                s.add(Rate(
-                    tier=tier,
-                    cpu=_D(r["cpu"]), gpu=_D(r["gpu"]), mem=_D(r["mem"]),
-                    updated_at=_now_utc(),
-                ))
+        existing = set(s.execute(select(Rate.tier)).scalars().all())
+        missing = [t for t in DEFAULT_RATES if t not in existing]
+        for tier in missing:
+            r = DEFAULT_RATES[tier]
+            s.add(Rate(
+                tier=tier,
+                cpu=_D(r["cpu"]), gpu=_D(r["gpu"]), mem=_D(r["mem"]),
+                updated_at=_now_utc(),
+            ))
+        if missing:
+            bump_version(s, "rates")
+    _seeded = True
 
 
-def load_rates() -> dict:
+def _read_rates() -> dict:
     _seed_missing()
     with session_scope() as s:
         rows = s.execute(select(Rate)).scalars().all()
-        out = DEFAULT_RATES.copy()
+        out = {k: dict(v) for k, v in DEFAULT_RATES.items()}
         for r in rows:
             out[r.tier] = {"cpu": float(r.cpu), "gpu": float(
                 r.gpu), "mem": float(r.mem)}
         return out
 
 
+_cache = VersionedCache("rates", _read_rates)
+
+
+def seed_rates() -> None:
+    """Insert any missing default tiers (once per process; called at startup)."""
+    _seed_missing()
+
+
+def load_rates() -> dict:
+    """{tier: {cpu, gpu, mem}}; served from the process cache (see models/cache_versions.py)."""
+    return _cache.get()
+
+
 def save_rates(rates: dict) -> None:
     clean = {(k or "").lower(): v for k, v in (rates or {}).items()}
     now = _now_utc()
@@ -63,7 +87,9 @@ def save_rates(rates: dict) -> None:
                 obj.mem = _D(r["mem"])
                 obj.updated_at = now
             s.add(obj)
+        bump_version(s, "rates")
+    _cache.invalidate()
 
 
 def get_rate_for_tier(tier: str) -> dict:
-    return load_rates().get((tier or "mu").lower(), DEFAULT_RATES["mu"])
+    return load_rates().get((tier or "mu").lower(), dict(DEFAULT_RATES["mu"]))
@@ -1,5 +1,5 @@
 # models/schema.py
-from sqlalchemy import SmallInteger
+from sqlalchemy import SmallInteger, DDL, event
 from datetime import datetime, timezone
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy import ForeignKey, Text, String, Integer, DateTime, Index
@@ -14,6 +14,15 @@ from sqlalchemy.orm import Mapped, mapped_column
 from models.base import Base
 from datetime import datetime
 from typing import Optional
+import os
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+# text search configuration baked into the search triggers and used by
+# models.search_store queries ('simple' = no stemming, any language)
+SEARCH_TS_CONFIG = os.getenv("SEARCH_TS_CONFIG", "english")
+# characters of a title/body/comment that are indexed; keeps every
+# tsvector far below Postgres' 1 MB limit
+SEARCH_MAX_CHARS = int(os.getenv("SEARCH_MAX_CHARS", "100000"))
 # --- USERS (users.sqlite3)
 
 
@@ -134,6 +143,15 @@ class Rate(Base):
         DateTime(timezone=True), nullable=False)
 
 
+class CacheVersion(Base):
+    """Bumped on every write to a cached table (see models/cache_versions.py)."""
+    __tablename__ = "cache_versions"
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False)
+
+
 class Payment(Base):
     __tablename__ = "payments"
     id: Mapped[int] = mapped_column(
@@ -194,8 +212,9 @@ class AuditLog(Base):
     __tablename__ = "audit_log"
     id: Mapped[int] = mapped_column(
         Integer, primary_key=True, autoincrement=True)
+    # part of the PK because Postgres partitions the table by month on ts
     ts: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), nullable=False)
+        DateTime(timezone=True), primary_key=True, nullable=False)
 
     # Actor & request context
     actor: Mapped[str | None] = mapped_column(String(128))
@@ -242,6 +261,64 @@ class AuditLog(Base):
         Index("idx_audit_action", "action"),
         Index("idx_audit_target", "target_type", "target_id"),
         Index("idx_audit_request", "request_id"),
+        {"postgresql_partition_by": "RANGE (ts)"},
+    )
+
+
+# Rows for months without a dedicated partition land here; monthly
+# partitions are added by models.audit_archive.ensure_audit_partitions().
+event.listen(
+    AuditLog.__table__, "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS audit_log_default PARTITION OF audit_log DEFAULT")
+    .execute_if(dialect="postgresql"),
+)
+
+
+class AuditCheckpoint(Base):
+    """Signed marker: the chain was verified from genesis up to last_id."""
+    __tablename__ = "audit_checkpoints"
+    id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, autoincrement=True)
+    last_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_hash: Mapped[str] = mapped_column(String(128), nullable=False)
+    # rows verified from genesis through last_id
+    verified_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False)
+    key_id: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    signature: Mapped[str] = mapped_column(
+        String(128), nullable=False)  # HMAC(last_id|last_hash|verified_count)
+
+    __table_args__ = (
+        Index("idx_audit_checkpoints_last_id", "last_id"),
+    )
+
+
+class AuditArchiveSegment(Base):
+    """A cold, exported run of the chain: ids first_id..last_id live in `file`."""
+    __tablename__ = "audit_archive_segments"
+    id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, autoincrement=True)
+    month: Mapped[str] = mapped_column(
+        String(7), nullable=False)  # 'YYYY-MM' archived through
+    first_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    prev_hash: Mapped[str] = mapped_column(
+        String(128), nullable=False)  # hash before first_id ('' at genesis)
+    last_hash: Mapped[str] = mapped_column(String(128), nullable=False)
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    # rows from genesis through last_id
+    verified_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    file: Mapped[str] = mapped_column(String(255), nullable=False)
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False)
+    key_id: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
+    signature: Mapped[str] = mapped_column(
+        String(128), nullable=False)  # HMAC over the manifest fields
+
+    __table_args__ = (
+        UniqueConstraint("last_id", name="uq_audit_segments_last_id"),
     )
 
 
@@ -282,6 +359,11 @@ def utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def _created_at_default(context) -> datetime:
+    # a new thread's last activity is its creation
+    return context.get_current_parameters().get("created_at") or utcnow()
+
+
 class ForumThread(Base):
     __tablename__ = "forum_threads"
 
@@ -301,6 +383,14 @@ class ForumThread(Base):
     is_pinned: Mapped[bool] = mapped_column(default=False, nullable=False)
     is_locked: Mapped[bool] = mapped_column(default=False, nullable=False)
 
+    # denormalized counters, maintained by models.forum_store
+    score: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    comment_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_comment_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=_created_at_default, nullable=False)
+    # title (A) + body (B), kept by triggers below; comments have their own
+    search_doc = mapped_column(TSVECTOR, nullable=True, deferred=True)
+
     author = relationship("User", lazy="joined")
     comments = relationship(
         "ForumComment",
@@ -338,6 +428,12 @@ class ForumThread(Base):
     __table_args__ = (
         Index("ix_forum_threads_created_at", "created_at"),
         Index("ix_forum_threads_pinned_locked", "is_pinned", "is_locked"),
+        # one per list sort mode (pinned first, see controllers.forum.thread_list)
+        Index("ix_forum_threads_sort_post", is_pinned.desc(), created_at.desc()),
+        Index("ix_forum_threads_sort_comment", is_pinned.desc(), last_comment_at.desc()),
+        Index("ix_forum_threads_sort_up", is_pinned.desc(), score.desc(), created_at.desc()),
+        Index("ix_forum_threads_sort_down", is_pinned.desc(), score.asc(), created_at.desc()),
+        Index("ix_forum_threads_search", "search_doc", postgresql_using="gin"),
     )
 
 
@@ -377,6 +473,8 @@ class ForumComment(Base):
         DateTime(timezone=True), nullable=True)
     deleted_by_username: Mapped[Optional[str]
                                 ] = mapped_column(String, nullable=True)
+    # body (C) unless deleted, kept by a trigger below
+    search_doc = mapped_column(TSVECTOR, nullable=True, deferred=True)
 
     def display_text(self) -> str:
         if self.is_deleted:
@@ -386,6 +484,8 @@ class ForumComment(Base):
     __table_args__ = (
         Index("ix_forum_comments_thread_id", "thread_id"),
         Index("ix_forum_comments_parent_id", "parent_id"),
+        Index("ix_forum_comments_thread_created", "thread_id", "created_at"),
+        Index("ix_forum_comments_search", "search_doc", postgresql_using="gin"),
     )
 
 
@@ -489,6 +589,8 @@ class Ticket(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, onupdate=utcnow, nullable=False)
     closed_at:  Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    # title (A) + body (B), kept by triggers below; comments have their own
+    search_doc = mapped_column(TSVECTOR, nullable=True, deferred=True)
 
     requester = relationship("User", foreign_keys=[requester_username], lazy="joined")
     assignee  = relationship("User", foreign_keys=[assignee_username], lazy="joined")
@@ -507,6 +609,7 @@ class Ticket(Base):
         Index("ix_tickets_requester", "requester_username"),
         Index("ix_tickets_assignee", "assignee_username"),
         Index("ix_tickets_status_priority", "status", "priority"),
+        Index("ix_tickets_search", "search_doc", postgresql_using="gin"),
     )
 
 
@@ -522,6 +625,8 @@ class TicketComment(Base):
     )
     body: Mapped[str] = mapped_column(Text, nullable=False)
     is_internal: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)  # staff-only note
+    # body (C) unless internal, kept by a trigger below
+    search_doc = mapped_column(TSVECTOR, nullable=True, deferred=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, onupdate=utcnow, nullable=False)
@@ -531,4 +636,60 @@ class TicketComment(Base):
 
     __table_args__ = (
         Index("ix_ticket_comments_ticket", "ticket_id"),
-    )
+        Index("ix_ticket_comments_search", "search_doc", postgresql_using="gin"),
+    )
+
+
+# --- FULL-TEXT SEARCH -------------------------------------------------
+# Parents (threads, tickets) and their comments each keep their own
+# search_doc, filled by a BEFORE trigger from the row's own columns only, so
+# a write never re-reads the rest of the thread. models.search_store ORs the
+# parent document with its comments' at query time.
+
+def _search_ddl(parent: str, child: str, hidden: str,
+                parent_hidden: str | None = None) -> list[str]:
+    """Trigger DDL for parent.search_doc and child.search_doc; `hidden` comments get none."""
+    cfg = SEARCH_TS_CONFIG.replace("'", "")
+    n = int(SEARCH_MAX_CHARS)
+    shown = f"NOT NEW.{parent_hidden}" if parent_hidden else "TRUE"
+    watched = "title, body" + (f", {parent_hidden}" if parent_hidden else "")
+    return [
+        f"""CREATE OR REPLACE FUNCTION {parent}_search_tg() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+          NEW.search_doc := setweight(to_tsvector('{cfg}', left(coalesce(NEW.title, ''), {n})), 'A');
+          IF {shown} THEN
+            NEW.search_doc := NEW.search_doc
+              || setweight(to_tsvector('{cfg}', left(coalesce(NEW.body, ''), {n})), 'B');
+          END IF;
+          RETURN NEW;
+        END $$""",
+        f"DROP TRIGGER IF EXISTS {parent}_search ON {parent}",
+        f"""CREATE TRIGGER {parent}_search BEFORE INSERT OR UPDATE OF {watched}
+        ON {parent} FOR EACH ROW EXECUTE FUNCTION {parent}_search_tg()""",
+        f"""CREATE OR REPLACE FUNCTION {child}_search_tg() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+          NEW.search_doc := CASE WHEN NEW.{hidden} THEN NULL ELSE
+            setweight(to_tsvector('{cfg}', left(coalesce(NEW.body, ''), {n})), 'C') END;
+          RETURN NEW;
+        END $$""",
+        f"DROP TRIGGER IF EXISTS {child}_search ON {child}",
+        f"""CREATE TRIGGER {child}_search BEFORE INSERT OR UPDATE OF body, {hidden}
+        ON {child} FOR EACH ROW EXECUTE FUNCTION {child}_search_tg()""",
+    ]
+
+
+SEARCH_DDL = {
+    ForumComment.__table__: _search_ddl(
+        "forum_threads", "forum_comments", "is_deleted", "is_deleted"),
+    TicketComment.__table__: _search_ddl(
+        "tickets", "ticket_comments", "is_internal"),
+}
+
+# the child table is created after its parent, so both exist here
+for _table, _stmts in SEARCH_DDL.items():
+    for _sql in _stmts:
+        event.listen(_table, "after_create",
+                     DDL(_sql).execute_if(dialect="postgresql"))
+
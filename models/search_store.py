@@ -0,0 +1,156 @@
+# models/search_store.py
+"""
+Full-text search over forum threads and tickets.
+
+Threads and tickets have a trigger-maintained `search_doc` tsvector (title
+weighted A, body B) behind a GIN index, and so does each of their visible
+comments (body, C; see the DDL at the end of models/schema.py). A parent
+matches when its own document or one of its comments' does; its rank adds
+the best matching comment's. Queries go through
+websearch_to_tsquery, so users can type plain words, "quoted phrases",
+`or` and `-excluded` terms.
+
+search() ranks with ts_rank_cd and pages by keyset on (rank, id): the cursor
+returned with a page is passed back as `after` for the next one, so deep
+pages cost the same as the first. Snippets (ts_headline) are only computed
+for the rows of the page.
+"""
+from __future__ import annotations
+
+from markupsafe import Markup, escape
+from sqlalchemy import select, func, case, cast, literal, tuple_, REAL, text
+from sqlalchemy.dialects.postgresql import REGCONFIG
+
+from models.base import init_engine_and_session
+from models.schema import (
+    SEARCH_TS_CONFIG, SEARCH_DDL, ForumThread, ForumComment, Ticket, TicketComment,
+)
+
+# unlikely characters marking hits in ts_headline output; turned into
+# <mark> after the snippet has been HTML-escaped
+_SEL_START, _SEL_STOP = "⟦", "⟧"
+_HEADLINE_OPTS = (f"StartSel={_SEL_START}, StopSel={_SEL_STOP}, "
+                  "MaxWords=30, MinWords=12, MaxFragments=2, FragmentDelimiter= … ")
+
+
+# parent -> (comment model, its foreign key, parent column hiding the comments)
+_COMMENTS = {
+    ForumThread: (ForumComment, ForumComment.thread_id, ForumThread.is_deleted),
+    Ticket: (TicketComment, TicketComment.ticket_id, None),
+}
+
+
+def _config():
+    return literal(SEARCH_TS_CONFIG, type_=REGCONFIG)
+
+
+def ts_query(q: str):
+    """websearch_to_tsquery(q) under the configured text search config."""
+    return func.websearch_to_tsquery(_config(), q)
+
+
+def _comment_hits(model, query):
+    """SELECT of parent ids with a visible comment matching `query`."""
+    child, fk, parent_hidden = _COMMENTS[model]
+    q = select(fk).where(child.search_doc.op("@@")(query))
+    if parent_hidden is not None:
+        q = q.join(model, model.id == fk).where(parent_hidden.is_(False))
+    return q
+
+
+def matches(model, q: str):
+    """
+    WHERE clause: rows of `model` whose own search_doc or a visible comment's
+    matches `q` (both sides use their GIN index).
+    """
+    query = ts_query(q)
+    own = select(model.id).where(model.search_doc.op("@@")(query))
+    return model.id.in_(own.union(_comment_hits(model, query)))
+
+
+def _rank(model, query):
+    """ts_rank_cd of the parent's document plus that of its best matching comment."""
+    child, fk, parent_hidden = _COMMENTS[model]
+    best = (select(func.max(func.ts_rank_cd(child.search_doc, query, 32)))
+            .where(fk == model.id, child.search_doc.op("@@")(query))
+            .scalar_subquery())
+    if parent_hidden is not None:
+        best = case((parent_hidden, None), else_=best)
+    return (func.coalesce(func.ts_rank_cd(model.search_doc, query, 32), 0)
+            + func.coalesce(best, 0))
+
+
+def snippet_html(raw: str | None) -> Markup:
+    return Markup(str(escape(raw or ""))
+                  .replace(_SEL_START, "<mark>").replace(_SEL_STOP, "</mark>"))
+
+
+def _cursor(rank: float, row_id: int) -> str:
+    return f"{rank!r}_{row_id}"
+
+
+def _parse_cursor(after: str | None) -> tuple[float, int] | None:
+    try:
+        r, i = (after or "").split("_", 1)
+        return float(r), int(i)
+    except ValueError:
+        return None
+
+
+def search(s, model, q: str, *, where=(), limit: int = 20, after: str | None = None,
+           hidden=None):
+    """
+    Ranked matches of `q` in `model` (ForumThread or Ticket), filtered by
+    `where`. `hidden` is an optional boolean column; rows where it is true get
+    no body snippet. -> ([(obj, rank, snippet Markup)], next cursor or None)
+    """
+    query = ts_query(q)
+    rank = cast(_rank(model, query), REAL)
+    page = (select(model.id, rank.label("rank"))
+            .where(matches(model, q), *where))
+    cur = _parse_cursor(after)
+    if cur is not None:
+        page = page.where(tuple_(rank, model.id) < tuple_(cast(cur[0], REAL), cur[1]))
+    page = page.order_by(rank.desc(), model.id.desc()).limit(limit + 1).subquery()
+
+    headline = func.ts_headline(_config(), model.body, query, _HEADLINE_OPTS)
+    if hidden is not None:
+        headline = case((hidden, ""), else_=headline)
+    rows = s.execute(
+        select(model, page.c.rank, headline.label("snippet"))
+        .join(page, page.c.id == model.id)
+        .order_by(page.c.rank.desc(), model.id.desc())
+    ).unique().all()
+
+    nxt = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        nxt = _cursor(rows[-1][1], rows[-1][0].id)
+    return [(obj, rank, snippet_html(snip)) for obj, rank, snip in rows], nxt
+
+
+def ensure_search_index() -> dict[str, int]:
+    """
+    Add search_doc, its GIN index and the triggers to tables created before
+    them, then fill search_doc for existing rows. -> {table: rows indexed}
+    """
+    engine, _ = init_engine_and_session()
+    models = (ForumThread, ForumComment, Ticket, TicketComment)
+    with engine.begin() as conn:
+        for model in models:
+            table = model.__table__.name
+            conn.execute(text(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_doc tsvector"))
+            for ix in model.__table__.indexes:
+                if ix.name.endswith("_search"):
+                    ix.create(conn, checkfirst=True)
+        for stmts in SEARCH_DDL.values():
+            for sql in stmts:
+                conn.execute(text(sql))
+        done = {}
+        for model in models:
+            # fires the BEFORE UPDATE OF title / body trigger
+            table = model.__table__.name
+            col = "body" if model in (ForumComment, TicketComment) else "title"
+            done[table] = conn.execute(text(f"UPDATE {table} SET {col} = {col}")).rowcount
+    return done
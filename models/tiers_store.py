@@ -3,6 +3,7 @@ from datetime import datetime, timezone
 from sqlalchemy import select, delete
 from typing import Dict, Iterable
 from models.base import session_scope
+from models.cache_versions import VersionedCache, bump_version
 from models.schema import UserTierOverride
 
 
@@ -10,11 +11,18 @@ def _now():
     return datetime.now(timezone.utc)
 
 
-def load_overrides_dict() -> Dict[str, str]:
-    """Return {username_lower: tier} for fast lookups."""
+def _read_overrides() -> Dict[str, str]:
     with session_scope() as s:
-        rows = s.execute(select(UserTierOverride)).scalars().all()
-        return {r.username.strip().lower(): r.tier for r in rows}
+        rows = s.execute(select(UserTierOverride.username, UserTierOverride.tier)).all()
+        return {u.strip().lower(): t for u, t in rows}
+
+
+_cache = VersionedCache("tier_overrides", _read_overrides, copier=dict)
+
+
+def load_overrides_dict() -> Dict[str, str]:
+    """Return {username_lower: tier} for fast lookups (process cache)."""
+    return _cache.get()
 
 
 def upsert_override(username: str, tier: str) -> None:
@@ -29,9 +37,12 @@ def upsert_override(username: str, tier: str) -> None:
             s.add(row)
         else:
             s.add(UserTierOverride(username=u, tier=tier, updated_at=_now()))
+        bump_version(s, "tier_overrides")
+    _cache.invalidate()
 
 
 def bulk_save(overrides: Iterable[tuple[str, str]]) -> None:
+    changed = False
     with session_scope() as s:
         for (u, t) in overrides:
             u = (u or "").strip()
@@ -43,9 +54,17 @@ def bulk_save(overrides: Iterable[tuple[str, str]]) -> None:
                 row.updated_at = _now()
             else:
                 s.add(UserTierOverride(username=u, tier=t, updated_at=_now()))
+            changed = True
+        if changed:
+            bump_version(s, "tier_overrides")
+    if changed:
+        _cache.invalidate()
 
 
 def clear_override(username: str) -> None:
     with session_scope() as s:
-        s.execute(delete(UserTierOverride).where(
+        res = s.execute(delete(UserTierOverride).where(
             UserTierOverride.username == username))
+        if res.rowcount:
+            bump_version(s, "tier_overrides")
+    _cache.invalidate()
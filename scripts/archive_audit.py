@@ -0,0 +1,66 @@
+# scripts/archive_audit.py
+"""
+Move closed months of the audit log to cold storage.
+
+  python scripts/archive_audit.py --month 2025-03            # archive through March
+  python scripts/archive_audit.py --ensure-partitions 3       # create partitions ahead
+                                                              # (also fine as a daily cron)
+  python scripts/archive_audit.py --verify                    # check all segments
+  python scripts/archive_audit.py --verify-chain --full --workers 4
+                                                              # re-verify the hot chain
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+# Load .env from project root
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+from models.audit_archive import (  # noqa: E402
+    archive_audit_month, ensure_audit_partitions, verify_archive,
+)
+from models.audit_store import verify_chain  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--month", help="archive everything up to the end of YYYY-MM")
+    ap.add_argument("--out", help="segment directory (default AUDIT_ARCHIVE_DIR)")
+    ap.add_argument("--keep-hot", action="store_true",
+                    help="export only; do not drop archived rows")
+    ap.add_argument("--ensure-partitions", type=int, metavar="MONTHS_AHEAD")
+    ap.add_argument("--verify", action="store_true")
+    ap.add_argument("--verify-chain", action="store_true",
+                    help="verify the hot chain from the last checkpoint")
+    ap.add_argument("--full", action="store_true",
+                    help="with --verify-chain: start from the archive boundary")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="with --verify-chain: parallel verifier processes")
+    args = ap.parse_args()
+
+    if args.ensure_partitions is not None:
+        print(json.dumps({"created": ensure_audit_partitions(args.ensure_partitions)}))
+    if args.month:
+        y, m = (int(x) for x in args.month.split("-"))
+        res = archive_audit_month(y, m, out_dir=args.out, purge=not args.keep_hot)
+        print(json.dumps(res, indent=2))
+        if not res["ok"]:
+            sys.exit(1)
+    if args.verify:
+        res = verify_archive(out_dir=args.out)
+        print(json.dumps(res, indent=2))
+        if not res["ok"]:
+            sys.exit(1)
+    if args.verify_chain:
+        res = verify_chain(full=args.full, workers=args.workers)
+        print(json.dumps(res, indent=2))
+        if not res["ok"]:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# scripts/rebuild_forum_counters.py
+"""
+Recompute forum thread counters (score, comment_count, last_comment_at).
+
+  python scripts/rebuild_forum_counters.py              # all threads
+  python scripts/rebuild_forum_counters.py --thread 42  # one thread
+  python scripts/rebuild_forum_counters.py --upgrade    # also set up search
+
+Also adds the counter columns and sort indexes to databases created before
+they existed. --upgrade then runs the search index step
+(scripts/rebuild_search_index.py) after it, so one command brings an old
+forum schema fully up to date.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+# Load .env from project root
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+from models.forum_store import (  # noqa: E402
+    ensure_thread_counter_columns, rebuild_thread_counters,
+)
+from models.search_store import ensure_search_index  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--thread", type=int, help="only this thread id")
+    ap.add_argument("--upgrade", action="store_true",
+                    help="also add and fill the full-text search columns")
+    args = ap.parse_args()
+
+    ensure_thread_counter_columns()
+    out = {"updated": rebuild_thread_counters(args.thread)}
+    if args.upgrade:
+        out["indexed"] = ensure_search_index()
+    print(json.dumps(out))
+
+
+if __name__ == "__main__":
+    main()
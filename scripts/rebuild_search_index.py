@@ -0,0 +1,32 @@
+# scripts/rebuild_search_index.py
+"""
+Rebuild the full-text search documents of forum threads, tickets and their
+comments.
+
+  python scripts/rebuild_search_index.py
+
+Adds the search_doc columns, GIN indexes and triggers to databases created
+before they existed, then re-indexes every row (run it again after changing
+SEARCH_TS_CONFIG).
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+# Load .env from project root
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
+from models.search_store import ensure_search_index  # noqa: E402
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__,
+                            formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+    print(json.dumps({"indexed": ensure_search_index()}))
+
+
+if __name__ == "__main__":
+    main()
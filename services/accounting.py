@@ -1,11 +1,20 @@
 # services/accounting.py
 from __future__ import annotations
 from typing import List, Dict
+from collections import OrderedDict
 from datetime import datetime, date
+import os
+import threading
+import numpy as np
 import pandas as pd
 
-from models.billing_store import admin_list_receipts
+from models.billing_store import journal_receipts_between
 from models.billing_store import _tax_cfg
+
+# derived lines per receipt, reused across previews (see _receipt_lines)
+JOURNAL_MEMO_MAX = int(os.getenv("JOURNAL_MEMO_MAX", "50000"))
+_journal_memo: "OrderedDict[int, tuple]" = OrderedDict()
+_journal_memo_lock = threading.Lock()
 # ---- Chart of accounts (IDs are strings for portability) ----
 # Account types: ASSET, LIABILITY, EQUITY, INCOME, EXPENSE
 
@@ -147,19 +156,47 @@ def _split_vat(gross: float) -> tuple[float, float]:
     return net, vat
 
 
+def _receipt_lines(r: dict) -> List[Dict]:
+    """
+    All derived lines for one receipt, memoized by receipt id.
+    Receipts carry no updated_at, so the memo key is the snapshot of every
+    field the entry builders read, plus the tax config used for the VAT split.
+    """
+    key = (r.get("status"), r.get("total"), r.get("username"), r.get("start"),
+           r.get("end"), r.get("created_at"), r.get("paid_at"), _tax_cfg())
+    rid = r["id"]
+    with _journal_memo_lock:
+        hit = _journal_memo.get(rid)
+        if hit and hit[0] == key:
+            _journal_memo.move_to_end(rid)
+            return hit[1]
+
+    lines = (
+        _entry_service_delivery(r)   # <-- revenue timing here
+        + _entry_receipt_issue(r)    # <-- reclass to A/R + VAT
+        + _entry_receipt_paid(r)     # <-- cash settlement
+    )
+    with _journal_memo_lock:
+        _journal_memo[rid] = (key, lines)
+        _journal_memo.move_to_end(rid)
+        while len(_journal_memo) > JOURNAL_MEMO_MAX:
+            _journal_memo.popitem(last=False)
+    return lines
+
+
 def derive_journal(start: str, end: str) -> pd.DataFrame:
     """
     Build a journal from receipts, with IFRS/TFRS/GAAP-like timing:
       1) Service month (period end):   Dr 1150 ; Cr 4000   [revenue]
       2) Invoice created:              Dr 1100 ; Cr 1150 ; (Cr 2100 VAT)
       3) Cash collected (if paid):     Dr 1000 ; Cr 1100
+    Only receipts with a service/issue/payment date near the window are loaded.
     """
-    rows = admin_list_receipts(status=None)  # all
+    rows = journal_receipts_between(
+        date.fromisoformat(start), date.fromisoformat(end))
     lines: List[Dict] = []
     for r in rows:
-        lines.extend(_entry_service_delivery(r))  # <-- revenue timing here
-        lines.extend(_entry_receipt_issue(r))     # <-- reclass to A/R + VAT
-        lines.extend(_entry_receipt_paid(r))      # <-- cash settlement
+        lines.extend(l for l in _receipt_lines(r) if start <= l["date"] <= end)
 
     if not lines:
         return pd.DataFrame(columns=[
@@ -168,7 +205,6 @@ def derive_journal(start: str, end: str) -> pd.DataFrame:
         ])
 
     j = pd.DataFrame(lines)
-    j = j[(j["date"] >= start) & (j["date"] <= end)].copy()
     j.sort_values(by=["date", "ref", "account_id"], inplace=True)
     return j.reset_index(drop=True)
 
@@ -189,17 +225,25 @@ def trial_balance(journal: pd.DataFrame) -> pd.DataFrame:
         debits=("debit", "sum"),
         credits=("credit", "sum")
     ).reset_index()
+    return tb_from_sums(g)
 
-    def _balance(row):
-        t = row["account_type"]
-        if t in ("ASSET", "EXPENSE"):
-            return row["debits"] - row["credits"]
-        return row["credits"] - row["debits"]
 
-    g["balance"] = g.apply(_balance, axis=1).round(2)
+def tb_from_sums(g: pd.DataFrame) -> pd.DataFrame:
+    """
+    Finish a trial balance from per-account debits/credits
+    (columns: account_id, account_name, account_type, debits, credits).
+    """
+    if g.empty:
+        return pd.DataFrame(columns=["account_id", "account_name", "account_type", "debits", "credits", "balance"])
+    g = g.copy()
+    g["debits"] = g["debits"].astype(float)
+    g["credits"] = g["credits"].astype(float)
+    debit_normal = g["account_type"].isin(["ASSET", "EXPENSE"]).to_numpy()
+    net = (g["debits"] - g["credits"]).to_numpy()
+    g["balance"] = np.where(debit_normal, net, -net).round(2)
     # TB check (should be zero): sum(debit) == sum(credit)
-    g.attrs["sum_debits"] = round(float(journal["debit"].sum()), 2)
-    g.attrs["sum_credits"] = round(float(journal["credit"].sum()), 2)
+    g.attrs["sum_debits"] = round(float(g["debits"].sum()), 2)
+    g.attrs["sum_credits"] = round(float(g["credits"].sum()), 2)
     g.attrs["out_of_balance"] = round(
         g.attrs["sum_debits"] - g.attrs["sum_credits"], 2)
     return g
@@ -213,8 +257,13 @@ def income_statement(journal: pd.DataFrame) -> pd.DataFrame:
     """
     if journal.empty:
         return pd.DataFrame([{"Revenue": 0.0, "Expenses": 0.0, "Net_Income": 0.0}])
+    return income_statement_from_tb(trial_balance(journal))
+
 
-    tb = trial_balance(journal)
+def income_statement_from_tb(tb: pd.DataFrame) -> pd.DataFrame:
+    """P&L from an already computed trial balance."""
+    if tb.empty:
+        return pd.DataFrame([{"Revenue": 0.0, "Expenses": 0.0, "Net_Income": 0.0}])
     # already (credits - debits)
     rev = tb[tb["account_type"] == "INCOME"]["balance"].sum()
     # for EXPENSE we computed debits - credits
@@ -231,7 +280,11 @@ def balance_sheet(journal: pd.DataFrame) -> pd.DataFrame:
     Snapshot-style: Assets vs Liabilities+Equity from trial balance balances.
     (This is a simplified view without retained earnings rollforward.)
     """
-    tb = trial_balance(journal)
+    return balance_sheet_from_tb(trial_balance(journal))
+
+
+def balance_sheet_from_tb(tb: pd.DataFrame) -> pd.DataFrame:
+    """Balance sheet snapshot from an already computed trial balance."""
     assets = tb[tb["account_type"] == "ASSET"]["balance"].sum()
     liab = tb[tb["account_type"] == "LIABILITY"]["balance"].sum()
     equity = tb[tb["account_type"] == "EQUITY"]["balance"].sum()
@@ -1,15 +1,16 @@
 # services/accounting_export.py
 from __future__ import annotations
 from typing import Tuple
+from pathlib import Path
 import csv
 import io
+import os
+import zipfile
 from models.billing_store import admin_list_receipts, _tax_cfg
-from sqlalchemy import select, update
+from sqlalchemy import select, update, insert
 from datetime import datetime, timezone
 from hashlib import sha256
 import hmac
-import io
-import csv
 import json
 from models.base import session_scope
 from models.gl import JournalBatch, GLEntry, ExportRun, ExportRunBatch
@@ -37,7 +38,81 @@ def _utc(d):  # 'YYYY-MM-DD' -> aware range
     return s, e
 
 
-def run_formal_gl_export(start: str, end: str, actor: str, kind: str = "posted_gl_csv") -> tuple[str, bytes] | tuple[None, None]:
+GL_EXPORT_DIR = os.getenv("GL_EXPORT_DIR", "./instance/gl_exports")
+GL_EXPORT_YIELD_PER = int(os.getenv("GL_EXPORT_YIELD_PER", "2000"))
+
+GL_CSV_HEADER = ["date", "ref", "memo", "account_id", "account_name", "account_type",
+                 "debit", "credit", "batch_id", "line_seq", "external_txn_id"]
+
+
+def export_artifact_path(run_id: int) -> Path:
+    """Where the ZIP of a formal export run is kept for re-download."""
+    return Path(GL_EXPORT_DIR) / f"gl_export_run_{run_id}.zip"
+
+
+def artifact_matches_run(path: Path, run: ExportRun) -> bool:
+    """True if the ZIP at `path` carries the manifest recorded on `run`."""
+    try:
+        with zipfile.ZipFile(path) as z:
+            mjson = z.read(f"manifest_run_{run.id}.json")
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return False
+    return bool(run.manifest_sha256) and sha256(mjson).hexdigest() == run.manifest_sha256
+
+
+def write_gl_lines_csv(s, z: zipfile.ZipFile, arcname: str, batch_ids) -> tuple[str, int, int]:
+    """
+    Stream the GL lines of `batch_ids` as CSV into ZIP member `arcname`.
+    Lines come off a server-side cursor and are written/hashed in chunks.
+    Returns (sha256 of the CSV, CSV size in bytes, line count).
+    """
+    h = sha256()
+    size = lines = 0
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(GL_CSV_HEADER)
+
+    result = s.execute(
+        select(
+            GLEntry.date, GLEntry.ref, GLEntry.memo,
+            GLEntry.account_id, GLEntry.account_name, GLEntry.account_type,
+            GLEntry.debit, GLEntry.credit, GLEntry.batch_id, GLEntry.seq_in_batch,
+            GLEntry.external_txn_id
+        ).where(GLEntry.batch_id.in_(list(batch_ids)))
+         .order_by(GLEntry.batch_id, GLEntry.seq_in_batch, GLEntry.id),
+        execution_options={"stream_results": True,
+                           "yield_per": GL_EXPORT_YIELD_PER},
+    )
+    with z.open(arcname, "w", force_zip64=True) as member:
+        def _flush():
+            nonlocal size
+            chunk = buf.getvalue().encode("utf-8")
+            h.update(chunk)
+            member.write(chunk)
+            size += len(chunk)
+            buf.seek(0)
+            buf.truncate()
+
+        for part in result.partitions():
+            for r in part:
+                w.writerow([
+                    r.date.date().isoformat(), r.ref, r.memo, r.account_id, r.account_name, r.account_type,
+                    float(r.debit or 0), float(
+                        r.credit or 0), r.batch_id, int(r.seq_in_batch or 0),
+                    r.external_txn_id or f"B{r.batch_id:08d}-L{int(r.seq_in_batch or 0):05d}",
+                ])
+            lines += len(part)
+            _flush()
+        _flush()
+    return h.hexdigest(), size, lines
+
+
+def run_formal_gl_export(start: str, end: str, actor: str, kind: str = "posted_gl_csv") -> tuple[str, Path] | tuple[None, None]:
+    """
+    Export unexported posted batches in [start, end] and mark them exported.
+    The ZIP (CSV + MANIFEST + SIGNATURE) is written straight to
+    export_artifact_path(run_id); returns (download filename, artifact path).
+    """
     s_utc, e_utc = _utc(start)[0], _utc(end)[1]
     with session_scope() as s:
         # 1) create run (running)
@@ -69,85 +144,109 @@ def run_formal_gl_export(start: str, end: str, actor: str, kind: str = "posted_g
             audit("export.formal.finish", target_type="window", target_id=f"{start}:{end}",
                   outcome="success", status=200, extra={"noop": True, "run_id": run.id})
             return None, None
+        batch_ids = sorted(set(batch_ids))
 
-        # 3) fetch lines (deterministic order)
-        rows = s.execute(
-            select(
-                GLEntry.date, GLEntry.ref, GLEntry.memo,
-                GLEntry.account_id, GLEntry.account_name, GLEntry.account_type,
-                GLEntry.debit, GLEntry.credit, GLEntry.batch_id, GLEntry.seq_in_batch,
-                GLEntry.external_txn_id
-            ).where(GLEntry.batch_id.in_(batch_ids))
-             .order_by(GLEntry.batch_id, GLEntry.seq_in_batch, GLEntry.id)
-        ).all()
-
-        # 4) build CSV bytes
-        out = io.StringIO()
-        w = csv.writer(out)
-        w.writerow(["date", "ref", "memo", "account_id", "account_name", "account_type",
-                   "debit", "credit", "batch_id", "line_seq", "external_txn_id"])
-        for r in rows:
-            w.writerow([
-                r.date.date().isoformat(), r.ref, r.memo, r.account_id, r.account_name, r.account_type,
-                float(r.debit or 0), float(
-                    r.credit or 0), r.batch_id, int(r.seq_in_batch or 0),
-                r.external_txn_id or f"B{r.batch_id:08d}-L{int(r.seq_in_batch or 0):05d}",
+        # 3) stream lines into the ZIP on disk (partial until the run commits)
+        path = export_artifact_path(run.id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".zip.partial")
+        try:
+            with zipfile.ZipFile(tmp, "w", zipfile.ZIP_DEFLATED) as z:
+                fhash, fsize, n_lines = write_gl_lines_csv(
+                    s, z, f"gl_export_run_{run.id}.csv", batch_ids)
+
+                # 4) manifest + hashes + signature
+                manifest = {
+                    "run_id": run.id,
+                    "kind": kind,
+                    "criteria": run.criteria,
+                    "batch_count": len(batch_ids),
+                    "line_count": n_lines,
+                    "file_sha256": fhash,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "key_id": SIGNING_KEY_ID,
+                }
+                mjson = json.dumps(manifest, sort_keys=True,
+                                   separators=(",", ":")).encode("utf-8")
+                mhash = sha256(mjson).hexdigest()
+                sig = hmac.new(EXPORT_SECRET, fhash.encode(
+                    "utf-8"), digestmod="sha256").hexdigest()
+                z.writestr(f"manifest_run_{run.id}.json", mjson)
+                z.writestr(
+                    f"signature_run_{run.id}.txt", f"key_id={SIGNING_KEY_ID}\nsha256={fhash}\nsignature={sig}\n")
+
+            # 5) link batches to the run, then mark them exported in one UPDATE
+            now = datetime.now(timezone.utc)
+            s.execute(insert(ExportRunBatch), [
+                {"run_id": run.id, "batch_id": bid, "seq": i}
+                for i, bid in enumerate(batch_ids, start=1)
             ])
-        csv_bytes = out.getvalue().encode("utf-8")
+            s.execute(
+                update(JournalBatch)
+                .where(JournalBatch.id == ExportRunBatch.batch_id,
+                       ExportRunBatch.run_id == run.id)
+                .values(exported_at=now, export_run_id=run.id,
+                        export_seq=ExportRunBatch.seq)
+            )
+
+            # 6) finalize run
+            run.file_sha256 = fhash
+            run.file_size = fsize
+            run.manifest_sha256 = mhash
+            run.signature = sig
+            run.key_id = SIGNING_KEY_ID
+            run.status = "success"
+            run.finished_at = now
+            s.flush()
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+        audit("export.formal.finish", target_type="window", target_id=f"{start}:{end}",
+              outcome="success", status=200, extra={"run_id": run.id, "batches": len(batch_ids), "lines": n_lines})
+
+        fname = f"gl_export_run_{run.id}_{start}_to_{end}.zip"
+        return fname, path
+
+
+def write_etax_period_zip(year: int, month: int, fileobj) -> tuple[int, str]:
+    """
+    Write the e-Tax payload of every receipt of a month into one ZIP on
+    `fileobj`: `<invoice no>.json` per receipt, a manifest listing each file's
+    sha256, and a signature (HMAC of the manifest hash). Payloads are written
+    as they come, so only one is held in memory at a time.
+    Returns (document count, manifest sha256).
+    """
+    from models.billing_store import etax_payloads_for_month
+
+    files = []
+    with zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED) as z:
+        for payload in etax_payloads_for_month(year, month):
+            name = payload["document"]["number"] or f"receipt_{payload['meta']['receipt_id']}"
+            body = json.dumps(payload, ensure_ascii=False,
+                              indent=2).encode("utf-8")
+            z.writestr(f"{name}.json", body)
+            files.append({"name": f"{name}.json", "receipt_id": payload["meta"]["receipt_id"],
+                          "sha256": sha256(body).hexdigest(), "size": len(body)})
 
-        # 5) manifest + hashes + signature
-        fhash = sha256(csv_bytes).hexdigest()
         manifest = {
-            "run_id": run.id,
-            "kind": kind,
-            "criteria": run.criteria,
-            "batch_count": len(set(batch_ids)),
-            "line_count": len(rows),
-            "file_sha256": fhash,
+            "version": "etax-export-1",
+            "period": f"{year}-{month:02d}",
+            "count": len(files),
+            "files": files,
             "created_at": datetime.now(timezone.utc).isoformat(),
             "key_id": SIGNING_KEY_ID,
         }
         mjson = json.dumps(manifest, sort_keys=True,
                            separators=(",", ":")).encode("utf-8")
         mhash = sha256(mjson).hexdigest()
-        sig = hmac.new(EXPORT_SECRET, fhash.encode(
+        sig = hmac.new(EXPORT_SECRET, mhash.encode(
             "utf-8"), digestmod="sha256").hexdigest()
-
-        # 6) mark batches as exported & link them to the run
-        now = datetime.now(timezone.utc)
-        for i, bid in enumerate(sorted(set(batch_ids)), start=1):
-            s.add(ExportRunBatch(run_id=run.id, batch_id=bid, seq=i))
-            s.execute(
-                update(JournalBatch)
-                .where(JournalBatch.id == bid)
-                .values(exported_at=now, export_run_id=run.id, export_seq=i)
-            )
-
-        # 7) finalize run
-        run.file_sha256 = fhash
-        run.file_size = len(csv_bytes)
-        run.manifest_sha256 = mhash
-        run.signature = sig
-        run.key_id = SIGNING_KEY_ID
-        run.status = "success"
-        run.finished_at = now
-        s.flush()
-
-        audit("export.formal.finish", target_type="window", target_id=f"{start}:{end}",
-              outcome="success", status=200, extra={"run_id": run.id, "batches": len(batch_ids), "lines": len(rows)})
-
-        # 8) return a ZIP containing CSV + MANIFEST + SIGNATURE
-        import zipfile
-        mem = io.BytesIO()
-        with zipfile.ZipFile(mem, "w", zipfile.ZIP_DEFLATED) as z:
-            z.writestr(f"gl_export_run_{run.id}.csv", csv_bytes)
-            z.writestr(f"manifest_run_{run.id}.json", mjson)
-            z.writestr(
-                f"signature_run_{run.id}.txt", f"key_id={SIGNING_KEY_ID}\nsha256={fhash}\nsignature={sig}\n")
-        mem.seek(0)
-
-        fname = f"gl_export_run_{run.id}_{start}_to_{end}.zip"
-        return fname, mem.read()
+        z.writestr("manifest.json", mjson)
+        z.writestr(
+            "signature.txt", f"key_id={SIGNING_KEY_ID}\nsha256={mhash}\nsignature={sig}\n")
+    return len(files), mhash
 
 
 def _iso(d) -> str:
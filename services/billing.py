@@ -88,24 +88,53 @@ def extract_mem_gb(tres: str) -> float:
     return 0.0
 
 
+# keyword lists compiled once; checked in this order, first hit wins
+_TIER_PATTERNS = [
+    ("mu", re.compile("|".join(map(re.escape, ["test", "support", "admin", "monitor", "sys"])))),
+    ("gov", re.compile("|".join(map(re.escape, ["dip", "gits", "nstda", "nectec", ".go.", "gov"])))),
+    ("mu", re.compile(r"^[a-z]+\.[a-z]+$|ku\.ac\.th|mu\.ac\.th")),
+]
+
+
 def classify_user_type(user) -> str:
     # normalize safely; treat non-strings and NaN as empty
-    try:
-        u = user if isinstance(user, str) else ""
-    except Exception:
-        u = ""
-    u = u.strip().lower()
-    if any(k in u for k in ["test", "support", "admin", "monitor", "sys"]):
-        return "mu"
-    if any(k in u for k in ["dip", "gits", "nstda", "nectec", ".go.", "gov"]):
-        return "gov"
-    if re.match(r"^[a-z]+\.[a-z]+$", u) or "ku.ac.th" in u or "mu.ac.th" in u:
-        return "mu"
-    if any(k in u for k in ["co.th", ".com", "corp", "inc"]):
-        return "private"
+    u = user.strip().lower() if isinstance(user, str) else ""
+    for tier, pat in _TIER_PATTERNS:
+        if pat.search(u):
+            return tier
+    # ["co.th", ".com", "corp", "inc"] and everything else
     return "private"
 
 
+def classify_user_types(users) -> np.ndarray:
+    """classify_user_type over an array of strings, one regex pass per pattern."""
+    u = pd.Series(users, dtype="object")
+    u = u.where(u.map(lambda x: isinstance(x, str)), "").str.strip().str.lower()
+    return np.select(
+        [u.str.contains(pat, regex=True).to_numpy(dtype=bool)
+         for _, pat in _TIER_PATTERNS],
+        [tier for tier, _ in _TIER_PATTERNS],
+        default="private",
+    )
+
+
+def effective_tiers(users, overrides: dict[str, str] | None = None) -> np.ndarray:
+    """
+    Tier per element of `users`: the override for the normalized username if
+    there is one, else classify_user_type. Each distinct username is resolved
+    once and the result broadcast back.
+    """
+    codes, uniques = pd.factorize(pd.Series(users, dtype="object"),
+                                  use_na_sentinel=False)
+    keys = pd.Series([x.strip().lower() if isinstance(x, str)
+                      else ("" if pd.isna(x) else str(x).strip().lower())
+                      for x in uniques], dtype="object")
+    tiers = pd.Series(classify_user_types(keys), dtype="object")
+    if overrides:
+        tiers = keys.map(overrides).fillna(tiers)
+    return tiers.to_numpy(dtype=object)[codes]
+
+
 # ---------- main ----------
 
 
@@ -256,15 +285,8 @@ def compute_costs(df: pd.DataFrame) -> pd.DataFrame:
         parents["Energy_kJ"] / parents["CPU_Core_Hours"].replace(0, np.nan)
     ).fillna(0.0).round(4)
 
-    # --- BEFORE assigning `tier`: load overrides once ---
-    overrides = load_overrides_dict()
-
-    def _effective_tier(user: str) -> str:
-        u = (str(user or "").strip().lower())
-        return overrides.get(u) or classify_user_type(u)
-
-    # Tier + Cost
-    parents["tier"] = parents["User"].map(_effective_tier)
+    # Tier + Cost (overrides first, then the username rules; once per user)
+    parents["tier"] = effective_tiers(parents["User"], load_overrides_dict())
     rates = rates_store.load_rates()
 
     def row_cost(r):
@@ -1,15 +1,32 @@
 # services/copilot.py
 import os
 import re
+import copy
 import json
 import time
 import glob
 import pathlib
+import shutil
 import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import markdown
 import requests
-from typing import List, Dict, Tuple
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Tuple, Iterator
+
+from services import rate_limit
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes
+    fcntl = None
+
+log = logging.getLogger(__name__)
 
 OLLAMA = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
 EMBED_MODEL = os.getenv("COPILOT_EMBED_MODEL", "nomic-embed-text")
@@ -19,11 +36,32 @@ INDEX_DIR = os.getenv("COPILOT_INDEX_DIR", "./instance/copilot_index")
 TOP_K = int(os.getenv("COPILOT_TOP_K", "6"))
 MIN_SIM = float(os.getenv("COPILOT_MIN_SIM", "0.28"))
 RATE_LIMIT_PER_MIN = int(os.getenv("COPILOT_RATE_LIMIT_PER_MIN", "12"))
+# texts per /api/embed call, calls in flight, remembered query embeddings
+EMBED_BATCH = int(os.getenv("COPILOT_EMBED_BATCH", "32"))
+EMBED_CONCURRENCY = int(os.getenv("COPILOT_EMBED_CONCURRENCY", "4"))
+QUERY_CACHE_MAX = int(os.getenv("COPILOT_QUERY_CACHE", "256"))
+# kept-alive connections to Ollama; streamed answers hold one each
+HTTP_POOL_SIZE = int(os.getenv("COPILOT_HTTP_POOL", "16"))
+# seconds between sanitized HTML snapshots while an answer streams
+STREAM_RENDER_SEC = float(os.getenv("COPILOT_STREAM_RENDER_SEC", "0.3"))
+# answers reused for questions whose embedding is at least this similar
+ANSWER_CACHE_MAX = int(os.getenv("COPILOT_ANSWER_CACHE", "512"))
+ANSWER_CACHE_TTL_SEC = float(os.getenv("COPILOT_ANSWER_TTL_SEC", "86400"))
+ANSWER_CACHE_MIN_SIM = float(os.getenv("COPILOT_ANSWER_MIN_SIM", "0.95"))
+# seconds between docs-tree checks; one process per interval does the hashing
+DOCS_CHECK_SEC = float(os.getenv("COPILOT_DOCS_CHECK_SEC", "60"))
+
+# on-disk vector dtype: float32, float16 or int8 (scaled by INT8_SCALE)
+VEC_DTYPE = np.dtype(os.getenv("COPILOT_VEC_DTYPE", "float32"))
+INT8_SCALE = 127.0
 
 os.makedirs(INDEX_DIR, exist_ok=True)
-VEC_PATH = os.path.join(INDEX_DIR, "vectors.npy")
-META_PATH = os.path.join(INDEX_DIR, "meta.json")
-SIG_PATH = os.path.join(INDEX_DIR, "signature.txt")
+# points at the live generation directory under INDEX_DIR
+CURRENT_FILE = "current.json"
+# flock held while a generation is built and published (all processes)
+BUILD_LOCK_FILE = ".build.lock"
+# mtime = last docs-tree check by any process
+DOCS_STAMP_FILE = ".docs_checked"
 
 
 def _md_to_text(md: str) -> str:
@@ -72,18 +110,70 @@ def _chunk(md_text: str, file_path: str) -> List[Dict]:
     return out
 
 
+# one keep-alive connection pool for all Ollama calls
+_http = requests.Session()
+_http.mount("http://", HTTPAdapter(pool_connections=4,
+            pool_maxsize=max(HTTP_POOL_SIZE, EMBED_CONCURRENCY)))
+_http.mount("https://", HTTPAdapter(pool_connections=4,
+            pool_maxsize=max(HTTP_POOL_SIZE, EMBED_CONCURRENCY)))
+
+
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    r = _http.post(f"{OLLAMA}/api/embed",
+                   json={"model": EMBED_MODEL, "input": texts}, timeout=120)
+    if r.status_code == 404:
+        # older Ollama: no batch endpoint, one prompt per call
+        out = []
+        for t in texts:
+            r = _http.post(f"{OLLAMA}/api/embeddings",
+                           json={"model": EMBED_MODEL, "prompt": t}, timeout=60)
+            r.raise_for_status()
+            out.append(r.json()["embedding"])
+        return out
+    r.raise_for_status()
+    return r.json()["embeddings"]
+
+
 def _embed(texts: List[str]) -> np.ndarray:
-    # Call Ollama embeddings endpoint (one-by-one for simplicity)
-    vecs = []
-    for t in texts:
-        r = requests.post(f"{OLLAMA}/api/embeddings",
-                          json={"model": EMBED_MODEL, "prompt": t}, timeout=60)
-        r.raise_for_status()
-        v = np.array(r.json()["embedding"], dtype=np.float32)
-        # normalize for cosine via dot product
-        n = np.linalg.norm(v) + 1e-9
-        vecs.append(v / n)
-    return np.vstack(vecs) if vecs else np.zeros((0, 384), dtype=np.float32)
+    # EMBED_BATCH texts per request, up to EMBED_CONCURRENCY requests at once
+    if not texts:
+        return np.zeros((0, 384), dtype=np.float32)
+    batches = [texts[i:i + EMBED_BATCH]
+               for i in range(0, len(texts), max(1, EMBED_BATCH))]
+    if len(batches) == 1 or EMBED_CONCURRENCY <= 1:
+        rows = [v for b in batches for v in _embed_batch(b)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(EMBED_CONCURRENCY, len(batches))) as ex:
+            rows = [v for vs in ex.map(_embed_batch, batches) for v in vs]
+    vecs = np.asarray(rows, dtype=np.float32)
+    # normalize for cosine via dot product
+    vecs /= (np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-9)
+    return vecs
+
+
+def _chunk_key(text: str) -> str:
+    # content hash of a chunk under the current embedding model
+    return hashlib.sha1(f"{EMBED_MODEL}\0{text}".encode("utf-8")).hexdigest()
+
+
+_QUERY_VECS: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_QUERY_LOCK = threading.Lock()
+
+
+def _query_vec(query: str) -> np.ndarray:
+    """Embedding of a question, remembered (LRU) for repeated questions."""
+    key = _chunk_key(" ".join(query.split()).lower())
+    with _QUERY_LOCK:
+        v = _QUERY_VECS.get(key)
+        if v is not None:
+            _QUERY_VECS.move_to_end(key)
+            return v
+    v = _embed([query])[0]
+    with _QUERY_LOCK:
+        _QUERY_VECS[key] = v
+        while len(_QUERY_VECS) > QUERY_CACHE_MAX:
+            _QUERY_VECS.popitem(last=False)
+    return v
 
 
 def _signature() -> str:
@@ -95,14 +185,172 @@ def _signature() -> str:
     return hashlib.sha1("|".join(parts).encode()).hexdigest()
 
 
+def _current_path() -> str:
+    return os.path.join(INDEX_DIR, CURRENT_FILE)
+
+
+def _read_current() -> Dict | None:
+    try:
+        return json.loads(pathlib.Path(_current_path()).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+_BUILD_TLOCK = threading.Lock()
+
+
+@contextmanager
+def _build_lock(blocking: bool = True):
+    """Serialize build + publish across processes. Yields False if not acquired."""
+    if fcntl is None:
+        got = _BUILD_TLOCK.acquire(blocking)
+        try:
+            yield got
+        finally:
+            if got:
+                _BUILD_TLOCK.release()
+        return
+    with open(os.path.join(INDEX_DIR, BUILD_LOCK_FILE), "a+") as fh:
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def _quantize(vecs: np.ndarray) -> np.ndarray:
+    if VEC_DTYPE == np.int8:
+        return np.clip(np.rint(vecs * INT8_SCALE), -127, 127).astype(np.int8)
+    return vecs.astype(VEC_DTYPE)
+
+
+class _Index:
+    """
+    One saved generation: vectors memory-mapped from vectors.npy, per-chunk
+    columns in meta.json (file names interned) and chunk texts in texts.bin,
+    sliced through offsets.npy only for the rows a search returns.
+    """
+
+    def __init__(self, gen_dir: str):
+        self.dir = gen_dir
+        self.vecs = np.load(os.path.join(gen_dir, "vectors.npy"), mmap_mode="r")
+        cols = json.loads(pathlib.Path(gen_dir, "meta.json").read_text())
+        self.scale = float(cols.get("scale", 1.0))
+        self.files = cols["files"]
+        self.file = cols["file"]
+        self.title = cols["title"]
+        self.anchor = cols["anchor"]
+        self.hash = cols["hash"]
+        self.offsets = np.load(os.path.join(gen_dir, "offsets.npy"))
+        size = os.path.getsize(os.path.join(gen_dir, "texts.bin"))
+        self.texts = np.memmap(os.path.join(gen_dir, "texts.bin"), dtype=np.uint8,
+                               mode="r") if size else np.zeros(0, np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.file)
+
+    def row(self, i: int) -> Dict:
+        lo, hi = int(self.offsets[i]), int(self.offsets[i + 1])
+        return {"file": self.files[self.file[i]], "title": self.title[i],
+                "anchor": self.anchor[i], "hash": self.hash[i],
+                "text": self.texts[lo:hi].tobytes().decode("utf-8")}
+
+    def vectors(self) -> np.ndarray:
+        return np.asarray(self.vecs, dtype=np.float32) / self.scale
+
+    def scores(self, qv: np.ndarray) -> np.ndarray:
+        # mixed-dtype matmul upcasts the mapped rows to float32 as it goes
+        return (self.vecs @ qv.astype(np.float32)) / self.scale
+
+
+def _open_current() -> "_Index | None":
+    cur = _read_current()
+    if not cur:
+        return None
+    try:
+        return _Index(os.path.join(INDEX_DIR, cur["dir"]))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _load_saved() -> Tuple[np.ndarray, List[Dict]] | None:
+    idx = _open_current()
+    if idx is None:
+        return None
+    return idx.vectors(), [idx.row(i) for i in range(len(idx))]
+
+
+def _save_index(vecs: np.ndarray, meta: List[Dict], sig: str) -> None:
+    """
+    Write a new generation directory, then switch current.json to it. Readers
+    that still have the previous generation mapped keep working; older ones
+    are removed. Call with _build_lock() held.
+    """
+    gen = f"gen-{time.time_ns()}-{os.getpid()}"
+    d = os.path.join(INDEX_DIR, gen)
+    os.makedirs(d)
+    np.save(os.path.join(d, "vectors.npy"), _quantize(vecs))
+    blobs = [m["text"].encode("utf-8") for m in meta]
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in blobs])
+    np.save(os.path.join(d, "offsets.npy"), offsets)
+    pathlib.Path(d, "texts.bin").write_bytes(b"".join(blobs))
+    files = sorted({m["file"] for m in meta})
+    pos = {f: i for i, f in enumerate(files)}
+    cols = {
+        "scale": INT8_SCALE if VEC_DTYPE == np.int8 else 1.0,
+        "files": files,
+        "file": [pos[m["file"]] for m in meta],
+        "title": [m["title"] for m in meta],
+        "anchor": [m["anchor"] for m in meta],
+        "hash": [m.get("hash", "") for m in meta],
+    }
+    pathlib.Path(d, "meta.json").write_text(json.dumps(cols, ensure_ascii=False))
+
+    prev = (_read_current() or {}).get("dir")
+    tmp = _current_path() + f".{os.getpid()}.tmp"
+    pathlib.Path(tmp).write_text(json.dumps(
+        {"signature": sig, "dir": gen, "dtype": VEC_DTYPE.name, "rows": len(meta)}))
+    os.replace(tmp, _current_path())
+    # whatever current.json names now is never removed
+    keep = {gen, prev, (_read_current() or {}).get("dir")}
+    for old in glob.glob(os.path.join(INDEX_DIR, "gen-*")):
+        if os.path.basename(old) not in keep:
+            shutil.rmtree(old, ignore_errors=True)
+
+
 def build_index(force=False) -> Tuple[np.ndarray, List[Dict]]:
+    """
+    Chunk and embed DOCS_DIR. Unchanged trees load straight from disk; after
+    an edit only chunks whose content hash is not in the previous index are
+    embedded (force=True re-embeds everything). Builds are serialized across
+    processes; one that waited on another's build reuses what it published.
+    """
     sig = _signature()
-    if (not force) and os.path.exists(VEC_PATH) and os.path.exists(META_PATH) and os.path.exists(SIG_PATH):
-        if pathlib.Path(SIG_PATH).read_text().strip() == sig:
-            vecs = np.load(VEC_PATH)
-            meta = json.loads(pathlib.Path(META_PATH).read_text())
-            return vecs, meta
-
+    if not force:
+        saved = _saved_for(sig)
+        if saved is not None:
+            return saved
+    with _build_lock():
+        sig = _signature()
+        if not force:
+            saved = _saved_for(sig)
+            if saved is not None:
+                return saved
+        return _build(sig, force)
+
+
+def _saved_for(sig: str) -> Tuple[np.ndarray, List[Dict]] | None:
+    if (_read_current() or {}).get("signature") != sig:
+        return None
+    return _load_saved()
+
+
+def _build(sig: str, force: bool) -> Tuple[np.ndarray, List[Dict]]:
     docs = []
     for fp in sorted(glob.glob(os.path.join(DOCS_DIR, "**", "*.md"), recursive=True)):
         md = pathlib.Path(fp).read_text(encoding="utf-8", errors="ignore")
@@ -118,36 +366,159 @@ def build_index(force=False) -> Tuple[np.ndarray, List[Dict]]:
         vecs = np.zeros((0, 384), dtype=np.float32)
         meta = []
     else:
-        vecs = _embed([d["text"] for d in docs])
+        for d in docs:
+            d["hash"] = _chunk_key(d["text"])
+        known: Dict[str, np.ndarray] = {}
+        saved = None if force else _load_saved()
+        if saved is not None:
+            old_vecs, old_meta = saved
+            if len(old_vecs) == len(old_meta):
+                known = {m["hash"]: old_vecs[i]
+                         for i, m in enumerate(old_meta) if m.get("hash")}
+        todo = list(dict.fromkeys(
+            d["text"] for d in docs if d["hash"] not in known))
+        if todo:
+            for t, v in zip(todo, _embed(todo)):
+                known[_chunk_key(t)] = v
+        vecs = np.vstack([known[d["hash"]] for d in docs]).astype(np.float32)
         meta = docs
 
-    np.save(VEC_PATH, vecs)
-    pathlib.Path(META_PATH).write_text(json.dumps(meta, ensure_ascii=False))
-    pathlib.Path(SIG_PATH).write_text(sig)
+    _save_index(vecs, meta, sig)
     return vecs, meta
 
 
-# global (lazy) cache
-_VEC = None
-_META = None
-_LAST_LOAD = 0
+# loaded generation; replaced when current.json changes
+_INDEX: "_Index | None" = None
+_INDEX_STAT = None
+_INDEX_LOCK = threading.Lock()
+# monotonic time of this process's next docs-tree check
+_DOCS_CHECK_AT = 0.0
 
 
-def _ensure_index():
-    global _VEC, _META, _LAST_LOAD
-    if _VEC is None or (time.time() - _LAST_LOAD) > 60:
-        _VEC, _META = build_index(force=False)
-        _LAST_LOAD = time.time()
+def _current_stat():
+    try:
+        st = os.stat(_current_path())
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _check_docs() -> None:
+    """
+    At most every DOCS_CHECK_SEC, and in one process per interval (shared
+    stamp file + non-blocking build lock): hash the docs tree and rebuild
+    if it no longer matches the published generation.
+    """
+    global _DOCS_CHECK_AT
+    now = time.monotonic()
+    if now < _DOCS_CHECK_AT:
+        return
+    _DOCS_CHECK_AT = now + DOCS_CHECK_SEC
+    stamp = os.path.join(INDEX_DIR, DOCS_STAMP_FILE)
+    try:
+        if time.time() - os.stat(stamp).st_mtime < DOCS_CHECK_SEC:
+            return
+    except OSError:
+        pass
+    with _build_lock(blocking=False) as got:
+        if not got:
+            return      # another process is building right now
+        pathlib.Path(stamp).touch()
+        sig = _signature()
+        if (_read_current() or {}).get("signature") != sig:
+            try:
+                _build(sig, force=False)
+            except Exception:
+                # keep serving the published generation; retried next interval
+                log.warning("copilot docs reindex failed", exc_info=True)
+
+
+def _ensure_index() -> "_Index | None":
+    """
+    The docs tree is checked (build_index) when the process first searches
+    and then every DOCS_CHECK_SEC by whichever process gets there first.
+    Otherwise a single stat of current.json tells whether a rebuild in any
+    process has published a new generation, which is then mapped in.
+    """
+    global _INDEX, _INDEX_STAT, _DOCS_CHECK_AT
+    if _INDEX is not None:
+        _check_docs()
+    st = _current_stat()
+    if _INDEX is not None and st == _INDEX_STAT:
+        return _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            build_index(force=False)
+            st = _current_stat()
+            _DOCS_CHECK_AT = time.monotonic() + DOCS_CHECK_SEC
+        if _INDEX is None or st != _INDEX_STAT:
+            _INDEX, _INDEX_STAT = _open_current(), st
+    return _INDEX
 
 
 def _search(query: str, k: int = TOP_K) -> List[Tuple[float, Dict]]:
-    _ensure_index()
-    if _VEC is None or len(_META) == 0:
+    idx = _ensure_index()
+    if idx is None or len(idx) == 0:
         return []
-    qv = _embed([query])[0]
-    sims = _VEC @ qv  # cosine (because both are normalized)
-    idx = np.argsort(-sims)[:k]
-    return [(float(sims[i]), _META[i]) for i in idx]
+    qv = _query_vec(query)
+    sims = idx.scores(qv)  # cosine (because both are normalized)
+    k = min(k, len(sims))
+    top = np.argpartition(sims, len(sims) - k)[len(sims) - k:]
+    top = top[np.argsort(-sims[top], kind="stable")]
+    return [(float(sims[i]), idx.row(i)) for i in top]
+
+
+# semantic answer cache: one slot per remembered answer, all slots scored
+# with a single matrix product; tied to the index generation it was built on
+_ANS_LOCK = threading.Lock()
+_ANS_GEN = None
+_ANS_VECS: "np.ndarray | None" = None
+_ANS_EXPIRES = np.zeros(0)     # 0 = free slot
+_ANS_USED = np.zeros(0)
+_ANS_PAYLOADS: List[Dict | None] = []
+
+
+def _clear_answers(gen=None, dim: int = 0) -> None:
+    global _ANS_GEN, _ANS_VECS, _ANS_EXPIRES, _ANS_USED, _ANS_PAYLOADS
+    n = max(0, ANSWER_CACHE_MAX)
+    _ANS_GEN = gen
+    _ANS_VECS = np.zeros((n, dim), dtype=np.float32) if dim else None
+    _ANS_EXPIRES = np.zeros(n)
+    _ANS_USED = np.zeros(n)
+    _ANS_PAYLOADS = [None] * n
+
+
+def _cached_answer(gen: str, qv: np.ndarray) -> Dict | None:
+    """Answer given to a near-identical question on the same index, if still fresh."""
+    with _ANS_LOCK:
+        if gen != _ANS_GEN or _ANS_VECS is None or _ANS_VECS.shape[1] != len(qv):
+            return None
+        now = time.time()
+        live = _ANS_EXPIRES > now
+        if not live.any():
+            return None
+        sims = np.where(live, _ANS_VECS @ qv, -np.inf)
+        i = int(np.argmax(sims))
+        if sims[i] < ANSWER_CACHE_MIN_SIM:
+            return None
+        _ANS_USED[i] = now
+        return dict(copy.deepcopy(_ANS_PAYLOADS[i]), cached=True)
+
+
+def _remember_answer(gen: str, qv: np.ndarray, payload: Dict) -> None:
+    if ANSWER_CACHE_MAX <= 0 or ANSWER_CACHE_TTL_SEC <= 0:
+        return
+    with _ANS_LOCK:
+        if gen != _ANS_GEN or _ANS_VECS is None or _ANS_VECS.shape[1] != len(qv):
+            _clear_answers(gen, len(qv))
+        now = time.time()
+        free = np.flatnonzero(_ANS_EXPIRES <= now)
+        # expired slots first, otherwise the least recently used answer
+        i = int(free[0]) if len(free) else int(np.argmin(_ANS_USED))
+        _ANS_VECS[i] = qv
+        _ANS_EXPIRES[i] = now + ANSWER_CACHE_TTL_SEC
+        _ANS_USED[i] = now
+        _ANS_PAYLOADS[i] = copy.deepcopy(payload)
 
 
 def _system_prompt() -> str:
@@ -170,49 +541,37 @@ def _format_context(hits: List[Tuple[float, Dict]]) -> Tuple[str, List[Dict]]:
 
 
 def _ollama_chat(messages: List[Dict]) -> str:
-    r = requests.post(f"{OLLAMA}/api/chat", json={"model": LLM_MODEL,
+    r = _http.post(f"{OLLAMA}/api/chat", json={"model": LLM_MODEL,
                       "messages": messages, "stream": False}, timeout=120)
     r.raise_for_status()
     return r.json()["message"]["content"]
 
 
-# naive per-IP leaky bucket (per-process)
-_BUCKETS: Dict[str, List[float]] = {}
+def _ollama_chat_stream(messages: List[Dict]) -> Iterator[str]:
+    # Ollama streams one JSON object per line; the read timeout is per chunk
+    with _http.post(f"{OLLAMA}/api/chat", json={"model": LLM_MODEL,
+                    "messages": messages, "stream": True},
+                    stream=True, timeout=(10, 120)) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line:
+                continue
+            msg = json.loads(line)
+            if msg.get("error"):
+                raise RuntimeError(msg["error"])
+            piece = (msg.get("message") or {}).get("content") or ""
+            if piece:
+                yield piece
+            if msg.get("done"):
+                break
 
 
 def _rate_limit(ip: str) -> bool:
-    now = time.time()
-    window = 60.0
-    keep = []
-    for t in _BUCKETS.get(ip, []):
-        if now - t <= window:
-            keep.append(t)
-    if len(keep) >= RATE_LIMIT_PER_MIN:
-        _BUCKETS[ip] = keep
-        return False
-    keep.append(now)
-    _BUCKETS[ip] = keep
-    return True
-
-
-def ask(ip: str, question: str) -> Dict:
-    if not _rate_limit(ip):
-        return {"answer_html": "Rate limit exceeded. Please try again in a minute.", "sources": [], "from": "copilot"}
-
-    hits = _search(question, TOP_K)
-    if not hits or (hits[0][0] < MIN_SIM):
-        return {"answer_html": "I don't know.", "sources": [], "from": "copilot"}
-
-    ctx, sources = _format_context(hits)
-    sys = _system_prompt()
-    user = f"QUESTION:\n{question}\n\nCONTEXT:\n{ctx}\n\nAnswer now. If unsure, say 'I don't know.' Include sources."
+    # token bucket shared by all workers on the host
+    return rate_limit.take(f"copilot\0{ip}", RATE_LIMIT_PER_MIN, 60.0)
 
-    reply = _ollama_chat([
-        {"role": "system", "content": sys},
-        {"role": "user", "content": user},
-    ])
 
-    # services/copilot.py (inside ask(), right after you get `reply`)
+def _render_answer(reply: str) -> str:
     try:
         # 1) Markdown → HTML
         reply_html_md = markdown.markdown(
@@ -244,13 +603,88 @@ def ask(ip: str, question: str) -> Dict:
     except Exception:
         # last-resort fallback: preserve newlines only
         reply_html = reply.replace("\n", "<br/>")
+    return reply_html
+
+
+def _prepare(ip: str, question: str) -> Tuple[Dict | None, List[Dict], List[Dict], Tuple | None]:
+    """
+    -> (final response when no LLM call is needed, chat messages, sources,
+        answer cache key for the reply)
+    """
+    if not _rate_limit(ip):
+        return {"answer_html": "Rate limit exceeded. Please try again in a minute.", "sources": [], "from": "copilot"}, [], [], None
+
+    idx = _ensure_index()
+    key = None
+    if idx is not None and len(idx):
+        key = (idx.dir, _query_vec(question))
+        cached = _cached_answer(*key)
+        if cached is not None:
+            return cached, [], [], None
+
+    hits = _search(question, TOP_K)
+    if not hits or (hits[0][0] < MIN_SIM):
+        return {"answer_html": "I don't know.", "sources": [], "from": "copilot"}, [], [], None
+
+    ctx, sources = _format_context(hits)
+    sys = _system_prompt()
+    user = f"QUESTION:\n{question}\n\nCONTEXT:\n{ctx}\n\nAnswer now. If unsure, say 'I don't know.' Include sources."
+    return None, [
+        {"role": "system", "content": sys},
+        {"role": "user", "content": user},
+    ], sources, key
+
+
+def ask(ip: str, question: str) -> Dict:
+    early, messages, sources, key = _prepare(ip, question)
+    if early is not None:
+        return early
+
+    reply = _ollama_chat(messages)
+
+    out = {
+        "answer_html": _render_answer(reply),
+        "sources": sources,
+        "from": "copilot",
+        "answer_is_html": True
+    }
+    if key is not None:
+        _remember_answer(*key, out)
+    return out
+
 
-    return {
-        "answer_html": reply_html,
+def ask_stream(ip: str, question: str) -> Iterator[Tuple[str, Dict]]:
+    """
+    Same answer as ask(), as (event, data) pairs while the LLM generates:
+    "sources" once, "token" for every raw piece of text, "html" with the
+    sanitized rendering of the text so far (whenever a line ends or
+    STREAM_RENDER_SEC has passed), then "done" with the same payload ask() returns.
+    """
+    early, messages, sources, key = _prepare(ip, question)
+    if early is not None:
+        yield "done", early
+        return
+
+    yield "sources", {"sources": sources}
+    parts: List[str] = []
+    last = time.monotonic()
+    for piece in _ollama_chat_stream(messages):
+        parts.append(piece)
+        yield "token", {"text": piece}
+        now = time.monotonic()
+        if "\n" in piece or now - last >= STREAM_RENDER_SEC:
+            yield "html", {"answer_html": _render_answer("".join(parts))}
+            last = now
+
+    out = {
+        "answer_html": _render_answer("".join(parts)),
         "sources": sources,
         "from": "copilot",
         "answer_is_html": True
     }
+    if key is not None:
+        _remember_answer(*key, out)
+    yield "done", out
 
 
 # expose a quick rebuild for admin/ops
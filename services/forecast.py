@@ -1,8 +1,16 @@
 # services/forecast.py
 from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
 from typing import Dict, List, Tuple
+import hashlib
+import logging
 import math
+import multiprocessing
+import os
+import threading
 import numpy as np
 import pandas as pd
 
@@ -15,6 +23,23 @@ except Exception:
     _USE_HW = False
 
 
+log = logging.getLogger(__name__)
+
+# fitted forecasts kept per (metric, window, data digest, max horizon)
+FORECAST_CACHE_MAX = int(os.getenv("FORECAST_CACHE_MAX", "256"))
+_fit_cache: "OrderedDict[tuple, Dict[str, List]]" = OrderedDict()
+# last fitted Holt-Winters params per (metric, train_days), for warm starts
+_warm_params: "OrderedDict[tuple, dict]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+# worker processes for forecast_panel (0 = fit in the calling thread)
+FORECAST_WORKERS = int(os.getenv(
+    "FORECAST_WORKERS", str(min(4, os.cpu_count() or 1))))
+FORECAST_PANEL_TOP_USERS = int(os.getenv("FORECAST_PANEL_TOP_USERS", "5"))
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
 @dataclass
 class ForecastResult:
     history_labels: List[str]
@@ -25,105 +50,205 @@ class ForecastResult:
 
 def _ensure_daily_index(s: pd.Series, end_date: str, train_days: int = 180) -> pd.Series:
     """Ensure a continuous daily DateIndex, fill missing with 0, keep last N days."""
-    s = s.copy()
-    s.index = pd.to_datetime(s.index)  # to DatetimeIndex (day precision ok)
     end = pd.to_datetime(end_date)
     start = end - pd.Timedelta(days=train_days-1)
     full_ix = pd.date_range(start=start.normalize(),
                             end=end.normalize(), freq="D")
-    s = s.reindex(full_ix).fillna(0.0)
-    return s
+    # to DatetimeIndex (day precision ok); reindex returns a new series
+    s = s.set_axis(pd.to_datetime(s.index))
+    return s.reindex(full_ix, fill_value=0.0)
+
 
+def _day_labels(ix: pd.DatetimeIndex) -> List[str]:
+    return ix.strftime("%Y-%m-%d").tolist()
 
-def _hw_forecast(daily: pd.Series, horizon: int) -> Tuple[List[str], List[float], List[float], List[float]]:
+
+def _future_labels(last_day, horizon: int) -> List[str]:
+    return _day_labels(pd.date_range(
+        start=last_day + pd.Timedelta(days=1), periods=horizon, freq="D"))
+
+
+def _hw_fit(daily: pd.Series, start_params=None):
+    """Fit weekly additive Holt-Winters; start_params skips the brute-force start search."""
+    model = ExponentialSmoothing(
+        daily.astype(float),
+        trend="add",
+        seasonal="add",
+        seasonal_periods=7,
+        initialization_method="estimated",
+    )
+    if start_params is not None:
+        try:
+            return model.fit(optimized=True, start_params=start_params, use_brute=False)
+        except Exception:
+            pass
+    return model.fit(optimized=True)
+
+
+def _shifted_start_params(params: dict, shift_days: int) -> np.ndarray:
+    """Previous fit's params moved forward `shift_days` (window start moved by that much)."""
+    seasons = np.roll(np.asarray(params["initial_seasons"], dtype=float), -shift_days)
+    level = float(params["initial_level"]) + \
+        float(params["initial_trend"]) * shift_days
+    return np.r_[params["smoothing_level"], params["smoothing_trend"],
+                 params["smoothing_seasonal"], level, params["initial_trend"], seasons]
+
+
+def _hw_forecast(daily: pd.Series, horizon: int, fit=None) -> Tuple[List[str], List[float], List[float], List[float]]:
     """Holt-Winters weekly additive, fallback to seasonal-naive if it fails."""
     try:
-        model = ExponentialSmoothing(
-            daily.astype(float),
-            trend="add",
-            seasonal="add",
-            seasonal_periods=7,
-            initialization_method="estimated",
-        ).fit(optimized=True)
-        fcast = model.forecast(horizon)
+        model = fit if fit is not None else _hw_fit(daily)
+        fcast = np.asarray(model.forecast(horizon), dtype="float64")
         # rough PI via residual std (not exact, but serviceable)
-        resid = daily - model.fittedvalues
-        sigma = float(resid.std(ddof=1) or 0.0)
+        resid = daily.to_numpy(dtype="float64") - \
+            np.asarray(model.fittedvalues, dtype="float64")
+        sigma = float(np.std(resid, ddof=1)) if len(resid) > 1 else 0.0
         z = 1.96  # ~95%
-        lower = fcast - z * sigma
-        upper = fcast + z * sigma
-        idx = pd.date_range(
-            start=daily.index[-1] + pd.Timedelta(days=1), periods=horizon, freq="D")
         return (
-            [d.date().isoformat() for d in idx],
-            [float(max(0.0, v)) for v in fcast.values],
-            [float(max(0.0, v)) for v in lower.values],
-            [float(max(0.0, v)) for v in upper.values],
+            _future_labels(daily.index[-1], horizon),
+            np.maximum(fcast, 0.0).tolist(),
+            np.maximum(fcast - z * sigma, 0.0).tolist(),
+            np.maximum(fcast + z * sigma, 0.0).tolist(),
         )
     except Exception:
         return _seasonal_naive_forecast(daily, horizon)
 
 
-def _seasonal_naive_forecast(daily: pd.Series, horizon: int) -> Tuple[List[str], List[float], List[float], List[float]]:
+def seasonal_naive_matrix(Y: np.ndarray, horizon: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    Weekly seasonal-naive: y_hat[t+h] = y[t - 7 + ((h-1) mod 7)]
-    PI from residuals of y[t] - y[t-7] over last 8 weeks.
+    Weekly seasonal-naive for many series at once.
+    Y is (series × days); returns (values, lower, upper), each (series × horizon).
+      y_hat[t+h] = y[t - 7 + ((h-1) mod 7)]
+      PI from the std of y[t] - y[t-7] per series (~95%).
+    Fewer than 14 days → flat mean of the last week, no interval.
     """
-    if len(daily) < 14:
-        # too little history → flat mean
-        avg = float(daily.tail(min(len(daily), 7)).mean() or 0.0)
-        idx = pd.date_range(
-            start=daily.index[-1] + pd.Timedelta(days=1), periods=horizon, freq="D")
-        vals = [avg] * horizon
-        return ([d.date().isoformat() for d in idx], vals, vals, vals)
-
-    # pattern = last 7 actuals
-    last7 = daily.tail(7).values.tolist()
-    vals = [float(last7[(i % 7)]) for i in range(horizon)]
+    Y = np.asarray(Y, dtype="float64")
+    if Y.ndim == 1:
+        Y = Y[None, :]
+    n, t = Y.shape
+    vals = np.empty((n, horizon))
+    if t < 14:
+        vals[:] = Y[:, -min(t, 7):].mean(axis=1, keepdims=True) if t else 0.0
+        return vals, vals.copy(), vals.copy()
+
+    # pattern = last 7 actuals, repeated out to the horizon
+    reps = -(-horizon // 7)
+    vals[:] = np.tile(Y[:, -7:], reps)[:, :horizon]
 
     # residuals from seasonal naive fit: r_t = y_t - y_{t-7}
-    lag = 7
-    if len(daily) > lag:
-        r = daily[lag:] - daily[:-lag].values
-        sigma = float(r.std(ddof=1) or 0.0)
-    else:
-        sigma = 0.0
+    sigma = np.std(Y[:, 7:] - Y[:, :-7], axis=1, ddof=1, keepdims=True)
     z = 1.96  # ~95%
-    lower = [max(0.0, v - z * sigma) for v in vals]
-    upper = [max(0.0, v + z * sigma) for v in vals]
-
-    idx = pd.date_range(
-        start=daily.index[-1] + pd.Timedelta(days=1), periods=horizon, freq="D")
-    return (
-        [d.date().isoformat() for d in idx],
-        [float(v) for v in vals],
-        [float(v) for v in lower],
-        [float(v) for v in upper],
+    lower = np.maximum(vals - z * sigma, 0.0)
+    upper = np.maximum(vals + z * sigma, 0.0)
+    return vals, lower, upper
+
+
+def _seasonal_naive_forecast(daily: pd.Series, horizon: int) -> Tuple[List[str], List[float], List[float], List[float]]:
+    """Single-series seasonal_naive_matrix, as (labels, values, lower, upper) lists."""
+    vals, lower, upper = seasonal_naive_matrix(
+        daily.to_numpy(dtype="float64"), horizon)
+    return (_future_labels(daily.index[-1], horizon),
+            vals[0].tolist(), lower[0].tolist(), upper[0].tolist())
+
+
+def _fit_path(daily: pd.Series, horizon: int, start_params=None) -> Tuple[Dict[str, List], dict | None]:
+    """
+    One fit, forecast out to `horizon`; shorter horizons are prefixes of it.
+    -> (path, fitted HW params or None). Pure, so it can run in a worker process.
+    """
+    fit = None
+    if _USE_HW:
+        try:
+            fit = _hw_fit(daily, start_params)
+        except Exception:
+            fit = None
+    if fit is None:
+        labels, vals, lower, upper = _seasonal_naive_forecast(daily, horizon)
+        params = None
+    else:
+        labels, vals, lower, upper = _hw_forecast(daily, horizon, fit)
+        params = dict(fit.params)
+    return {"labels": labels, "values": vals, "lower": lower, "upper": upper}, params
+
+
+def _warm_start_for(metric: str | None, daily: pd.Series):
+    if not (metric and _USE_HW):
+        return None
+    with _cache_lock:
+        prev = _warm_params.get((metric, len(daily)))
+    if prev is None:
+        return None
+    shift = int((daily.index[0] - prev["start"]).days)
+    if not 0 <= shift < len(daily):
+        return None
+    try:
+        return _shifted_start_params(prev["params"], shift)
+    except Exception:
+        return None
+
+
+def _remember(key: tuple, path: Dict[str, List], metric: str | None,
+              daily: pd.Series, params: dict | None) -> None:
+    with _cache_lock:
+        _fit_cache[key] = path
+        while len(_fit_cache) > FORECAST_CACHE_MAX:
+            _fit_cache.popitem(last=False)
+        if metric and params is not None:
+            wk = (metric, len(daily))
+            _warm_params[wk] = {"start": daily.index[0], "params": params}
+            _warm_params.move_to_end(wk)
+            while len(_warm_params) > FORECAST_CACHE_MAX:
+                _warm_params.popitem(last=False)
+
+
+def _cache_key(daily: pd.Series, metric: str | None, longest: int) -> tuple:
+    digest = hashlib.sha1(np.ascontiguousarray(
+        daily.values, dtype="float64").tobytes()).hexdigest()
+    return (metric, daily.index[0], daily.index[-1], digest, longest, _USE_HW)
+
+
+def _cached_path(key: tuple) -> Dict[str, List] | None:
+    with _cache_lock:
+        path = _fit_cache.get(key)
+        if path is not None:
+            _fit_cache.move_to_end(key)
+        return path
+
+
+def _result(daily: pd.Series, horizons, path: Dict[str, List] | None,
+            history_labels: List[str] | None = None) -> ForecastResult:
+    out: Dict[int, Dict[str, List[float]]] = {}
+    if path is not None:
+        for h in horizons:
+            h = int(h)
+            out[h] = {k: v[:h] for k, v in path.items()}
+    return ForecastResult(
+        history_labels=(history_labels if history_labels is not None
+                        else _day_labels(daily.index)),
+        history_values=daily.to_numpy(dtype="float64").tolist(),
+        horizons=out,
     )
 
 
-def multi_horizon_forecast(daily: pd.Series, horizons=(30, 60, 90)) -> ForecastResult:
+def multi_horizon_forecast(daily: pd.Series, horizons=(30, 60, 90), metric: str | None = None) -> ForecastResult:
     """
     Input: daily series indexed by day (continuous, zeros filled).
     Output: history + per-horizon forecasts with simple 95% intervals.
-    """
-    hist_labels = [d.date().isoformat() for d in daily.index]
-    hist_values = [float(v) for v in daily.values]
 
-    out: Dict[int, Dict[str, List[float]]] = {}
-    for h in horizons:
-        if _USE_HW:
-            f_labels, f_vals, lower, upper = _hw_forecast(daily, h)
-        else:
-            f_labels, f_vals, lower, upper = _seasonal_naive_forecast(daily, h)
-        out[int(h)] = {
-            "labels": f_labels,
-            "values": f_vals,
-            "lower": lower,
-            "upper": upper,
-        }
+    The model is fitted once for the longest horizon and cached per
+    (metric, window, data); with `metric` given, the next window's fit
+    warm-starts from the previous parameters.
+    """
+    if not len(horizons) or daily.empty:
+        return _result(daily, horizons, None)
 
-    return ForecastResult(history_labels=hist_labels, history_values=hist_values, horizons=out)
+    longest = int(max(horizons))
+    key = _cache_key(daily, metric, longest)
+    path = _cached_path(key)
+    if path is None:
+        path, params = _fit_path(daily, longest, _warm_start_for(metric, daily))
+        _remember(key, path, metric, daily, params)
+    return _result(daily, horizons, path)
 
 
 def build_daily_series(df: pd.DataFrame, metric: str, end_date: str, train_days: int = 180) -> pd.Series:
@@ -163,3 +288,144 @@ def build_daily_series(df: pd.DataFrame, metric: str, end_date: str, train_days:
     g = g.astype(float)
     g.index = pd.to_datetime(g.index)
     return _ensure_daily_index(g, end_date=end_date, train_days=train_days)
+
+
+# ---- panel: every metric, per tier and per top user, from one ingest ----
+
+# metric -> costed column (jobs counts distinct JobID)
+PANEL_METRICS = {
+    "cost": "Cost (฿)",
+    "jobs": "JobID",
+    "cpu": "CPU_Core_Hours",
+    "gpu": "GPU_Hours",
+    "mem": "Mem_GB_Hours_Used",
+}
+
+
+def build_daily_panel(df: pd.DataFrame, end_date: str, train_days: int = 180,
+                      top_users: int | None = None) -> pd.DataFrame:
+    """
+    One daily frame (continuous UTC days, zeros filled) with a column per series:
+      "<metric>"                 all usage
+      "<metric>:tier=<tier>"     per pricing tier
+      "<metric>:user=<username>" per top-N user by cost
+    Same day bucketing as build_daily_series.
+    """
+    top_users = FORECAST_PANEL_TOP_USERS if top_users is None else top_users
+    end = pd.to_datetime(end_date)
+    full_ix = pd.date_range(start=(end - pd.Timedelta(days=train_days - 1)).normalize(),
+                            end=end.normalize(), freq="D")
+    if df is None or df.empty or "End" not in df.columns:
+        return pd.DataFrame(index=full_ix)
+
+    ends = pd.to_datetime(df["End"], errors="coerce", utc=True)
+    ok = ends.notna()
+    mem_col = "Mem_GB_Hours_Used" if "Mem_GB_Hours_Used" in df.columns else "Mem_GB_Hours_Alloc"
+    work = pd.DataFrame({
+        "day": ends[ok].dt.tz_convert("UTC").dt.normalize().dt.tz_localize(None),
+        "tier": df.loc[ok, "tier"].astype(str) if "tier" in df.columns else "",
+        "user": df.loc[ok, "User"].astype(str) if "User" in df.columns else "",
+        "jobs": df.loc[ok, "JobID"] if "JobID" in df.columns else pd.NA,
+    })
+    for m, col in PANEL_METRICS.items():
+        if m == "jobs":
+            continue
+        src = mem_col if m == "mem" else col
+        work[m] = pd.to_numeric(df.loc[ok, src], errors="coerce").fillna(0.0) \
+            if src in df.columns else 0.0
+
+    aggs = {m: "sum" for m in PANEL_METRICS if m != "jobs"}
+    aggs["jobs"] = "nunique"
+
+    def _by(extra: str | None, label: str | None, rows: pd.DataFrame) -> pd.DataFrame:
+        keys = ["day"] + ([extra] if extra else [])
+        g = rows.groupby(keys).agg(aggs)[list(PANEL_METRICS)]
+        if not extra:
+            return g
+        g = g.unstack(extra)
+        g.columns = [f"{m}:{label}={v}" for m, v in g.columns]
+        return g
+
+    parts = [_by(None, None, work), _by("tier", "tier", work)]
+    if top_users > 0:
+        top = work.groupby("user")["cost"].sum().nlargest(top_users).index
+        parts.append(_by("user", "user", work[work["user"].isin(top)]))
+    panel = pd.concat(parts, axis=1).reindex(full_ix).fillna(0.0).astype(float)
+    panel.index.name = None
+    return panel
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor | None:
+    global _pool
+    if workers <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_forecast_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def forecast_panel(panel: pd.DataFrame, horizons=(30, 60, 90),
+                   workers: int | None = None) -> Dict[str, ForecastResult]:
+    """
+    Forecast every column of a build_daily_panel frame. Cached series are
+    served from the model cache; the rest are fitted in parallel on a
+    process pool (FORECAST_WORKERS, 0 = inline) and cached on return.
+    Column names double as cache/warm-start keys.
+    """
+    workers = FORECAST_WORKERS if workers is None else workers
+    out: Dict[str, ForecastResult] = {}
+    hist_labels = _day_labels(panel.index)   # shared by every series
+    if panel.empty or not len(horizons):
+        return {c: _result(panel[c], horizons, None, hist_labels) for c in panel.columns}
+
+    longest = int(max(horizons))
+    todo = {}
+    for name in panel.columns:
+        daily = panel[name]
+        key = _cache_key(daily, name, longest)
+        path = _cached_path(key)
+        if path is not None:
+            out[name] = _result(daily, horizons, path, hist_labels)
+        else:
+            todo[name] = (daily, key, _warm_start_for(name, daily))
+
+    def _done(name, path, params):
+        daily, key, _sp = todo[name]
+        _remember(key, path, name, daily, params)
+        out[name] = _result(daily, horizons, path, hist_labels)
+
+    if todo and not _USE_HW:
+        # seasonal-naive: all uncached series in one array pass
+        names = list(todo)
+        vals, lower, upper = seasonal_naive_matrix(
+            panel[names].to_numpy(dtype="float64").T, longest)
+        labels = _future_labels(panel.index[-1], longest)
+        for i, name in enumerate(names):
+            _done(name, {"labels": labels, "values": vals[i].tolist(),
+                         "lower": lower[i].tolist(), "upper": upper[i].tolist()}, None)
+
+    pending = {n: v for n, v in todo.items() if n not in out}
+    pool = _get_pool(workers) if len(pending) > 1 else None
+    if pool is not None:
+        try:
+            futs = {pool.submit(_fit_path, daily, longest, sp): name
+                    for name, (daily, _k, sp) in pending.items()}
+            for f in as_completed(futs):
+                _done(futs[f], *f.result())
+        except BrokenProcessPool:
+            log.warning("forecast pool broke; fitting the rest inline")
+            shutdown_forecast_pool()
+    for name, (daily, _k, sp) in pending.items():
+        if name not in out:
+            _done(name, *_fit_path(daily, longest, sp))
+    return {c: out[c] for c in panel.columns}
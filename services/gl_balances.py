@@ -0,0 +1,117 @@
+# services/gl_balances.py
+"""
+Period balances for posted GL.
+
+gl_account_balances keeps debit/credit totals per (account, UTC month) and is
+updated in the same transaction as every GLEntry insert (models/gl.py
+listeners). A report over [start, end] reads the whole months inside the window
+from that table and only scans gl_entries for the partial months at the edges.
+"""
+from __future__ import annotations
+from datetime import date, datetime, timedelta, timezone
+
+import pandas as pd
+from sqlalchemy import select, func, delete, or_, and_, text
+
+from models.base import session_scope
+from models.gl import AccountBalance, GLEntry, balance_rows_select, _BAL_COLS
+from services.accounting import tb_from_sums
+
+
+def _month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def _next_month(d: date) -> date:
+    return (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _utc(d: date) -> datetime:
+    return datetime(d.year, d.month, d.day, tzinfo=timezone.utc)
+
+
+def _split_window(start: date, end: date):
+    """
+    -> ((first_full_month, stop_month) | None, [(lo, hi), ...])
+    Whole months in [start, end] plus the half-open day ranges left over.
+    """
+    full_lo = start if start.day == 1 else _next_month(start)
+    stop = end + timedelta(days=1)
+    full_hi = stop if stop.day == 1 else _month_start(end)
+    if full_lo >= full_hi:
+        return None, [(start, stop)]
+    edges = [(lo, hi) for lo, hi in ((start, full_lo), (full_hi, stop)) if lo < hi]
+    return (full_lo, full_hi), edges
+
+
+def posted_trial_balance(start_iso: str, end_iso: str) -> pd.DataFrame:
+    """
+    Trial balance of posted GL for [start_iso, end_iso] (inclusive, UTC days),
+    same shape and attrs as services.accounting.trial_balance().
+    """
+    start, end = date.fromisoformat(start_iso), date.fromisoformat(end_iso)
+    full, edges = _split_window(start, end)
+    rows = []
+    with session_scope() as s:
+        if full:
+            lo_key = full[0].year * 100 + full[0].month
+            hi_key = full[1].year * 100 + full[1].month
+            key = AccountBalance.period_year * 100 + AccountBalance.period_month
+            rows += s.execute(
+                select(
+                    AccountBalance.account_id,
+                    AccountBalance.account_name,
+                    AccountBalance.account_type,
+                    AccountBalance.debit,
+                    AccountBalance.credit,
+                ).where(key >= lo_key, key < hi_key)
+            ).all()
+        if edges:
+            rows += s.execute(
+                select(
+                    GLEntry.account_id,
+                    func.max(GLEntry.account_name),
+                    func.max(GLEntry.account_type),
+                    func.sum(GLEntry.debit),
+                    func.sum(GLEntry.credit),
+                )
+                .where(or_(*[
+                    and_(GLEntry.date >= _utc(lo), GLEntry.date < _utc(hi))
+                    for lo, hi in edges
+                ]))
+                .group_by(GLEntry.account_id)
+            ).all()
+
+    df = pd.DataFrame(rows, columns=[
+        "account_id", "account_name", "account_type", "debits", "credits"])
+    if df.empty:
+        return tb_from_sums(df)
+    df["debits"] = pd.to_numeric(df["debits"], errors="coerce").fillna(0.0)
+    df["credits"] = pd.to_numeric(df["credits"], errors="coerce").fillna(0.0)
+    g = df.groupby(["account_id", "account_name", "account_type"], dropna=False).agg(
+        debits=("debits", "sum"),
+        credits=("credits", "sum"),
+    ).reset_index()
+    return tb_from_sums(g)
+
+
+def rebuild_account_balances() -> int:
+    """Recompute gl_account_balances from gl_entries. Returns the number of rows written."""
+    with session_scope() as s:
+        # keep concurrent postings out while the table is rebuilt
+        s.execute(text("LOCK TABLE gl_entries IN SHARE MODE"))
+        s.execute(delete(AccountBalance))
+        s.execute(AccountBalance.__table__.insert().from_select(
+            _BAL_COLS, balance_rows_select()))
+        return int(s.scalar(select(func.count()).select_from(AccountBalance)) or 0)
+
+
+def ensure_account_balances() -> bool:
+    """Backfill the balance table once for ledgers posted before it existed."""
+    with session_scope() as s:
+        has_bal = s.scalar(select(AccountBalance.account_id).limit(1)) is not None
+        has_gl = s.scalar(select(GLEntry.id).limit(1)) is not None
+    if has_bal or not has_gl:
+        return False
+    rebuild_account_balances()
+    return True
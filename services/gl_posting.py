@@ -3,7 +3,6 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from typing import Iterable, Tuple
 
-import pandas as pd
 from models.audit_store import audit
 from models.base import session_scope
 from models.schema import Receipt
@@ -529,16 +528,24 @@ def close_period(year: int, month: int, actor: str) -> bool:
                   status=304, outcome="noop")
             return True
 
-        # aggregate balances from posted GL (exclude prior 'closing')
-        lines = s.execute(
-            select(GLEntry).join(JournalBatch, GLEntry.batch_id == JournalBatch.id).where(
+        # aggregate balances from posted GL (exclude prior 'closing'):
+        # one row per account, summed in the database
+        rows = s.execute(
+            select(GLEntry.account_id,
+                   func.max(GLEntry.account_name).label("name"),
+                   func.max(GLEntry.account_type).label("type"),
+                   func.coalesce(func.sum(GLEntry.debit), 0).label("dr"),
+                   func.coalesce(func.sum(GLEntry.credit), 0).label("cr"))
+            .join(JournalBatch, GLEntry.batch_id == JournalBatch.id)
+            .where(
                 JournalBatch.period_year == year,
                 JournalBatch.period_month == month,
                 JournalBatch.kind != "closing"
             )
-        ).scalars().all()
+            .group_by(GLEntry.account_id)
+        ).all()
 
-        if not lines:
+        if not rows:
             # still allow closing an empty period
             p.status = "closed"
             p.closed_at = now
@@ -547,13 +554,11 @@ def close_period(year: int, month: int, actor: str) -> bool:
             return True
 
         # compute balances by account type
-        sums = {}
-        for ln in lines:
-            key = ln.account_id
-            sums.setdefault(key, {"name": ln.account_name,
-                            "type": ln.account_type, "dr": 0.0, "cr": 0.0})
-            sums[key]["dr"] += float(ln.debit or 0)
-            sums[key]["cr"] += float(ln.credit or 0)
+        sums = {
+            r.account_id: {"name": r.name, "type": r.type,
+                           "dr": float(r.dr or 0), "cr": float(r.cr or 0)}
+            for r in rows
+        }
 
         # closing batch
         cb = JournalBatch(
@@ -693,7 +698,7 @@ def post_ecl_provision(year: int, month: int, actor: str,
       }
     """
     from calendar import monthrange
-    from sqlalchemy import select, func, and_
+    from sqlalchemy import select, func, and_, case, cast, literal, Date
     if rates is None:
         rates = {
             "ar": {"current": 0.005, "1-30": 0.01, "31-60": 0.02, "61-90": 0.05, "90+": 0.20},
@@ -704,79 +709,66 @@ def post_ecl_provision(year: int, month: int, actor: str,
     asof = datetime(year, month, monthrange(year, month)
                     [1], 23, 59, 59, tzinfo=timezone.utc)
 
-    def bucket(days: int) -> str:
-        if days <= 0:
-            return "current"
-        if days <= 30:
-            return "1-30"
-        if days <= 60:
-            return "31-60"
-        if days <= 90:
-            return "61-90"
-        return "90+"
-
     AR = _acc("Accounts Receivable")
     CA = _acc("Contract Asset (Unbilled A/R)")
     ALW_AR = _acc("Allowance for ECL - Trade receivables")
     ALW_CA = _acc("Allowance for ECL - Contract assets")
     ECL_EXP = _acc("Impairment loss (ECL)")
 
+    asof_day = literal(asof.date(), Date)
+
+    def _bucket(age_days):
+        return case(
+            (age_days <= 0, "current"),
+            (age_days <= 30, "1-30"),
+            (age_days <= 60, "31-60"),
+            (age_days <= 90, "61-90"),
+            else_="90+",
+        )
+
     with session_scope() as s:
-        # -------- Outstanding by receipt (A/R: dr-cr; CA: dr-cr) --------
-        def _outstanding_per_receipt(account_id: str):
-            rows = s.execute(
-                select(GLEntry.receipt_id,
-                       func.coalesce(func.sum(GLEntry.debit), 0.0).label("dr"),
-                       func.coalesce(func.sum(GLEntry.credit), 0.0).label("cr"))
+        # -------- Outstanding exposure per aging bucket, fully in SQL --------
+        # per receipt: dr - cr on the account (positive = still open), then
+        # aged against the receipt date and summed per bucket
+        def _exposure_by_bucket(account_id: str, ref_date, due_days: int = 0) -> dict:
+            amt = (func.coalesce(func.sum(GLEntry.debit), 0)
+                   - func.coalesce(func.sum(GLEntry.credit), 0))
+            per_receipt = (
+                select(GLEntry.receipt_id.label("rid"), amt.label("amt"))
                 .join(JournalBatch, GLEntry.batch_id == JournalBatch.id)
                 .where(and_(GLEntry.account_id == account_id,
                             GLEntry.date <= asof,
+                            GLEntry.receipt_id.is_not(None),
                             JournalBatch.kind != "closing"))
                 .group_by(GLEntry.receipt_id)
+                .having(amt > 0.005)  # skip settled receipts
+                .subquery()
+            )
+            # receipts that vanished age from `asof` (=> current)
+            age = asof_day - func.coalesce(ref_date, asof_day) - due_days
+            aged = (
+                select(per_receipt.c.amt, _bucket(age).label("bucket"))
+                .select_from(per_receipt.outerjoin(Receipt, Receipt.id == per_receipt.c.rid))
+                .subquery()
+            )
+            rows = s.execute(
+                select(aged.c.bucket, func.sum(aged.c.amt))
+                .group_by(aged.c.bucket)
             ).all()
-            # receipt_id -> amount
-            return {rid: float(dr or 0) - float(cr or 0) for (rid, dr, cr) in rows if rid is not None}
-
-        ar_os = _outstanding_per_receipt(AR)  # positive = still due gross
-        ca_os = _outstanding_per_receipt(CA)  # positive = still unbilled net
-
-        # -------- Pull receipt dates to compute age --------
-        recs = {}
-        if ar_os or ca_os:
-            rids = list({*ar_os.keys(), *ca_os.keys()})
-            for r in s.execute(select(Receipt.id, Receipt.created_at, Receipt.end).where(Receipt.id.in_(rids))).all():
-                recs[r.id] = {"created_at": r.created_at, "end": r.end}
-
-        def _age_days_for_ar(rid: int) -> int:
-            inv = recs.get(rid, {}).get("created_at") or asof
-            due = (inv + pd.to_timedelta(ar_due_days, unit="D")
-                   ) if ar_due_days else inv
-            return (asof.date() - due.date()).days
-
-        def _age_days_for_ca(rid: int) -> int:
-            sv = recs.get(rid, {}).get("end") or recs.get(
-                rid, {}).get("created_at") or asof
-            return (asof.date() - sv.date()).days
+            return {b: float(v or 0) for (b, v) in rows}
+
+        # A/R ages from invoice date (+ due days); contract assets from service end
+        ar_buckets = _exposure_by_bucket(
+            AR, cast(Receipt.created_at, Date), ar_due_days)
+        ca_buckets = _exposure_by_bucket(
+            CA, cast(func.coalesce(Receipt.end, Receipt.created_at), Date))
 
         # -------- Required allowance (provision matrix) --------
-        buckets_exposure = {"ar": {}, "ca": {}}
-        required_ar = 0.0
-        for rid, amt in ar_os.items():
-            if amt <= 0.005:  # settled
-                continue
-            b = bucket(_age_days_for_ar(rid))
-            buckets_exposure["ar"][b] = buckets_exposure["ar"].get(
-                b, 0.0) + amt
-            required_ar += amt * float(rates["ar"].get(b, 0.0))
-
-        required_ca = 0.0
-        for rid, amt in ca_os.items():
-            if amt <= 0.005:
-                continue
-            b = bucket(_age_days_for_ca(rid))
-            buckets_exposure["ca"][b] = buckets_exposure["ca"].get(
-                b, 0.0) + amt
-            required_ca += amt * float(rates["ca"].get(b, 0.0))
+        buckets_exposure = {"ar": ar_buckets, "ca": ca_buckets}
+        required_ar = sum(amt * float(rates["ar"].get(b, 0.0))
+                          for b, amt in ar_buckets.items())
+        required_ca = sum(amt * float(rates["ca"].get(b, 0.0))
+                          for b, amt in ca_buckets.items())
 
         required_ar = round(required_ar, 2)
         required_ca = round(required_ca, 2)
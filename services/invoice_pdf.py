@@ -0,0 +1,147 @@
+# services/invoice_pdf.py
+"""
+Invoice PDFs with an on-disk cache.
+
+A rendered PDF is stored under INVOICE_PDF_CACHE_DIR as
+`<receipt id>-<locale>-<content hash>.pdf`. The hash covers everything that
+reaches the page: the receipt dict and its item totals (status, amounts, dates),
+the template source, org info and the display timezone. Any change yields a
+new hash, so stale files are never served; the previous file for the same
+receipt/locale is removed when the new one is written.
+
+`schedule_invoice_pdfs(rid)` queues a background pre-render (both locales)
+after a receipt is created or paid.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+from pathlib import Path
+
+from flask import current_app, render_template
+
+from models.billing_store import get_receipt_summary
+from services.datetimex import APP_TZ
+from services.org_info import ORG_INFO, ORG_INFO_TH
+from services.pdf_render import render_pdf
+
+log = logging.getLogger(__name__)
+
+INVOICE_PDF_CACHE_DIR = os.getenv(
+    "INVOICE_PDF_CACHE_DIR", "./instance/pdf_cache")
+
+# locale -> (template, org info)
+INVOICE_TEMPLATES = {
+    "en": ("invoices/invoice.html", ORG_INFO),
+    "th": ("invoices/invoice_th.html", ORG_INFO_TH),
+}
+
+_prerender_q: "queue.Queue[int]" = queue.Queue()
+_prerender_thread: threading.Thread | None = None
+_prerender_lock = threading.Lock()
+
+
+def _prerender_enabled() -> bool:
+    return os.getenv("INVOICE_PDF_PRERENDER", "1") in ("1", "true", "yes", "on")
+
+
+def _template_digest(name: str) -> str:
+    app = current_app._get_current_object()
+    src, _filename, _uptodate = app.jinja_env.loader.get_source(
+        app.jinja_env, name)
+    return hashlib.sha256(src.encode("utf-8")).hexdigest()
+
+
+def invoice_pdf_key(rec: dict, totals: dict, locale: str = "en") -> str:
+    """Content hash of everything the invoice template renders."""
+    template, org = INVOICE_TEMPLATES[locale]
+    doc = {
+        "locale": locale,
+        "template": _template_digest(template),
+        "org": org(),
+        "tz": str(APP_TZ),
+        "receipt": rec,
+        "totals": totals,
+    }
+    blob = json.dumps(doc, sort_keys=True, default=str,
+                      ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _cache_path(rid: int, locale: str, key: str) -> Path:
+    return Path(INVOICE_PDF_CACHE_DIR) / f"{rid}-{locale}-{key[:32]}.pdf"
+
+
+def invoice_pdf_html(rec: dict, totals: dict, locale: str = "en") -> tuple[Path, str | None]:
+    """
+    -> (cache path, HTML to render), HTML is None when the cached PDF is current.
+    Split out so batch jobs can render the HTML here and the PDF on the pool.
+    """
+    template, org = INVOICE_TEMPLATES[locale]
+    path = _cache_path(rec["id"], locale, invoice_pdf_key(rec, totals, locale))
+    if path.is_file():
+        return path, None
+    html = render_template(template, r=rec, totals=totals,
+                           org=org(), DISPLAY_TZ=APP_TZ)
+    return path, html
+
+
+def store_invoice_pdf(path: Path, rid: int, locale: str, pdf: bytes) -> None:
+    """Write a rendered PDF into the cache and drop older versions."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(pdf)
+        os.replace(tmp, path)
+        for old in path.parent.glob(f"{rid}-{locale}-*.pdf"):
+            if old != path:
+                old.unlink(missing_ok=True)
+    except OSError:
+        log.warning("could not cache invoice PDF %s", path, exc_info=True)
+
+
+def render_invoice_pdf(rec: dict, totals: dict, locale: str = "en") -> bytes:
+    """Return the invoice PDF, from cache when the content hash matches."""
+    path, html = invoice_pdf_html(rec, totals, locale)
+    if html is None:
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:   # evicted between the check and the read
+            path, html = invoice_pdf_html(rec, totals, locale)
+            if html is None:
+                return path.read_bytes()
+    pdf = render_pdf(html, base_url=current_app.static_folder)
+    store_invoice_pdf(path, rec["id"], locale, pdf)
+    return pdf
+
+
+def _prerender_loop(app) -> None:
+    while True:
+        rid = _prerender_q.get()
+        try:
+            with app.test_request_context("/"):
+                rec, totals = get_receipt_summary(rid)
+                if rec:
+                    for locale in INVOICE_TEMPLATES:
+                        render_invoice_pdf(rec, totals, locale)
+        except Exception:
+            log.exception("invoice PDF pre-render failed for receipt %s", rid)
+        finally:
+            _prerender_q.task_done()
+
+
+def schedule_invoice_pdfs(rid: int) -> None:
+    """Queue a background render of receipt `rid` (both locales) into the cache."""
+    global _prerender_thread
+    if not _prerender_enabled():
+        return
+    with _prerender_lock:
+        if _prerender_thread is None or not _prerender_thread.is_alive():
+            _prerender_thread = threading.Thread(
+                target=_prerender_loop, args=(current_app._get_current_object(),),
+                name="invoice-pdf-prerender", daemon=True)
+            _prerender_thread.start()
+    _prerender_q.put(int(rid))
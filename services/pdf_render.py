@@ -0,0 +1,298 @@
+# services/pdf_render.py
+"""
+WeasyPrint rendering off the request thread.
+
+render_pdf() hands HTML to a small process pool (PDF_RENDER_WORKERS). Each
+worker imports WeasyPrint once, keeps one FontConfiguration and renders a
+warm-up page at start, so font discovery and CSS parsing are paid per worker
+instead of per document. PDF_RENDER_WORKERS=0 renders inline.
+
+Batch jobs (render_invoices_zip / start_invoice_batch) fan a whole month of
+invoices out over the pool and stream the results into one ZIP on disk.
+Job state lives next to the ZIP (status.json) so any app process can report
+on or serve a job started by another. Job folders older than
+PDF_BATCH_TTL_SEC are deleted when the next batch starts.
+"""
+from __future__ import annotations
+import io
+import json
+import logging
+import multiprocessing
+import os
+import secrets
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from pathlib import Path
+
+from weasyprint import HTML
+
+log = logging.getLogger(__name__)
+
+PDF_RENDER_WORKERS = int(os.getenv(
+    "PDF_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_RENDER_TIMEOUT_SEC = float(os.getenv("PDF_RENDER_TIMEOUT_SEC", "120"))
+PDF_BATCH_DIR = os.getenv("PDF_BATCH_DIR", "./instance/pdf_batches")
+PDF_BATCH_CHUNK = int(os.getenv("PDF_BATCH_CHUNK", "200"))
+# finished (or abandoned) batch folders are kept this long after their last update
+PDF_BATCH_TTL_SEC = float(os.getenv("PDF_BATCH_TTL_SEC", str(24 * 3600)))
+# logical pages per independently rendered part of a long report
+PDF_PAGES_PER_PART = int(os.getenv("PDF_PAGES_PER_PART", "40"))
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+# per worker process
+_FONT_CONFIG = None
+
+
+def _warm_worker() -> None:
+    global _FONT_CONFIG
+    try:
+        from weasyprint.text.fonts import FontConfiguration
+        _FONT_CONFIG = FontConfiguration()
+    except Exception:
+        _FONT_CONFIG = None
+    try:
+        _render("<html><body><p>warm-up ฿ ทดสอบ</p></body></html>", None)
+    except Exception:
+        log.warning("PDF worker warm-up failed", exc_info=True)
+
+
+def _render(html: str, base_url: str | None) -> bytes:
+    kw = {"font_config": _FONT_CONFIG} if _FONT_CONFIG is not None else {}
+    return HTML(string=html, base_url=base_url).write_pdf(**kw)
+
+
+def _get_pool() -> ProcessPoolExecutor | None:
+    global _pool
+    if PDF_RENDER_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+            )
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def shutdown_pdf_pool() -> None:
+    _reset_pool()
+
+
+def render_pdf(html: str, base_url: str | None = None) -> bytes:
+    """Render one HTML document to PDF bytes on the pool (inline when disabled)."""
+    pool = _get_pool()
+    if pool is None:
+        return _render(html, base_url)
+    try:
+        return pool.submit(_render, html, base_url).result(timeout=PDF_RENDER_TIMEOUT_SEC)
+    except BrokenProcessPool:
+        log.warning("PDF pool broke; rendering inline and restarting it")
+        _reset_pool()
+        return _render(html, base_url)
+
+
+def render_many(docs, base_url: str | None = None):
+    """
+    Render an iterable of (key, html) and yield (key, pdf bytes) as each
+    finishes (completion order, not input order).
+    """
+    pool = _get_pool()
+    if pool is None:
+        for key, html in docs:
+            yield key, _render(html, base_url)
+        return
+    futs = {pool.submit(_render, html, base_url): key for key, html in docs}
+    for fut in as_completed(futs):
+        yield futs[fut], fut.result(timeout=PDF_RENDER_TIMEOUT_SEC)
+
+
+def render_paged_pdf(template: str, pages: list, *, base_url: str | None = None,
+                     page_label: str = "Page ", label_font: str | None = None,
+                     label_size: str = "10.5px", **ctx) -> bytes:
+    """
+    Render a long paginated report (the ledger PDFs) without laying it out as
+    one document. `pages` is split into parts of PDF_PAGES_PER_PART; each part
+    is rendered on its own (in parallel on the pool) with `number_pages=False`,
+    only the last one with `with_summary=True`. The parts are concatenated and
+    a footer-only document supplies one "Page i / N" index for the result.
+    Short reports are rendered in one go.
+    """
+    from flask import render_template
+
+    per = max(1, PDF_PAGES_PER_PART)
+    if len(pages) <= per:
+        return render_pdf(render_template(template, pages=pages, **ctx), base_url)
+
+    from pypdf import PdfReader, PdfWriter
+
+    parts = [pages[i:i + per] for i in range(0, len(pages), per)]
+    docs = (
+        (k, render_template(template, pages=part, number_pages=False,
+                            with_summary=(k == len(parts) - 1), **ctx))
+        for k, part in enumerate(parts)
+    )
+    rendered = dict(render_many(docs, base_url))
+
+    writer = PdfWriter()
+    for k in range(len(parts)):
+        writer.append(PdfReader(io.BytesIO(rendered.pop(k))))
+
+    numbers = PdfReader(io.BytesIO(render_pdf(render_template(
+        "admin/ledger_pdf_pagenums.html", n=len(writer.pages), label=page_label,
+        font_family=label_font, font_size=label_size), base_url)))
+    for page, stamp in zip(writer.pages, numbers.pages):
+        page.merge_page(stamp)
+
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+# ---- batch jobs ----
+
+def _job_dir(job_id: str) -> Path:
+    return Path(PDF_BATCH_DIR) / job_id
+
+
+def _write_status(job_id: str, **state) -> None:
+    d = _job_dir(job_id)
+    d.mkdir(parents=True, exist_ok=True)
+    tmp = d / "status.json.tmp"
+    tmp.write_text(json.dumps(state, default=str), encoding="utf-8")
+    os.replace(tmp, d / "status.json")
+
+
+def pdf_batch_status(job_id: str) -> dict | None:
+    if not job_id.isalnum():
+        return None
+    try:
+        return json.loads((_job_dir(job_id) / "status.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def pdf_batch_zip_path(job_id: str) -> Path:
+    return _job_dir(job_id) / "invoices.zip"
+
+
+def prune_pdf_batches(max_age_sec: float | None = None) -> int:
+    """Delete batch folders whose status.json is older than the TTL. -> folders removed"""
+    ttl = PDF_BATCH_TTL_SEC if max_age_sec is None else max_age_sec
+    cutoff = time.time() - ttl
+    removed = 0
+    try:
+        dirs = [d for d in Path(PDF_BATCH_DIR).iterdir() if d.is_dir()]
+    except OSError:
+        return 0
+    for d in dirs:
+        # a running job rewrites status.json as it goes, so only stale ones age out
+        st = d / "status.json"
+        try:
+            mtime = (st if st.exists() else d).stat().st_mtime
+        except OSError:
+            continue
+        if mtime < cutoff:
+            shutil.rmtree(d, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def render_invoices_zip(year: int, month: int, locale: str, out_path: Path, progress=None) -> int:
+    """
+    Render every non-void invoice whose service period starts in year-month
+    into a ZIP at `out_path`. Cached PDFs (services.invoice_pdf) are reused;
+    the rest go to the pool and are cached as they come back.
+    Needs an app/request context (Jinja). Returns the number of PDFs.
+    """
+    from models.billing_store import receipt_summaries_for_month
+    from services.invoice_pdf import invoice_pdf_html, store_invoice_pdf
+    from flask import current_app
+
+    summaries = receipt_summaries_for_month(year, month)
+    total = len(summaries)
+    done = 0
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_suffix(".zip.partial")
+    todo = {}
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as z:
+        def _add(rid, pdf):
+            nonlocal done
+            z.writestr(f"invoice_{rid}_{locale}.pdf", pdf)
+            done += 1
+            if progress:
+                progress(done, total)
+
+        def _flush():
+            for rid, pdf in render_many(((rid, html) for rid, (_p, html) in todo.items()),
+                                        base_url=current_app.static_folder):
+                store_invoice_pdf(todo[rid][0], rid, locale, pdf)
+                _add(rid, pdf)
+            todo.clear()
+
+        for rec, totals in summaries:
+            rid = rec["id"]
+            path, html = invoice_pdf_html(rec, totals, locale)
+            if html is None:
+                _add(rid, path.read_bytes())
+                continue
+            todo[rid] = (path, html)
+            # bound the HTML held in memory / queued on the pool
+            if len(todo) >= PDF_BATCH_CHUNK:
+                _flush()
+        _flush()
+    os.replace(tmp, out_path)
+    return done
+
+
+def _run_invoice_batch(app, job_id: str, year: int, month: int, locale: str) -> None:
+    started = datetime.now(timezone.utc).isoformat()
+    base = {"id": job_id, "kind": "invoices", "year": year, "month": month,
+            "locale": locale, "started_at": started}
+
+    def _progress(done, total):
+        if done == total or done % 25 == 0:
+            _write_status(job_id, status="running", done=done, total=total, **base)
+
+    try:
+        with app.test_request_context("/"):
+            n = render_invoices_zip(year, month, locale,
+                                    pdf_batch_zip_path(job_id), progress=_progress)
+        _write_status(job_id, status="done", done=n, total=n,
+                      finished_at=datetime.now(timezone.utc).isoformat(), **base)
+    except Exception as e:
+        log.exception("invoice PDF batch %s failed", job_id)
+        _write_status(job_id, status="failed", error=str(e)[:256], **base)
+
+
+def start_invoice_batch(year: int, month: int, locale: str = "en") -> str:
+    """Kick off a background month batch; returns the job id."""
+    from flask import current_app
+    try:
+        prune_pdf_batches()
+    except Exception:
+        log.warning("could not prune old PDF batches", exc_info=True)
+    job_id = secrets.token_hex(8)
+    _write_status(job_id, status="queued", id=job_id, kind="invoices",
+                  year=year, month=month, locale=locale, done=0, total=None)
+    threading.Thread(
+        target=_run_invoice_batch,
+        args=(current_app._get_current_object(), job_id, year, month, locale),
+        name=f"pdf-batch-{job_id}", daemon=True,
+    ).start()
+    return job_id
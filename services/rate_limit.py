@@ -0,0 +1,156 @@
+# services/rate_limit.py
+"""
+Rate limits shared by every app process on a host.
+
+State lives in a small SQLite file (RATE_LIMIT_DB, WAL mode) instead of
+process memory or Postgres. Each check is one BEGIN IMMEDIATE transaction on
+a primary-key row, so concurrent gunicorn workers see one counter and the
+main database is never touched on the request path.
+
+- take(): token bucket (copilot questions per IP).
+- record_failure() / failure_status() / clear_failures(): failure counter
+  with a lockout (login throttling).
+
+Rows carry an expiry; expired rows are deleted at most every
+RATE_LIMIT_GC_SEC by whichever process gets there first.
+"""
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+import time
+
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", "./instance/rate_limit.sqlite3")
+RATE_LIMIT_GC_SEC = float(os.getenv("RATE_LIMIT_GC_SEC", "300"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL,
+    expires REAL NOT NULL) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS buckets_expires ON buckets(expires);
+CREATE TABLE IF NOT EXISTS failures (
+    key TEXT PRIMARY KEY, fail_count INTEGER NOT NULL, window_start REAL NOT NULL,
+    locked_until REAL, expires REAL NOT NULL) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS failures_expires ON failures(expires);
+CREATE TABLE IF NOT EXISTS gc (id INTEGER PRIMARY KEY CHECK (id = 1), last REAL NOT NULL);
+"""
+
+_local = threading.local()
+
+
+def _conn() -> sqlite3.Connection:
+    # one connection per thread, reopened after a fork or a path change
+    key = (os.getpid(), RATE_LIMIT_DB)
+    c = getattr(_local, "conn", None)
+    if c is None or getattr(_local, "key", None) != key:
+        d = os.path.dirname(RATE_LIMIT_DB)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        c = sqlite3.connect(RATE_LIMIT_DB, timeout=5, isolation_level=None,
+                            check_same_thread=False)
+        c.execute("PRAGMA journal_mode=WAL")
+        c.execute("PRAGMA synchronous=NORMAL")
+        c.executescript(_SCHEMA)
+        _local.conn, _local.key = c, key
+    return c
+
+
+class _tx:
+    """BEGIN IMMEDIATE ... COMMIT: takes the write lock before reading."""
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.c = _conn()
+        self.c.execute("BEGIN IMMEDIATE")
+        return self.c
+
+    def __exit__(self, exc_type, exc, tb):
+        self.c.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def _maybe_gc(c: sqlite3.Connection, now: float) -> None:
+    row = c.execute("SELECT last FROM gc WHERE id = 1").fetchone()
+    if row and now - row[0] < RATE_LIMIT_GC_SEC:
+        return
+    c.execute("DELETE FROM buckets WHERE expires < ?", (now,))
+    c.execute("DELETE FROM failures WHERE expires < ?", (now,))
+    c.execute("INSERT INTO gc (id, last) VALUES (1, ?) "
+              "ON CONFLICT(id) DO UPDATE SET last = excluded.last", (now,))
+
+
+def take(key: str, capacity: int, per_sec: float) -> bool:
+    """
+    Spend one token from `key`'s bucket; False when it is empty. The bucket
+    holds `capacity` tokens and refills completely over `per_sec` seconds.
+    """
+    if capacity <= 0:
+        return False
+    rate = capacity / per_sec
+    now = time.time()
+    with _tx() as c:
+        _maybe_gc(c, now)
+        row = c.execute("SELECT tokens, updated FROM buckets WHERE key = ?",
+                        (key,)).fetchone()
+        tokens = capacity if row is None else min(
+            capacity, row[0] + max(0.0, now - row[1]) * rate)
+        ok = tokens >= 1.0
+        if ok:
+            tokens -= 1.0
+        c.execute(
+            "INSERT INTO buckets (key, tokens, updated, expires) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, "
+            "updated = excluded.updated, expires = excluded.expires",
+            (key, tokens, now, now + per_sec))
+        return ok
+
+
+def record_failure(key: str, window_sec: int, max_fails: int,
+                   lock_sec: int) -> tuple[int, float | None]:
+    """
+    Count one failure for `key`. The count restarts when the previous failure
+    is more than `window_sec` old; reaching `max_fails` locks the key for
+    `lock_sec` and restarts the count.
+    -> (fail count, locked_until epoch when this failure started a lock else None)
+    """
+    now = time.time()
+    with _tx() as c:
+        _maybe_gc(c, now)
+        row = c.execute("SELECT fail_count, window_start, locked_until FROM failures "
+                        "WHERE key = ?", (key,)).fetchone()
+        count, locked_until = 0, None
+        if row is not None:
+            count = row[0] if now - row[1] <= window_sec else 0
+            locked_until = row[2] if row[2] and row[2] > now else None
+        count += 1
+        started = None
+        if count >= max_fails:
+            locked_until = started = now + lock_sec
+            count = 0
+        c.execute(
+            "INSERT INTO failures (key, fail_count, window_start, locked_until, expires) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+            "fail_count = excluded.fail_count, window_start = excluded.window_start, "
+            "locked_until = excluded.locked_until, expires = excluded.expires",
+            (key, count, now, locked_until, max(now + window_sec, locked_until or 0)))
+        return (max_fails if started else count), started
+
+
+def failure_status(key: str) -> tuple[int, float | None, float | None]:
+    """-> (fail count, last failure epoch, locked_until epoch) for `key`."""
+    row = _conn().execute("SELECT fail_count, window_start, locked_until FROM failures "
+                          "WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return 0, None, None
+    return int(row[0]), row[1], row[2]
+
+
+def clear_failures(key: str) -> None:
+    with _tx() as c:
+        c.execute("DELETE FROM failures WHERE key = ?", (key,))
+
+
+def clear_all() -> None:
+    """Forget every bucket and failure counter (tests, ops)."""
+    with _tx() as c:
+        c.execute("DELETE FROM buckets")
+        c.execute("DELETE FROM failures")
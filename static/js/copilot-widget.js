@@ -47,12 +47,24 @@
       body.scrollTop = body.scrollHeight;
     }
 
-async function ask(q) {
-  addMsg(q, 'user');
-  input.value = '';
-  addMsg('Thinking…');
+function answerHtml(data) {
+    let html;
+    if (data.answer_is_html) {
+    html = data.answer_html || '';
+    } else {
+    // legacy: plain text from server
+    html = (data.answer_html || '').replace(/\n/g, '<br/>');
+    }
+    if (Array.isArray(data.sources) && data.sources.length) {
+    const srcs = data.sources
+        .map(s => `• ${s.file}${s.anchor ? '#' + s.anchor : ''} (${s.score})`)
+        .join('<br/>');
+    html += `<div class="copilot-src"><b>Sources</b><br/>${srcs}</div>`;
+    }
+    return html || 'No answer.';
+}
 
-  try {
+async function askOnce(q, msg) {
     const res = await fetch('/copilot/ask', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
@@ -69,30 +81,66 @@ async function ask(q) {
       const txt = await res.text();
       data = { answer_html: txt || 'Server error. Check logs.', sources: [] };
     }
+    msg.innerHTML = answerHtml(data);
+}
 
-    // remove "Thinking…"
-    body.lastChild?.remove();
+// Server-Sent Events over fetch (POST): "token" pieces are shown as plain
+// text after the last sanitized "html" snapshot; "done" replaces everything.
+async function askStream(q, msg) {
+    const res = await fetch('/copilot/ask/stream', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+      body: JSON.stringify({ q })
+    });
+    const ct = res.headers.get('content-type') || '';
+    if (!res.body || !ct.includes('text/event-stream')) return false;
 
-    // now build the HTML safely
-    let html;
-    if (data.answer_is_html) {
-    html = data.answer_html || '';
-    } else {
-    // legacy: plain text from server
-    html = (data.answer_html || '').replace(/\n/g, '<br/>');
-    }
-    if (Array.isArray(data.sources) && data.sources.length) {
-    const srcs = data.sources
-        .map(s => `• ${s.file}${s.anchor ? '#' + s.anchor : ''} (${s.score})`)
-        .join('<br/>');
-    html += `<div class="copilot-src"><b>Sources</b><br/>${srcs}</div>`;
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buf = '', snapshot = '', tail = '';
+    const paint = () => {
+      msg.innerHTML = snapshot;
+      if (tail) msg.appendChild(document.createTextNode(tail));
+      body.scrollTop = body.scrollHeight;
+    };
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buf += decoder.decode(value, { stream: true });
+      let cut;
+      while ((cut = buf.indexOf('\n\n')) >= 0) {
+        const frame = buf.slice(0, cut);
+        buf = buf.slice(cut + 2);
+        let event = 'message', data = '';
+        for (const line of frame.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        }
+        const d = data ? JSON.parse(data) : {};
+        if (event === 'token') { tail += d.text || ''; paint(); }
+        else if (event === 'html') { snapshot = d.answer_html || ''; tail = ''; paint(); }
+        else if (event === 'done' || event === 'error') { msg.innerHTML = answerHtml(d); }
+      }
     }
-    addMsg(html || 'No answer.', 'bot');
+    return true;
+}
+
+async function ask(q) {
+  addMsg(q, 'user');
+  input.value = '';
+  addMsg('Thinking…');
+  const msg = body.lastChild;
+
+  try {
+    const streamed = window.ReadableStream && window.TextDecoder
+      ? await askStream(q, msg) : false;
+    if (!streamed) await askOnce(q, msg);
   } catch (err) {
-    // remove "Thinking…" and show the error
-    body.lastChild?.remove();
-    addMsg('Network error: ' + (err && err.message ? err.message : err), 'bot');
+    msg.innerHTML = '';
+    msg.appendChild(document.createTextNode(
+      'Network error: ' + (err && err.message ? err.message : err)));
   }
+  body.scrollTop = body.scrollHeight;
 }
 
 
@@ -8,11 +8,26 @@ from models.users_db import create_user
 
 
 @pytest.fixture(scope="session", autouse=True)
-def _set_env():
+def _set_env(tmp_path_factory):
     os.environ.setdefault("APP_ENV", "test")
     os.environ.setdefault("METRICS_ENABLED", "0")
     os.environ.setdefault("COPILOT_ENABLED", "0")
     os.environ.setdefault("AUTO_CREATE_SCHEMA", "1")
+    # write audit rows inline so tests can read them back immediately
+    os.environ.setdefault("AUDIT_ASYNC", "0")
+    os.environ.setdefault("INVOICE_PDF_PRERENDER", "0")
+    # keep rendered PDFs out of ./instance and render them in-process
+    import services.invoice_pdf
+    import services.pdf_render
+    services.invoice_pdf.INVOICE_PDF_CACHE_DIR = str(
+        tmp_path_factory.mktemp("pdf_cache"))
+    services.pdf_render.PDF_BATCH_DIR = str(tmp_path_factory.mktemp("pdf_batches"))
+    services.pdf_render.PDF_RENDER_WORKERS = 0
+    import services.forecast
+    services.forecast.FORECAST_WORKERS = 0
+    import services.rate_limit
+    services.rate_limit.RATE_LIMIT_DB = str(
+        tmp_path_factory.mktemp("rate_limit") / "rate_limit.sqlite3")
     yield
 
 
@@ -64,6 +79,11 @@ def _db_clean(db_engine):
               END LOOP;
             END$$;
         """))
+    # the truncate bypasses the stores, so drop their process caches too
+    from models.cache_versions import clear_caches
+    clear_caches()
+    from services.rate_limit import clear_all
+    clear_all()
     yield
 
 
@@ -175,6 +175,41 @@ def test_create_and_bulk_revert_month_invoices(client, admin_user, monkeypatch):
     assert called.get("seen")
 
 
+# ------------------------------ admin_etax_period_zip (GET) ------------------------------
+
+@pytest.mark.db
+def test_admin_etax_period_zip_manifest_and_signature(client, admin_user, monkeypatch):
+    import hmac
+    from hashlib import sha256
+    from models.audit_store import APP_SECRET
+
+    payloads = [
+        {"document": {"number": f"INV-{i}"}, "meta": {"receipt_id": i}, "lines": []}
+        for i in (1, 2)
+    ]
+    monkeypatch.setattr("models.billing_store.etax_payloads_for_month",
+                        lambda y, m: iter(payloads))
+
+    r = client.get("/admin/etax/2025-03.zip")
+    assert r.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(r.data)) as z:
+        names = set(z.namelist())
+        assert {"INV-1.json", "INV-2.json", "manifest.json", "signature.txt"} <= names
+        mjson = z.read("manifest.json")
+        manifest = json.loads(mjson)
+        assert manifest["period"] == "2025-03" and manifest["count"] == 2
+        for f in manifest["files"]:
+            assert sha256(z.read(f["name"])).hexdigest() == f["sha256"]
+        sig = dict(line.split("=", 1)
+                   for line in z.read("signature.txt").decode().splitlines())
+    mhash = sha256(mjson).hexdigest()
+    assert sig["sha256"] == mhash
+    assert sig["signature"] == hmac.new(
+        APP_SECRET, mhash.encode(), digestmod="sha256").hexdigest()
+
+    assert client.get("/admin/etax/2025-13.zip").status_code == 400
+
+
 # -------------------------------- admin_receipt_etax_zip (GET) --------------------------------
 
 @pytest.mark.db
@@ -194,9 +229,9 @@ def test_admin_receipt_etax_zip(client, admin_user, monkeypatch):
     # Make WeasyPrint HTML.write_pdf cheap
     class FakeHTML:
         def __init__(self, *a, **k): pass
-        def write_pdf(self): return b"%PDF-1.4 fake"
+        def write_pdf(self, **kw): return b"%PDF-1.4 fake"
 
-    monkeypatch.setattr("controllers.admin.HTML", FakeHTML)
+    monkeypatch.setattr("services.pdf_render.HTML", FakeHTML)
 
     # Patch payload builder (keep get_receipt_with_items real)
     from types import SimpleNamespace
@@ -231,9 +266,12 @@ def test_ui_close_period_happy_path(client, admin_user, monkeypatch):
 # ---------------------------- export_gl_formal_zip (POST) ----------------------------
 
 @pytest.mark.db
-def test_export_gl_formal_zip_returns_zip(client, admin_user, monkeypatch):
+def test_export_gl_formal_zip_returns_zip(client, admin_user, monkeypatch, tmp_path):
+    art = tmp_path / "gl_export_run_1.zip"
+    art.write_bytes(b"PK\x03\x04...fakezip...")
+
     def fake_run(start, end, actor, kind):
-        return ("posted_gl_foo.zip", b"PK\x03\x04...fakezip...")
+        return ("posted_gl_foo.zip", art)
     monkeypatch.setattr("controllers.admin.run_formal_gl_export", fake_run)
 
     r = client.post("/admin/export/gl/formal.zip",
@@ -315,6 +353,43 @@ def test_list_and_redownload_export_run(client, admin_user):
     assert any("manifest_run_" in n for n in z.namelist())
 
 
+@pytest.mark.db
+def test_formal_export_artifact_is_served_on_redownload(client, admin_user, monkeypatch, tmp_path):
+    from services.accounting_export import run_formal_gl_export
+    monkeypatch.setattr("services.accounting_export.GL_EXPORT_DIR", str(tmp_path))
+    monkeypatch.setattr("services.accounting_export.GL_EXPORT_YIELD_PER", 3)
+
+    with session_scope() as s:
+        for ref in ("X1", "X2"):
+            b = JournalBatch(kind="issue", period_year=2025, period_month=1,
+                             source="test", source_ref=ref,
+                             posted_at=_dt(2025, 1, 15), posted_by="tester")
+            s.add(b)
+            s.flush()
+            for i in range(1, 5):
+                s.add(GLEntry(batch_id=b.id, seq_in_batch=i, date=_dt(2025, 1, 15),
+                              ref=ref, memo="memo", account_id="1100",
+                              account_name="Accounts Receivable", account_type="ASSET",
+                              debit=10.0 if i % 2 else 0.0, credit=0.0 if i % 2 else 10.0))
+
+    fname, path = run_formal_gl_export("2025-01-01", "2025-01-31", "admin")
+    with zipfile.ZipFile(path) as z:
+        rows = list(csv.reader(io.StringIO(
+            z.read(z.namelist()[0]).decode("utf-8"))))
+        manifest = json.loads(z.read(next(n for n in z.namelist() if "manifest" in n)))
+    assert len(rows) == 1 + 8 and manifest["line_count"] == 8
+
+    with session_scope() as s:
+        run = s.query(ExportRun).one()
+        seqs = sorted((b.export_seq, b.export_run_id)
+                      for b in s.query(JournalBatch).all())
+    assert seqs == [(1, run.id), (2, run.id)]
+
+    r = client.get(f"/admin/export/runs/{run.id}.zip")
+    assert r.status_code == 200
+    assert r.data == path.read_bytes()
+
+
 # ------------------------------- export_ledger_pdf (GET) --------------------------------
 
 @pytest.mark.db
@@ -322,9 +397,9 @@ def test_export_ledger_pdf_preview_mode(client, admin_user, monkeypatch):
     # Use preview (derived) and stub HTML->PDF to avoid heavy deps
     class FakeHTML:
         def __init__(self, *a, **k): pass
-        def write_pdf(self): return b"%PDF-1.4 fake"
+        def write_pdf(self, **kw): return b"%PDF-1.4 fake"
 
-    monkeypatch.setattr("controllers.admin.HTML", FakeHTML)
+    monkeypatch.setattr("services.pdf_render.HTML", FakeHTML)
 
     # Make derived journal return a tiny DataFrame (correct columns)
     df = pd.DataFrame([
@@ -344,6 +419,50 @@ def test_export_ledger_pdf_preview_mode(client, admin_user, monkeypatch):
     assert "application/pdf" in r.headers.get("Content-Type", "").lower()
 
 
+@pytest.mark.db
+def test_export_ledger_pdf_renders_long_ledgers_in_parts(client, admin_user, monkeypatch):
+    """A ledger longer than PDF_PAGES_PER_PART is rendered in parts and stitched."""
+    pypdf = pytest.importorskip("pypdf")
+    rendered = []
+
+    class FakeHTML:
+        def __init__(self, string=None, **k):
+            self.html = string
+
+        def write_pdf(self, **kw):
+            rendered.append(self.html)
+            w = pypdf.PdfWriter()
+            w.add_blank_page(width=842, height=595)
+            buf = io.BytesIO()
+            w.write(buf)
+            return buf.getvalue()
+
+    monkeypatch.setattr("services.pdf_render.HTML", FakeHTML)
+    monkeypatch.setattr("services.pdf_render.PDF_PAGES_PER_PART", 1)
+
+    # 3 logical pages of 34 rows
+    df = pd.DataFrame([
+        {"date": "2025-01-15", "ref": f"R{i}", "memo": "test",
+         "account_id": "1100", "account_name": "Accounts Receivable",
+         "account_type": "ASSET", "debit": 1.0, "credit": 0.0}
+        for i in range(80)
+    ])
+    monkeypatch.setattr("controllers.admin.derive_journal",
+                        lambda s, e: df.copy())
+
+    r = client.get(
+        "/admin/export/ledger.pdf?mode=derived&start=2025-01-01&end=2025-01-31")
+    assert r.status_code == 200
+    # one render per part plus the page-number overlay
+    assert len(rendered) == 4
+    parts, overlay = rendered[:3], rendered[3]
+    assert sum("Summary &amp; Controls" in h or "Summary & Controls" in h
+               for h in parts) == 1
+    assert "Summary" in parts[-1] and "counter(pages)" not in parts[0]
+    assert "counter(pages)" in overlay
+    assert len(pypdf.PdfReader(io.BytesIO(r.data)).pages) == 3
+
+
 # ----------------------------- admin_form (myusage) -----------------------------
 
 @pytest.mark.db
@@ -605,8 +724,9 @@ def test_admin_form_tiers_section_merges_db_jobs_overrides(client, admin_user, m
         lambda start, end: (df_jobs.copy(), "test_source", [])
     )
 
-    # If classify_user_type gets called for non-overridden users, make it deterministic
-    monkeypatch.setattr("controllers.admin.classify_user_type", lambda u: "mu")
+    # Non-overridden users go through the vectorized classifier; make it deterministic
+    monkeypatch.setattr("services.billing.classify_user_types",
+                        lambda users: ["mu"] * len(users))
 
     # Also, admin_form() queries the DB directly for User.username; our created user covers that.
 
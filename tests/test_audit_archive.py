@@ -0,0 +1,158 @@
+# tests/test_audit_archive.py
+import gzip
+import json
+import pytest
+from datetime import date
+from sqlalchemy import select, text
+from models import audit_store
+from models.audit_store import audit, verify_chain
+from models.audit_archive import (
+    ensure_audit_partitions, archive_audit_month, verify_audit_segment, verify_archive,
+)
+from models.schema import AuditLog
+from models.base import session_scope
+
+
+def _write(month: str, n: int):
+    """Chain n events stamped inside `month` (YYYY-MM)."""
+    payloads = []
+    for i in range(n):
+        p = audit_store._build_payload(
+            f"test.archive.{month}.{i}", target_type="unit", target_id=str(i),
+            outcome="success", status=200, error_code=None, extra=None,
+            actor="tester")
+        p["ts"] = f"{month}-{10 + i:02d}T12:00:00Z"
+        payloads.append(p)
+    audit_store._write_batch(payloads)
+
+
+def _seg_last_hash(path: str) -> str:
+    with open(path + ".manifest.json") as f:
+        return json.load(f)["last_hash"]
+
+
+def _hot_actions() -> list[str]:
+    with session_scope() as s:
+        return s.execute(select(AuditLog.action).order_by(AuditLog.id)).scalars().all()
+
+
+@pytest.mark.db
+def test_archive_drops_partition_and_chain_stays_verifiable(tmp_path):
+    ensure_audit_partitions(since=date(2025, 1, 1))
+    _write("2025-01", 3)
+    _write("2025-02", 2)
+    audit("test.archive.now", actor="tester")
+
+    with session_scope() as s:
+        in_jan = s.execute(text("SELECT count(*) FROM audit_log_p202501")).scalar()
+    assert in_jan == 3
+
+    res = archive_audit_month(2025, 1, out_dir=str(tmp_path))
+    assert res["ok"] and res["archived"] == 3
+    assert "audit_log_p202501" in res["dropped_partitions"]
+    assert res["retained"] == 0
+    assert len(_hot_actions()) == 3
+
+    seg = verify_audit_segment(res["file"], prev_hash="")
+    assert seg["ok"] and seg["checked"] == 3
+
+    v = verify_chain(full=True)
+    assert v["ok"] is True
+    assert v["checked"] == 3
+    assert v["verified_total"] == 6
+    assert v["archived_through"] is not None
+
+    res2 = archive_audit_month(2025, 2, out_dir=str(tmp_path))
+    assert res2["ok"] and res2["archived"] == 2
+    assert _hot_actions() == ["test.archive.now"]
+    assert verify_archive(out_dir=str(tmp_path)) == {
+        "ok": True, "segments": 2, "reason": None}
+    assert verify_chain(full=True)["ok"] is True
+
+
+@pytest.mark.db
+def test_chain_continues_from_segment_when_hot_tier_is_empty(tmp_path):
+    _write("2024-06", 2)  # no monthly partition -> default partition
+    res = archive_audit_month(2024, 6, out_dir=str(tmp_path))
+    assert res["ok"] and res["purged"] == 2
+    assert _hot_actions() == []
+
+    audit("test.after.archive", actor="tester")
+    with session_scope() as s:
+        row = s.execute(select(AuditLog)).scalars().one()
+    assert row.prev_hash == _seg_last_hash(res["file"])
+    assert verify_chain(full=True)["ok"] is True
+
+
+@pytest.mark.db
+def test_tampered_segment_is_detected(tmp_path):
+    _write("2024-07", 3)
+    res = archive_audit_month(2024, 7, out_dir=str(tmp_path))
+    path = res["file"]
+
+    with gzip.open(path, "rt") as f:
+        lines = f.read().splitlines()
+    row = json.loads(lines[1])
+    row["actor"] = "mallory"
+    lines[1] = json.dumps(row)
+    with gzip.open(path, "wt") as f:
+        f.write("\n".join(lines) + "\n")
+    assert verify_audit_segment(path)["reason"] == "file_digest_mismatch"
+
+    # re-signing the digest without the key is not enough
+    mpath = path + ".manifest.json"
+    with open(mpath) as f:
+        manifest = json.load(f)
+    from models.audit_archive import _file_sha256
+    manifest["sha256"] = _file_sha256(path)
+    with open(mpath, "w") as f:
+        json.dump(manifest, f)
+    assert verify_audit_segment(path)["reason"] == "manifest_signature_mismatch"
+    assert verify_archive(out_dir=str(tmp_path))["ok"] is False
+
+
+@pytest.mark.db
+def test_open_month_cannot_be_archived(tmp_path):
+    today = date.today()
+    with pytest.raises(ValueError):
+        archive_audit_month(today.year, today.month, out_dir=str(tmp_path))
+
+
+@pytest.mark.db
+def test_late_events_keep_their_ts_and_archive_with_their_run(tmp_path):
+    ensure_audit_partitions(since=date(2024, 8, 1), months_ahead=0)
+    _write("2024-09", 1)
+    _write("2024-08", 1)  # late, skewed clock: chained after September
+    with session_scope() as s:
+        ts = s.execute(select(AuditLog.ts).order_by(AuditLog.id)).scalars().all()
+        in_aug = s.execute(text("SELECT count(*) FROM audit_log_p202408")).scalar()
+    assert [t.month for t in ts] == [9, 8]
+    assert in_aug == 1
+    assert verify_chain()["ok"] is True
+
+    # August's run ends at the late row, so it carries the September row too
+    res = archive_audit_month(2024, 8, out_dir=str(tmp_path))
+    assert res["ok"] and res["archived"] == 2
+    assert "audit_log_p202408" in res["dropped_partitions"]
+    assert "audit_log_p202409" not in res["dropped_partitions"]
+    assert res["purged"] == 1 and _hot_actions() == []
+
+    # an even later August event goes to the default partition and
+    # rides along with the next segment
+    _write("2024-08", 1)
+    res2 = archive_audit_month(2024, 9, out_dir=str(tmp_path))
+    assert res2["ok"] and res2["archived"] == 1
+    assert verify_archive(out_dir=str(tmp_path))["ok"] is True
+    assert verify_chain(full=True)["ok"] is True
+
+
+@pytest.mark.db
+def test_ensure_partitions_moves_rows_out_of_the_default_partition():
+    _write("2023-03", 2)  # no partition yet -> default
+    assert "audit_log_p202303" in ensure_audit_partitions(since=date(2023, 3, 1),
+                                                          months_ahead=0)
+    with session_scope() as s:
+        moved = s.execute(text("SELECT count(*) FROM audit_log_p202303")).scalar()
+        left = s.execute(text("SELECT count(*) FROM audit_log_default")).scalar()
+    assert (moved, left) == (2, 0)
+    assert verify_chain(full=True)["ok"] is True
@@ -0,0 +1,134 @@
+# tests/test_audit_checkpoint.py
+import pytest
+from sqlalchemy import select, update, func
+from models.audit_store import audit, verify_chain
+from models.schema import AuditLog, AuditCheckpoint
+from models.base import session_scope
+
+
+def _events(n: int, prefix: str = "test.cp"):
+    for i in range(n):
+        audit(f"{prefix}.{i}", target_type="unit", target_id=str(i),
+              outcome="success", status=200, actor="tester")
+
+
+def _row_ids() -> list[int]:
+    with session_scope() as s:
+        return s.execute(select(AuditLog.id).order_by(AuditLog.id)).scalars().all()
+
+
+@pytest.mark.db
+def test_verify_resumes_from_checkpoint():
+    _events(5)
+    first = verify_chain()
+    assert first["ok"] and first["checked"] == 5
+    assert first["from_checkpoint"] is None
+
+    # unchanged log: nothing re-read
+    again = verify_chain()
+    assert again["ok"] and again["checked"] == 0
+    assert again["verified_total"] == 5
+    assert again["last_ok_id"] == first["last_ok_id"]
+
+    _events(3, "test.cp.more")
+    inc = verify_chain()
+    assert inc["ok"] and inc["checked"] == 3
+    assert inc["from_checkpoint"] == first["last_ok_id"]
+    assert inc["verified_total"] == 8
+
+    with session_scope() as s:
+        assert s.execute(select(func.count(AuditCheckpoint.id))).scalar_one() == 2
+
+
+@pytest.mark.db
+def test_limit_checkpoints_prefix_and_tamper_after_checkpoint():
+    _events(6)
+    part = verify_chain(limit=4)
+    assert part["ok"] and part["checked"] == 4
+
+    ids = _row_ids()
+    with session_scope() as s:
+        s.execute(update(AuditLog).where(AuditLog.id == ids[5])
+                  .values(actor="mallory"))
+
+    res = verify_chain()
+    assert res["ok"] is False
+    assert res["checked"] == 1
+    assert res["first_bad_id"] == ids[5]
+    assert res["last_ok_id"] == ids[4]
+    assert res["reason"] == "hash_mismatch"
+
+
+@pytest.mark.db
+def test_forged_checkpoint_is_ignored():
+    _events(4)
+    verify_chain()
+    ids = _row_ids()
+
+    # tamper behind the checkpoint, then try to move the checkpoint forward
+    with session_scope() as s:
+        s.execute(update(AuditLog).where(AuditLog.id == ids[1])
+                  .values(action="test.forged"))
+        s.execute(update(AuditCheckpoint).values(verified_count=999))
+
+    res = verify_chain()
+    assert res["ok"] is False
+    assert res["from_checkpoint"] is None
+    assert res["first_bad_id"] == ids[1]
+
+    # full=True always starts from genesis
+    assert verify_chain(full=True)["first_bad_id"] == ids[1]
+
+
+@pytest.mark.db
+def test_parallel_full_verification_matches_serial():
+    _events(30)
+    res = verify_chain(full=True, workers=2)
+    assert res["ok"] is True
+    assert res["checked"] == 30
+    assert res["last_ok_id"] == _row_ids()[-1]
+
+    ids = _row_ids()
+    with session_scope() as s:
+        s.execute(update(AuditLog).where(AuditLog.id == ids[17])
+                  .values(signature="0" * 64))
+    bad = verify_chain(full=True, workers=3)
+    assert bad["ok"] is False
+    assert bad["first_bad_id"] == ids[17]
+    assert bad["reason"] == "signature_mismatch"
+    assert bad["checked"] == 17
+
+
+@pytest.mark.db
+def test_checkpoints_are_not_duplicated_and_are_pruned(monkeypatch):
+    from models import audit_store
+    monkeypatch.setattr(audit_store, "AUDIT_CHECKPOINT_KEEP", 2)
+
+    def _checkpoints() -> list[int]:
+        with session_scope() as s:
+            return s.execute(select(AuditCheckpoint.last_id)
+                             .order_by(AuditCheckpoint.last_id)).scalars().all()
+
+    _events(2)
+    verify_chain()
+    verify_chain(full=True)
+    assert len(_checkpoints()) == 1
+
+    for i in range(3):
+        _events(1, f"test.cp.prune{i}")
+        verify_chain()
+    assert _checkpoints() == _row_ids()[-2:]
+
+
+@pytest.mark.db
+def test_workers_are_ignored_inside_a_request(app, monkeypatch):
+    from models import audit_store
+
+    def _no_pool(*_a):
+        raise AssertionError("process pool started from a request")
+
+    monkeypatch.setattr(audit_store, "_verify_parallel", _no_pool)
+    _events(3)
+    with app.test_request_context("/admin/audit.verify.json"):
+        res = verify_chain(full=True, workers=8)
+    assert res["ok"] and res["checked"] == 3
@@ -0,0 +1,160 @@
+# tests/test_audit_writer.py
+import json
+import pytest
+from sqlalchemy import select, func
+from models import audit_store
+from models.audit_store import (
+    audit, flush_audit, stop_audit_writer, recover_audit_spool, verify_chain,
+)
+from models.schema import AuditLog
+from models.base import session_scope
+
+
+def _count() -> int:
+    with session_scope() as s:
+        return s.execute(select(func.count(AuditLog.id))).scalar_one()
+
+
+@pytest.mark.db
+def test_buffered_audit_spools_then_writes_one_chained_batch(monkeypatch, tmp_path):
+    monkeypatch.setenv("AUDIT_ASYNC", "1")
+    monkeypatch.setattr(audit_store, "AUDIT_SPOOL_DIR", str(tmp_path))
+    # keep the background thread idle so the test controls the flush
+    monkeypatch.setattr(audit_store, "AUDIT_FLUSH_INTERVAL_SEC", 60.0)
+    try:
+        audit("test.buffered.first", actor="tester")
+        for i in range(5):
+            audit(f"test.buffered.{i}", target_type="unit",
+                  target_id=str(i), outcome="success", actor="tester")
+
+        assert _count() == 0
+        spooled = list(tmp_path.glob("audit-*.jsonl"))
+        assert len(spooled) == 1
+        assert len(spooled[0].read_text().splitlines()) == 6
+
+        flush_audit()
+        assert _count() == 6
+        # committed batch no longer needs its spool segment
+        assert not list(tmp_path.glob("audit-*.jsonl"))
+        assert not list(tmp_path.glob("audit-*.inflight"))
+    finally:
+        stop_audit_writer()
+
+    res = verify_chain()
+    assert res["ok"] is True
+    assert res["checked"] == 6
+
+
+@pytest.mark.db
+def test_batches_extend_existing_chain(monkeypatch, tmp_path):
+    audit("test.inline", actor="tester")  # AUDIT_ASYNC=0 in tests
+
+    monkeypatch.setenv("AUDIT_ASYNC", "1")
+    monkeypatch.setattr(audit_store, "AUDIT_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(audit_store, "AUDIT_FLUSH_INTERVAL_SEC", 60.0)
+    try:
+        audit("test.buffered.a", actor="tester")
+        audit("test.buffered.b", actor="tester")
+    finally:
+        stop_audit_writer()  # flushes
+
+    with session_scope() as s:
+        rows = s.execute(select(AuditLog).order_by(
+            AuditLog.id)).scalars().all()
+    assert [r.action for r in rows] == [
+        "test.inline", "test.buffered.a", "test.buffered.b"]
+    assert rows[1].prev_hash == rows[0].hash
+    assert rows[2].prev_hash == rows[1].hash
+    assert verify_chain()["ok"] is True
+
+
+@pytest.mark.db
+def test_recover_spool_of_dead_process(monkeypatch, tmp_path):
+    monkeypatch.setattr(audit_store, "AUDIT_SPOOL_DIR", str(tmp_path))
+    payloads = [
+        audit_store._build_payload(
+            f"test.spooled.{i}", target_type="unit", target_id=str(i),
+            outcome="success", status=200, error_code=None, extra=None,
+            actor="tester")
+        for i in range(3)
+    ]
+    lines = [json.dumps(p) for p in payloads]
+    # no lock file => owner is gone; older inflight segment + live spool with a torn tail
+    (tmp_path / "audit-999999-deadbeef-1.inflight").write_text(
+        "\n".join(lines[:2]) + "\n")
+    (tmp_path / "audit-999999-deadbeef.jsonl").write_text(
+        lines[2] + "\n" + '{"ts": "2025-')
+
+    assert recover_audit_spool() == 3
+    assert not list(tmp_path.iterdir())
+
+    with session_scope() as s:
+        actions = s.execute(select(AuditLog.action).order_by(
+            AuditLog.id)).scalars().all()
+    assert actions == ["test.spooled.0", "test.spooled.1", "test.spooled.2"]
+    assert verify_chain()["ok"] is True
+
+
+def _spool_lines(n: int, prefix: str) -> list[str]:
+    return [json.dumps(audit_store._build_payload(
+        f"{prefix}.{i}", target_type="unit", target_id=str(i), outcome="success",
+        status=200, error_code=None, extra=None, actor="tester")) for i in range(n)]
+
+
+@pytest.mark.db
+def test_recovery_claims_the_spool_and_resumes_from_offset(monkeypatch, tmp_path):
+    fcntl = pytest.importorskip("fcntl")
+    monkeypatch.setattr(audit_store, "AUDIT_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(audit_store, "AUDIT_BATCH_SIZE", 2)
+    lines = _spool_lines(5, "test.claimed")
+    spool = tmp_path / "audit-999998-cafebabe-1.inflight"
+    spool.write_text("\n".join(lines) + "\n")
+    # a previous replayer committed the first event, then crashed
+    (tmp_path / "audit-999998-cafebabe-1.inflight.offset").write_text(
+        str(len(lines[0]) + 1))
+
+    # another process is replaying it right now
+    with open(tmp_path / "audit-999998-cafebabe.lock", "a+") as other:
+        fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert recover_audit_spool() == 0
+        assert spool.exists()
+
+    assert recover_audit_spool() == 4
+    assert not list(tmp_path.iterdir())
+    with session_scope() as s:
+        actions = s.execute(select(AuditLog.action).order_by(
+            AuditLog.id)).scalars().all()
+    assert actions == [f"test.claimed.{i}" for i in range(1, 5)]
+
+
+@pytest.mark.db
+def test_pending_buffer_is_capped_while_db_is_down(monkeypatch, tmp_path):
+    monkeypatch.setenv("AUDIT_ASYNC", "1")
+    monkeypatch.setattr(audit_store, "AUDIT_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setattr(audit_store, "AUDIT_FLUSH_INTERVAL_SEC", 60.0)
+    monkeypatch.setattr(audit_store, "AUDIT_PENDING_MAX", 3)
+    write_batch = audit_store._write_batch
+
+    def _down(payloads):
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(audit_store, "_write_batch", _down)
+    try:
+        for i in range(6):
+            audit(f"test.capped.{i}", actor="tester")
+        assert len(audit_store._PENDING) <= 3
+        with pytest.raises(RuntimeError):
+            flush_audit()
+
+        monkeypatch.setattr(audit_store, "_write_batch", write_batch)
+        flush_audit()
+        assert _count() == 6
+        assert not list(tmp_path.glob("audit-*.inflight*"))
+    finally:
+        stop_audit_writer()
+
+    with session_scope() as s:
+        actions = s.execute(select(AuditLog.action).order_by(
+            AuditLog.id)).scalars().all()
+    assert actions == [f"test.capped.{i}" for i in range(6)]
+    assert verify_chain()["ok"] is True
@@ -1,5 +1,6 @@
 import pandas as pd
 from models.billing_store import create_receipt_from_rows, list_receipts, get_receipt_with_items, mark_receipt_paid
+from models.billing_store import get_receipt_summary, iter_receipt_items
 import pytest
 
 
@@ -42,3 +43,25 @@ def test_mark_paid_is_idempotent(monkeypatch):
     assert hdr["tx_ref"].startswith("payment:")
     assert hdr["method"] == "internal_admin"
     assert hdr["paid_at"] is not None
+
+
+@pytest.mark.db
+def test_receipt_summary_and_paged_items_match_full_load():
+    rows = [
+        {"JobID": f"9{i:03d}", "Cost (฿)": 1 + i % 3, "CPU_Core_Hours": 0.5 * i,
+         "GPU_Hours": 0.1, "Mem_GB_Hours_Used": 2.0, "tier": "mu", "User": "alice"}
+        for i in range(25)
+    ]
+    rid, total, _ = create_receipt_from_rows(
+        "alice", "2025-01-01", "2025-01-31", rows)
+
+    hdr, lines = get_receipt_with_items(rid)
+    summary, totals = get_receipt_summary(rid)
+    assert summary == hdr
+    assert totals["lines"] == 25
+    assert totals["cost"] == pytest.approx(total)
+    for k in ("cpu_core_hours", "gpu_hours", "mem_gb_hours"):
+        assert totals[k] == pytest.approx(sum(i[k] for i in lines))
+
+    assert list(iter_receipt_items(rid, page_size=4)) == lines
+    assert get_receipt_summary(rid + 999) == ({}, {})
@@ -154,9 +154,11 @@ def test_build_etax_payload_shapes_and_totals(monkeypatch):
         "created_at": _dt(2025, 2, 1), "total": 11.0,
     }
 
-    # build_etax_payload expects (rec, items)
-    monkeypatch.setattr(bs, "get_receipt_with_items",
-                        lambda receipt_id: (rec_min, items), raising=True)
+    # build_etax_payload reads (rec, SQL-summed totals)
+    totals = {k: sum(i[k] for i in items)
+              for k in ("cpu_core_hours", "gpu_hours", "mem_gb_hours")}
+    monkeypatch.setattr(bs, "get_receipt_summary",
+                        lambda receipt_id: (rec_min, totals), raising=True)
     if hasattr(bs, "_seller_info"):
         monkeypatch.setattr(bs, "_seller_info",
                             lambda rec: {"name": "HPC Lab", "tax_id": "TAX123"})
@@ -348,3 +350,38 @@ def test_list_audit_orders_desc_and_builds_target_field_and_limit():
     # Limit=1 returns only the newest
     rows_lim1 = list_audit(limit=1)
     assert len(rows_lim1) == 1 and rows_lim1[0]["id"] == a2.id
+
+
+@pytest.mark.db
+def test_etax_payloads_for_month_match_single_receipt_builder():
+    from models.schema import ReceiptItem
+
+    with session_scope() as s:
+        ids = []
+        for i, (status, start) in enumerate([
+            ("pending", _dt(2025, 3, 1)),
+            ("paid", _dt(2025, 3, 10)),
+            ("void", _dt(2025, 3, 12)),      # excluded
+            ("pending", _dt(2025, 4, 2)),    # other month
+        ]):
+            r = Receipt(
+                username=f"u{i}", pricing_tier="mu",
+                rate_cpu=0.10, rate_gpu=2.00, rate_mem=0.01,
+                rates_locked_at=start, start=start, end=start + timedelta(days=5),
+                created_at=start, total=5.0, status=status,
+                invoice_no=f"INV-{i}",
+            )
+            s.add(r)
+            s.flush()
+            ids.append(r.id)
+            for j in range(3):
+                s.add(ReceiptItem(
+                    receipt_id=r.id, job_key=f"{i}-{j}", job_id_display=f"{i}-{j}",
+                    cost=D("1.00"), cpu_core_hours=1.5 * (j + 1),
+                    gpu_hours=0.25, mem_gb_hours=10.0))
+
+    payloads = list(bs.etax_payloads_for_month(2025, 3))
+    assert [p["meta"]["receipt_id"] for p in payloads] == ids[:2]
+    for p in payloads:
+        assert p == bs.build_etax_payload(p["meta"]["receipt_id"])
+    assert payloads[0]["lines"][0]["quantity"] == pytest.approx(9.0)
@@ -31,3 +31,30 @@ def test_extract_mem_cpu_gpu():
     # gpu
     assert B.extract_gpu_count("gres/gpu=2,cpu=4") == 2
     assert B.extract_gpu_count("cpu=8") == 0
+
+
+def test_classify_user_types_matches_scalar_rules():
+    users = ["sysadmin", "Test01", "john.doe", "a@ku.ac.th", "x.nstda", "gov-lab",
+             "acme.co.th", "bob", "", None, float("nan"), 42, "  Jane.Roe  "]
+    assert list(B.classify_user_types(users)) == [
+        B.classify_user_type(u) for u in users]
+    assert B.classify_user_type("jane.roe") == "mu"
+    assert B.classify_user_type("dip-team") == "gov"
+    assert B.classify_user_type("acme-corp.com") == "private"
+
+
+def test_effective_tiers_classifies_each_user_once(monkeypatch):
+    seen = []
+    real = B.classify_user_types
+
+    def spy(users):
+        seen.append(len(users))
+        return real(users)
+    monkeypatch.setattr(B, "classify_user_types", spy)
+
+    users = ["alice", "Bob ", "john.doe", "alice", None] * 1000
+    tiers = B.effective_tiers(users, {"bob": "gov"})
+    assert seen == [4]
+    assert list(tiers[:5]) == ["private", "gov", "mu", "private", "private"]
+    assert len(tiers) == len(users)
+    assert list(B.effective_tiers([], {})) == []
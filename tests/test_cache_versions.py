@@ -0,0 +1,72 @@
+# tests/test_cache_versions.py
+from decimal import Decimal
+
+import pytest
+
+from models import cache_versions, rates_store, tiers_store
+from models.base import session_scope
+from models.schema import Rate, UserTierOverride
+
+
+@pytest.fixture
+def count_reads(monkeypatch):
+    calls = {"rates": 0, "tier_overrides": 0}
+
+    def wrap(cache):
+        inner = cache._loader
+
+        def loader():
+            calls[cache.name] += 1
+            return inner()
+        monkeypatch.setattr(cache, "_loader", loader)
+
+    wrap(rates_store._cache)
+    wrap(tiers_store._cache)
+    return calls
+
+
+@pytest.mark.db
+def test_reads_are_served_from_cache_until_a_write(monkeypatch, count_reads):
+    monkeypatch.setattr(cache_versions, "CACHE_VERSION_CHECK_SEC", 3600)
+    for _ in range(5):
+        rates_store.get_rate_for_tier("gov")
+        tiers_store.load_overrides_dict()
+    assert count_reads == {"rates": 1, "tier_overrides": 1}
+
+    r = rates_store.load_rates()
+    r["gov"]["cpu"] = 9.5
+    rates_store.save_rates(r)
+    tiers_store.upsert_override("Alice", "gov")
+    assert rates_store.get_rate_for_tier("gov")["cpu"] == 9.5
+    assert tiers_store.load_overrides_dict() == {"alice": "gov"}
+    assert count_reads == {"rates": 2, "tier_overrides": 2}
+
+
+@pytest.mark.db
+def test_returned_values_are_copies(monkeypatch):
+    monkeypatch.setattr(cache_versions, "CACHE_VERSION_CHECK_SEC", 3600)
+    rates_store.load_rates()["mu"]["cpu"] = -1
+    tiers_store.load_overrides_dict()["x"] = "gov"
+    assert rates_store.load_rates()["mu"]["cpu"] != -1
+    assert "x" not in tiers_store.load_overrides_dict()
+
+
+@pytest.mark.db
+def test_write_from_another_worker_is_seen_via_version_row(monkeypatch, count_reads):
+    monkeypatch.setattr(cache_versions, "CACHE_VERSION_CHECK_SEC", 0)
+    rates_store.load_rates()
+    tiers_store.load_overrides_dict()
+
+    # what another process's save_rates/bulk_save would commit
+    with session_scope() as s:
+        s.merge(Rate(tier="private", cpu=Decimal("7.25"), gpu=Decimal("100"),
+                     mem=Decimal("2"), updated_at=rates_store._now_utc()))
+        s.add(UserTierOverride(username="bob", tier="private",
+                               updated_at=rates_store._now_utc()))
+        cache_versions.bump_version(s, "rates")
+        cache_versions.bump_version(s, "tier_overrides")
+
+    assert rates_store.load_rates()["private"]["cpu"] == 7.25
+    assert tiers_store.load_overrides_dict() == {"bob": "private"}
+    assert count_reads == {"rates": 2, "tier_overrides": 2}
+    assert cache_versions.current_version("tier_overrides") == 1
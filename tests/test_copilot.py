@@ -0,0 +1,354 @@
+# tests/test_copilot.py
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+from services import copilot
+
+
+class _StubOllama(BaseHTTPRequestHandler):
+    """Minimal Ollama: /api/embed (batch), /api/embeddings (single), /api/chat."""
+    calls: list = []
+    batch_endpoint = True
+    answer = ["From ", "the **docs**.\n\n", "- one\n", "- <script>x</script>two"]
+
+    def log_message(self, *a):
+        pass
+
+    def _json(self, code, body):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    @staticmethod
+    def _vec(text):
+        h = hashlib.sha256(text.encode()).digest()
+        return [b / 255.0 + 0.01 for b in h[:16]]
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).calls.append((self.path, body))
+        if self.path == "/api/embed" and self.batch_endpoint:
+            return self._json(200, {"embeddings": [self._vec(t) for t in body["input"]]})
+        if self.path == "/api/embeddings":
+            return self._json(200, {"embedding": self._vec(body["prompt"])})
+        if self.path == "/api/chat" and body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            for piece in self.answer:
+                self.wfile.write(json.dumps(
+                    {"message": {"content": piece}, "done": False}).encode() + b"\n")
+                self.wfile.flush()
+            self.wfile.write(b'{"message": {"content": ""}, "done": true}\n')
+            return
+        if self.path == "/api/chat":
+            return self._json(200, {"message": {"content": "".join(self.answer)}})
+        return self._json(404, {"error": "not found"})
+
+
+@pytest.fixture
+def ollama(monkeypatch, tmp_path):
+    _StubOllama.calls = []
+    _StubOllama.batch_endpoint = True
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _StubOllama)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    idx = tmp_path / "index"
+    idx.mkdir()
+    monkeypatch.setattr(copilot, "OLLAMA", f"http://127.0.0.1:{srv.server_port}")
+    monkeypatch.setattr(copilot, "DOCS_DIR", str(docs))
+    monkeypatch.setattr(copilot, "INDEX_DIR", str(idx))
+    monkeypatch.setattr(copilot, "EMBED_BATCH", 4)
+    monkeypatch.setattr(copilot, "_INDEX", None)
+    monkeypatch.setattr(copilot, "_INDEX_STAT", None)
+    monkeypatch.setattr(copilot, "_DOCS_CHECK_AT", 0.0)
+    copilot._QUERY_VECS.clear()
+    copilot._clear_answers()
+    monkeypatch.setattr(copilot.rate_limit, "RATE_LIMIT_DB", str(tmp_path / "rl.sqlite3"))
+    yield _StubOllama, docs
+    srv.shutdown()
+    srv.server_close()
+
+
+def _write_docs(docs, n_sections=10, changed=None):
+    for f in ("a.md", "b.md"):
+        body = []
+        for i in range(n_sections):
+            word = "CHANGED" if (f, i) == changed else "original"
+            body += [f"## Section {i}", f"{f} section {i} text, {word}."]
+        (docs / f).write_text("\n".join(body) + "\n", encoding="utf-8")
+
+
+def _embedded_texts(calls):
+    out = []
+    for path, body in calls:
+        if path == "/api/embed":
+            out += body["input"]
+        elif path == "/api/embeddings":
+            out.append(body["prompt"])
+    return out
+
+
+def test_build_index_batches_and_reuses_unchanged_chunks(ollama):
+    stub, docs = ollama
+    _write_docs(docs)
+    vecs, meta = copilot.build_index()
+    assert len(meta) == 20 and vecs.shape == (20, 16)
+    assert all(len(b["input"]) <= 4 for p, b in stub.calls)
+    assert len(stub.calls) == 5
+    np.testing.assert_allclose(np.linalg.norm(vecs, axis=1), 1.0, rtol=1e-5)
+
+    # unchanged tree: loaded from disk
+    stub.calls.clear()
+    copilot.build_index()
+    assert stub.calls == []
+
+    # one edited section: only that chunk is embedded
+    _write_docs(docs, changed=("b.md", 3))
+    os.utime(docs / "b.md", (1, 1))   # same size; make sure the signature moves
+    vecs2, meta2 = copilot.build_index()
+    assert _embedded_texts(stub.calls) == ["b.md section 3 text, CHANGED."]
+    unchanged = [i for i, m in enumerate(meta2) if "CHANGED" not in m["text"]]
+    np.testing.assert_array_equal(vecs2[unchanged], vecs[unchanged])
+
+    stub.calls.clear()
+    copilot.build_index(force=True)
+    assert len(_embedded_texts(stub.calls)) == 20
+
+
+def test_repeated_questions_reuse_the_query_embedding(ollama):
+    stub, docs = ollama
+    _write_docs(docs, n_sections=2)
+    copilot.build_index()
+    stub.calls.clear()
+
+    a = copilot._search("How do I pay an invoice?")
+    b = copilot._search("  how do I pay   an invoice? ")
+    assert a == b
+    assert _embedded_texts(stub.calls) == ["How do I pay an invoice?"]
+
+
+def test_falls_back_to_single_embeddings_endpoint(ollama):
+    stub, docs = ollama
+    stub.batch_endpoint = False
+    _write_docs(docs, n_sections=3)
+    vecs, meta = copilot.build_index()
+    assert vecs.shape == (6, 16)
+    assert sum(p == "/api/embeddings" for p, _ in stub.calls) == 6
+
+
+def _brute_force(query, k):
+    vecs, meta = copilot._load_saved()
+    sims = vecs @ copilot._query_vec(query)
+    return [meta[i]["text"] for i in np.argsort(-sims)[:k]]
+
+
+def test_search_maps_the_index_and_selects_top_k(ollama):
+    stub, docs = ollama
+    _write_docs(docs)
+    copilot.build_index()
+
+    hits = copilot._search("section 7 text", k=5)
+    assert isinstance(copilot._INDEX.vecs, np.memmap)
+    assert [m["text"] for _, m in hits] == _brute_force("section 7 text", 5)
+    scores = [s for s, _ in hits]
+    assert scores == sorted(scores, reverse=True)
+    assert {"file", "title", "anchor", "text"} <= set(hits[0][1])
+    assert len(copilot._search("section 7 text", k=100)) == 20
+
+
+def test_search_reloads_only_when_a_rebuild_is_published(ollama, monkeypatch):
+    stub, docs = ollama
+    _write_docs(docs, n_sections=2)
+    copilot._search("anything")
+    first = copilot._INDEX
+
+    hashed = []
+    real = copilot._signature
+    monkeypatch.setattr(copilot, "_signature", lambda: hashed.append(1) or real())
+    copilot._search("anything")
+    assert copilot._INDEX is first and hashed == []
+
+    # another worker rebuilds after a docs edit: picked up from current.json
+    _write_docs(docs, n_sections=3)
+    copilot.build_index()
+    hashed.clear()
+    hits = copilot._search("anything", k=6)
+    assert copilot._INDEX is not first and len(copilot._INDEX) == 6
+    assert [m["text"] for _, m in hits] == _brute_force("anything", 6)
+    assert hashed == []
+    # superseded generations are cleaned up (the previous one is kept)
+    assert len(list((docs.parent / "index").glob("gen-*"))) == 2
+
+
+def test_concurrent_builds_embed_once_and_keep_the_published_generation(ollama):
+    stub, docs = ollama
+    _write_docs(docs)
+    copilot.build_index()
+    _write_docs(docs, changed=("a.md", 1))
+    os.utime(docs / "a.md", (1, 1))
+    stub.calls.clear()
+
+    errors = []
+
+    def _build():
+        try:
+            copilot.build_index()
+        except Exception as e:    # pragma: no cover - surfaced below
+            errors.append(e)
+
+    workers = [threading.Thread(target=_build) for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert errors == []
+    assert _embedded_texts(stub.calls) == ["a.md section 1 text, CHANGED."]
+    cur = json.loads((docs.parent / "index" / "current.json").read_text())
+    assert (docs.parent / "index" / cur["dir"]).is_dir()
+    assert len(copilot._open_current()) == 20
+
+
+def test_docs_edits_are_picked_up_by_one_throttled_check(ollama, monkeypatch):
+    stub, docs = ollama
+    monkeypatch.setattr(copilot, "DOCS_CHECK_SEC", 60)
+    _write_docs(docs, n_sections=2)
+    copilot._search("anything")
+    stamp = docs.parent / "index" / copilot.DOCS_STAMP_FILE
+
+    hashed = []
+    real = copilot._signature
+    monkeypatch.setattr(copilot, "_signature", lambda: hashed.append(1) or real())
+    _write_docs(docs, n_sections=3)
+    copilot._search("anything")
+    assert len(copilot._INDEX) == 4 and hashed == []      # within the interval
+
+    # interval over, but another process checked a moment ago
+    stamp.touch()
+    monkeypatch.setattr(copilot, "_DOCS_CHECK_AT", 0.0)
+    copilot._search("anything")
+    assert len(copilot._INDEX) == 4 and hashed == []
+
+    os.utime(stamp, (1, 1))
+    monkeypatch.setattr(copilot, "_DOCS_CHECK_AT", 0.0)
+    copilot._search("anything")
+    assert len(copilot._INDEX) == 6 and hashed
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_quantized_index_keeps_the_ranking(ollama, monkeypatch, dtype):
+    stub, docs = ollama
+    _write_docs(docs)
+    vecs, _ = copilot.build_index()
+    exact = vecs @ copilot._query_vec("b.md section 4")
+
+    monkeypatch.setattr(copilot, "VEC_DTYPE", np.dtype(dtype))
+    stub.calls.clear()
+    copilot.build_index(force=True)
+    assert copilot._open_current().vecs.dtype == np.dtype(dtype)
+    hits = copilot._search("b.md section 4", k=3)
+    np.testing.assert_allclose([s for s, _ in hits], np.sort(exact)[::-1][:3], atol=0.02)
+
+
+def _sse_events(raw):
+    out = []
+    for frame in raw.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.split("\n"))
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+def test_ask_stream_relays_tokens_and_ends_with_the_ask_payload(ollama):
+    stub, docs = ollama
+    _write_docs(docs, n_sections=2)
+    events = list(copilot.ask_stream("10.0.0.1", "What is in the docs?"))
+
+    kinds = [e for e, _ in events]
+    assert kinds[0] == "sources" and kinds[-1] == "done"
+    assert "".join(d["text"] for e, d in events if e == "token") == "".join(stub.answer)
+    assert "html" in kinds
+    done = events[-1][1]
+    assert copilot.ask("10.0.0.1", "What is in the docs?") == dict(done, cached=True)
+    assert "<strong>docs</strong>" in done["answer_html"]
+    assert "<script>" not in done["answer_html"]
+    assert all("<script>" not in d["answer_html"] for e, d in events if e == "html")
+
+
+def test_ask_stream_route_is_server_sent_events(ollama, app, client, monkeypatch):
+    stub, docs = ollama
+    _write_docs(docs, n_sections=2)
+    monkeypatch.setitem(app.config, "COPILOT_ENABLED", True)
+
+    r = client.post("/copilot/ask/stream", json={"q": "What is in the docs?"})
+    assert r.status_code == 200 and r.mimetype == "text/event-stream"
+    events = _sse_events(r.get_data(as_text=True))
+    assert events[0][0] == "sources" and events[-1][0] == "done"
+    assert events[-1][1]["sources"] == events[0][1]["sources"]
+
+    r = client.post("/copilot/ask/stream", json={"q": " "})
+    assert _sse_events(r.get_data(as_text=True)) == [
+        ("done", {"answer_html": "Ask me something about this app.", "sources": []})]
+
+
+def _chats(calls):
+    return sum(p == "/api/chat" for p, _ in calls)
+
+
+def test_repeated_and_near_identical_questions_are_answered_from_cache(ollama):
+    stub, docs = ollama
+    _write_docs(docs, n_sections=2)
+    first = copilot.ask("10.0.0.1", "How do I pay an invoice?")
+    assert _chats(stub.calls) == 1 and "cached" not in first
+
+    again = copilot.ask("10.0.0.2", "  how do I pay an INVOICE? ")
+    assert _chats(stub.calls) == 1
+    assert again == dict(first, cached=True)
+
+    # a paraphrase whose embedding is almost the same
+    qv = copilot._query_vec("How do I pay an invoice?")
+    near = qv + 0.05 * np.roll(qv, 1)
+    copilot._QUERY_VECS[copilot._chunk_key("paying my bill?")] = near / np.linalg.norm(near)
+    assert copilot.ask("10.0.0.3", "paying my bill?")["sources"] == first["sources"]
+    assert _chats(stub.calls) == 1
+
+    copilot.ask("10.0.0.4", "Something else entirely")
+    assert _chats(stub.calls) == 2
+
+
+def test_answer_cache_follows_the_index_ttl_and_size(ollama, monkeypatch):
+    stub, docs = ollama
+    _write_docs(docs, n_sections=2)
+    copilot.ask("10.0.0.1", "q1")
+
+    # docs edit + rebuild: a new index generation, the old answers are dropped
+    _write_docs(docs, n_sections=3)
+    copilot.build_index()
+    copilot.ask("10.0.0.1", "q1")
+    assert _chats(stub.calls) == 2
+    copilot.ask("10.0.0.1", "q1")
+    assert _chats(stub.calls) == 2
+
+    real = copilot.time.time
+    monkeypatch.setattr(copilot.time, "time", lambda: real() + copilot.ANSWER_CACHE_TTL_SEC + 1)
+    copilot.ask("10.0.0.1", "q1")
+    assert _chats(stub.calls) == 3
+    monkeypatch.setattr(copilot.time, "time", real)
+
+    monkeypatch.setattr(copilot, "ANSWER_CACHE_MAX", 2)
+    copilot._clear_answers()
+    for q in ("q1", "q2", "q1", "q3"):     # q2 is the least recently used
+        copilot.ask("10.0.0.1", q)
+    stub.calls.clear()
+    assert copilot.ask("10.0.0.1", "q1").get("cached")
+    assert not copilot.ask("10.0.0.1", "q2").get("cached")
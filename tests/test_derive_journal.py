@@ -0,0 +1,68 @@
+# tests/test_derive_journal.py
+from datetime import datetime, timezone
+
+import pytest
+
+from models.base import session_scope
+from models.schema import Receipt
+from models.billing_store import create_receipt_from_rows
+from services import accounting as acc
+
+
+def _receipt(job, start, end, created, paid=None):
+    rid, _, _ = create_receipt_from_rows(
+        "admin", start, end,
+        [{"JobID": job, "Cost (฿)": 100, "CPU_Core_Hours": 1.0, "GPU_Hours": 0.0,
+          "Mem_GB_Hours_Used": 0.0, "tier": "mu", "User": "admin"}])
+    with session_scope() as s:
+        r = s.get(Receipt, rid)
+        r.created_at = created
+        if paid:
+            r.status, r.paid_at = "paid", paid
+    return rid
+
+
+@pytest.mark.db
+def test_derive_journal_loads_only_receipts_near_window(admin_user, monkeypatch):
+    old = _receipt("J-old", "2015-03-01", "2015-03-31",
+                   datetime(2015, 4, 2, tzinfo=timezone.utc),
+                   datetime(2015, 4, 20, tzinfo=timezone.utc))
+    cur = _receipt("J-cur", "2025-01-01", "2025-01-31",
+                   datetime(2025, 2, 3, tzinfo=timezone.utc))
+
+    seen = []
+    real = acc._receipt_lines
+    monkeypatch.setattr(acc, "_receipt_lines",
+                        lambda r: seen.append(r["id"]) or real(r))
+
+    j = acc.derive_journal("2025-02-01", "2025-02-28")
+    assert seen == [cur]
+    assert set(j["ref"]) == {f"R{cur}"}
+    assert (j["date"] >= "2025-02-01").all() and (j["date"] <= "2025-02-28").all()
+
+    seen.clear()
+    j = acc.derive_journal("2015-04-01", "2015-04-30")
+    assert seen == [old]
+    assert round(float(j["debit"].sum()), 2) == round(float(j["credit"].sum()), 2)
+
+
+@pytest.mark.db
+def test_receipt_lines_memo_follows_receipt_changes(admin_user, monkeypatch):
+    _receipt("J-memo", "2025-01-01", "2025-01-31",
+             datetime(2025, 2, 3, tzinfo=timezone.utc))
+    built = []
+    real = acc._entry_receipt_issue
+    monkeypatch.setattr(acc, "_entry_receipt_issue",
+                        lambda r: built.append(r["id"]) or real(r))
+
+    first = acc.derive_journal("2025-01-01", "2025-03-31")
+    assert acc.derive_journal("2025-01-01", "2025-03-31").equals(first)
+    assert len(built) == 1  # second preview served from the memo
+
+    with session_scope() as s:
+        r = s.get(Receipt, built[0])
+        r.status, r.paid_at = "paid", datetime(2025, 3, 5, tzinfo=timezone.utc)
+    after = acc.derive_journal("2025-01-01", "2025-03-31")
+    assert len(after) == len(first) + 2
+    assert len(built) == 2
+    assert "2025-03-05" in set(after["date"])
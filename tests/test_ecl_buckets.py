@@ -58,3 +58,42 @@ def test_ecl_posts_for_ar_and_contract_asset(admin_user):
         lines = s.query(GLEntry).filter(GLEntry.batch_id == b.id).all()
         # At least 2 lines: expense + allowance (and possibly 4 if both AR & CA)
         assert len(lines) >= 2
+
+
+@pytest.mark.db
+def test_ecl_ages_receipts_into_buckets_in_sql():
+    """
+    Three unpaid invoices aged 0, 45 and 120 days at Apr-30 fall into
+    'current', '31-60' and '90+'; the provision is the rate-weighted sum.
+    """
+    from services import accounting as acc
+
+    ages = {"current": _dt(2025, 4, 30), "31-60": _dt(2025, 3, 16),
+            "90+": _dt(2024, 12, 31)}
+    with session_scope() as s:
+        rids = []
+        for created in ages.values():
+            r = Receipt(
+                username="admin", total=100.0, pricing_tier="mu",
+                rate_cpu=0, rate_gpu=0, rate_mem=0, rates_locked_at=created,
+                start=created, end=created, created_at=created, status="pending",
+            )
+            s.add(r)
+            s.flush()
+            rids.append(r.id)
+    for rid in rids:
+        assert post_receipt_issued(rid, "pytest") is True
+
+    rates = {
+        "ar": {"current": 0.01, "1-30": 0.0, "31-60": 0.10, "61-90": 0.0, "90+": 0.50},
+        "ca": {b: 0.0 for b in ("current", "1-30", "31-60", "61-90", "90+")},
+    }
+    assert post_ecl_provision(2025, 4, "pytest", rates=rates) is True
+
+    ALW_AR = acc._acc("Allowance for ECL - Trade receivables")
+    with session_scope() as s:
+        b = s.query(JournalBatch).filter_by(
+            kind="impairment", period_year=2025, period_month=4).one()
+        cr = sum(float(ln.credit or 0) for ln in
+                 s.query(GLEntry).filter_by(batch_id=b.id, account_id=ALW_AR))
+    assert round(cr, 2) == round(100 * 0.01 + 100 * 0.10 + 100 * 0.50, 2)
@@ -0,0 +1,174 @@
+# tests/test_forecast.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from services import forecast as F
+
+
+def _daily(end="2025-06-30", days=120, seed=0):
+    rng = np.random.default_rng(seed)
+    ix = pd.date_range(end=end, periods=days, freq="D")
+    y = 50 + 10 * np.sin(np.arange(days) * 2 * np.pi / 7) + rng.random(days)
+    return pd.Series(y, index=ix)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_caches():
+    F._fit_cache.clear()
+    F._warm_params.clear()
+    yield
+    F._fit_cache.clear()
+    F._warm_params.clear()
+
+
+@pytest.fixture
+def fits(monkeypatch):
+    calls = []
+    real = F._hw_fit
+
+    def spy(daily, start_params=None):
+        calls.append(start_params)
+        return real(daily, start_params)
+    monkeypatch.setattr(F, "_hw_fit", spy)
+    return calls
+
+
+def test_horizons_come_from_one_fit_and_are_prefixes(fits):
+    f = F.multi_horizon_forecast(_daily(), horizons=(30, 60, 90), metric="cost")
+    if F._USE_HW:
+        assert len(fits) == 1
+    h30, h90 = f.horizons[30], f.horizons[90]
+    assert len(h30["values"]) == 30 and len(h90["labels"]) == 90
+    for k in ("labels", "values", "lower", "upper"):
+        assert h90[k][:30] == h30[k]
+    assert h30["labels"][0] == "2025-07-01"
+
+
+def test_repeat_call_is_served_from_cache(fits):
+    a = F.multi_horizon_forecast(_daily(), metric="cost")
+    b = F.multi_horizon_forecast(_daily(), metric="cost")
+    assert a.horizons == b.horizons
+    assert len(fits) == (1 if F._USE_HW else 0)
+
+    # different data for the same window is a different model
+    F.multi_horizon_forecast(_daily(seed=1), metric="cost")
+    assert len(fits) == (2 if F._USE_HW else 0)
+
+
+def test_next_day_warm_starts_from_previous_params(fits):
+    if not F._USE_HW:
+        pytest.skip("statsmodels not installed")
+    full = _daily(end="2025-07-01", days=121)
+    F.multi_horizon_forecast(full.iloc[:-1], metric="cost")
+    F.multi_horizon_forecast(full.iloc[1:], metric="cost")
+    assert fits[0] is None
+    assert fits[1] is not None and len(fits[1]) == 5 + 7
+
+    # other metrics / window lengths do not share parameters
+    F.multi_horizon_forecast(full.iloc[1:], metric="jobs")
+    assert fits[2] is None
+
+
+def test_seasonal_naive_path_without_statsmodels(monkeypatch):
+    monkeypatch.setattr(F, "_USE_HW", False)
+    d = _daily()
+    f = F.multi_horizon_forecast(d, horizons=(7, 14))
+    assert f.horizons[14]["values"][:7] == [float(v) for v in d.tail(7)]
+    assert f.horizons[7]["values"] == f.horizons[14]["values"][:7]
+
+
+def _costed(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "End": pd.Timestamp("2025-03-01", tz="UTC")
+        + pd.to_timedelta(rng.integers(0, 120 * 24, n), unit="h"),
+        "JobID": [f"j{i}" for i in range(n)],
+        "User": rng.choice(["ann", "bo", "cy", "di"], n),
+        "tier": rng.choice(["mu", "gov"], n),
+        "Cost (฿)": rng.random(n) * 10,
+        "CPU_Core_Hours": rng.random(n),
+        "GPU_Hours": rng.random(n),
+        "Mem_GB_Hours_Used": rng.random(n),
+    })
+
+
+def test_daily_panel_matches_single_series():
+    df = _costed()
+    panel = F.build_daily_panel(df, "2025-06-28", train_days=90, top_users=2)
+    assert len(panel) == 90
+    for metric in ("cost", "jobs", "cpu", "gpu", "mem"):
+        single = F.build_daily_series(df, metric, "2025-06-28", train_days=90)
+        np.testing.assert_allclose(panel[metric].to_numpy(), single.to_numpy())
+        np.testing.assert_allclose(
+            panel[f"{metric}:tier=mu"] + panel[f"{metric}:tier=gov"], panel[metric])
+    assert len([c for c in panel.columns if c.startswith("cost:user=")]) == 2
+    assert F.build_daily_panel(pd.DataFrame(), "2025-06-28", 30).shape == (30, 0)
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_forecast_panel_fits_each_series_once(workers):
+    panel = F.build_daily_panel(_costed(), "2025-06-28", train_days=90, top_users=1)
+    try:
+        res = F.forecast_panel(panel, horizons=(7, 14), workers=workers)
+    finally:
+        F.shutdown_forecast_pool()
+    assert list(res) == list(panel.columns)
+    assert all(len(r.horizons[14]["values"]) == 14 for r in res.values())
+
+    # same as fitting one series on its own, and now cached
+    one = F.multi_horizon_forecast(panel["cost"], horizons=(7, 14), metric="cost")
+    assert one.horizons == res["cost"].horizons
+    assert len(F._fit_cache) == len(panel.columns)
+
+
+@pytest.mark.db
+def test_forecast_panel_endpoint(client, admin_user, monkeypatch):
+    df = _costed()
+    monkeypatch.setattr("controllers.admin.fetch_jobs_with_fallbacks",
+                        lambda s, e: (df.copy(), "test", []))
+    monkeypatch.setattr("controllers.admin.compute_costs", lambda d: d)
+
+    r = client.get("/admin/forecast_panel.json?before=2025-06-28&train_days=60&top_users=1")
+    assert r.status_code == 200
+    series = r.get_json()["series"]
+    assert {"cost", "jobs:tier=gov", "cpu:tier=mu"} <= set(series)
+    assert len(series["cost"]["history"]["values"]) == 60
+    assert len(series["mem"]["forecasts"]["90"]["values"]) == 90
+    assert client.get("/admin/forecast_panel.json?before=bad").status_code == 400
+
+
+def _naive_reference(y, horizon):
+    # the original list-based seasonal-naive
+    y = pd.Series(y)
+    if len(y) < 14:
+        avg = float(y.tail(min(len(y), 7)).mean() or 0.0)
+        return [avg] * horizon, [avg] * horizon, [avg] * horizon
+    last7 = y.tail(7).values.tolist()
+    vals = [float(last7[i % 7]) for i in range(horizon)]
+    sigma = float((y[7:] - y[:-7].values).std(ddof=1) or 0.0)
+    return (vals, [max(0.0, v - 1.96 * sigma) for v in vals],
+            [max(0.0, v + 1.96 * sigma) for v in vals])
+
+
+@pytest.mark.parametrize("days", [5, 13, 14, 90])
+def test_seasonal_naive_matrix_matches_per_series(days):
+    rng = np.random.default_rng(days)
+    Y = rng.random((50, days)) * 20
+    vals, lower, upper = F.seasonal_naive_matrix(Y, 30)
+    assert vals.shape == (50, 30)
+    for i in (0, 17, 49):
+        ref = _naive_reference(Y[i], 30)
+        np.testing.assert_allclose(vals[i], ref[0])
+        np.testing.assert_allclose(lower[i], ref[1])
+        np.testing.assert_allclose(upper[i], ref[2])
+
+
+def test_panel_without_statsmodels_uses_one_array_pass(monkeypatch):
+    monkeypatch.setattr(F, "_USE_HW", False)
+    monkeypatch.setattr(F, "_fit_path", lambda *a: pytest.fail("per-series fit"))
+    panel = F.build_daily_panel(_costed(), "2025-06-28", train_days=60, top_users=2)
+    res = F.forecast_panel(panel, horizons=(30,), workers=0)
+    assert res["cost"].history_labels is res["gpu"].history_labels
+    assert res["cost"].horizons[30]["values"] == \
+        _naive_reference(panel["cost"].to_numpy(), 30)[0]
@@ -0,0 +1,126 @@
+# tests/test_forum_counters.py
+import re
+
+import pytest
+from sqlalchemy import select, update
+
+from models.base import session_scope
+from models.forum_store import rebuild_thread_counters
+from models.schema import ForumThread, ForumComment
+from models.users_db import create_user
+
+
+def _login(client, u):
+    client.post("/logout")
+    client.post("/login", data={"username": u, "password": "pw"})
+
+
+def _new_thread(client, title):
+    r = client.post("/forum/new", data={"title": title, "body": f"{title} body"})
+    return int(r.headers["Location"].rstrip("/").rsplit("/", 1)[-1])
+
+
+def _counters(tid):
+    with session_scope() as s:
+        t = s.get(ForumThread, tid)
+        return t.score, t.comment_count, t.last_comment_at
+
+
+@pytest.fixture
+def users(client):
+    for u in ("alice", "bob", "carol"):
+        create_user(u, "pw", role="user")
+
+
+@pytest.mark.db
+def test_votes_and_comments_keep_thread_counters(client, users):
+    _login(client, "alice")
+    tid = _new_thread(client, "GPU quota")
+    score, count, last = _counters(tid)
+    with session_scope() as s:
+        created = s.get(ForumThread, tid).created_at
+    assert (score, count, last) == (0, 0, created)
+
+    client.post(f"/forum/{tid}/vote", data={"v": 1})
+    client.post(f"/forum/{tid}/comment", data={"body": "first"})
+    _login(client, "bob")
+    client.post(f"/forum/{tid}/vote", data={"v": -1})
+    client.post(f"/forum/{tid}/vote", data={"v": 1})       # change
+    client.post(f"/forum/{tid}/comment", data={"body": "second"})
+    _login(client, "carol")
+    client.post(f"/forum/{tid}/vote", data={"v": 1})
+    client.post(f"/forum/{tid}/vote", data={"v": 0})       # clear
+
+    with session_scope() as s:
+        first, second = s.execute(select(ForumComment).where(
+            ForumComment.thread_id == tid).order_by(ForumComment.id)).scalars().all()
+    assert _counters(tid) == (2, 2, second.created_at)
+
+    _login(client, "bob")
+    client.post(f"/forum/comment/{second.id}/delete")
+    client.post(f"/forum/comment/{second.id}/delete")      # twice: counted once
+    assert _counters(tid) == (2, 1, first.created_at)
+
+    before = _counters(tid)
+    assert rebuild_thread_counters() == 1
+    assert _counters(tid) == before
+
+
+@pytest.mark.db
+def test_rebuild_fixes_drift_and_list_sorts_by_counters(client, users):
+    _login(client, "alice")
+    a = _new_thread(client, "Thread A")
+    b = _new_thread(client, "Thread B")
+    c = _new_thread(client, "Thread C")
+    client.post(f"/forum/{a}/vote", data={"v": 1})
+    client.post(f"/forum/{c}/vote", data={"v": -1})
+    client.post(f"/forum/{a}/comment", data={"body": "bump"})
+
+    with session_scope() as s:
+        s.execute(update(ForumThread).values(score=99, comment_count=7))
+    assert rebuild_thread_counters(b) == 1
+    assert _counters(b)[:2] == (0, 0)
+    rebuild_thread_counters()
+    assert _counters(a)[:2] == (1, 1) and _counters(c)[:2] == (-1, 0)
+
+    def order(sort):
+        html = client.get(f"/forum/?sort={sort}").get_data(as_text=True)
+        return re.findall(r">Thread ([ABC])</a>", html)
+
+    assert order("latest_post") == ["C", "B", "A"]
+    assert order("latest_comment") == ["A", "C", "B"]
+    assert order("most_upvoted") == ["A", "B", "C"]
+    assert order("most_downvoted") == ["C", "B", "A"]
+    html = client.get("/forum/?sort=most_upvoted&per_page=5&q=Thread").get_data(as_text=True)
+    assert "1 comment<" in html and "(+1)" in html
+
+
+@pytest.mark.db
+def test_counter_upgrade_runs_before_search_on_an_old_schema(client, users):
+    from sqlalchemy import text
+    from models.base import init_engine_and_session
+    from models.forum_store import ensure_thread_counter_columns
+    from models.search_store import ensure_search_index
+
+    _login(client, "alice")
+    tid = _new_thread(client, "MPI hangs")
+    for i in range(3):
+        client.post(f"/forum/{tid}/comment", data={"body": f"reply {i}"})
+    engine, _ = init_engine_and_session()
+    with engine.begin() as conn:
+        conn.execute(text(
+            "ALTER TABLE forum_threads DROP COLUMN search_doc, "
+            "DROP COLUMN score, DROP COLUMN comment_count, DROP COLUMN last_comment_at"))
+
+    assert ensure_thread_counter_columns() is True  # must not touch the search index
+    assert ensure_thread_counter_columns() is False
+    with engine.connect() as conn:
+        names = set(conn.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'forum_threads'")).scalars())
+    assert "ix_forum_threads_sort_comment" in names
+    assert "ix_forum_threads_search" not in names
+
+    assert ensure_search_index()["forum_threads"] == 1
+    with session_scope() as s:
+        t = s.get(ForumThread, tid)
+        assert (t.title, t.comment_count) == ("MPI hangs", 3)
@@ -0,0 +1,110 @@
+# tests/test_forum_thread_view.py
+import pytest
+from sqlalchemy import event
+
+from models.base import session_scope, init_engine_and_session
+from models.forum_store import load_thread_view, comment_page
+from models.schema import ForumComment
+from models.users_db import create_user
+
+
+def _login(client, u):
+    client.post("/logout")
+    client.post("/login", data={"username": u, "password": "pw"})
+
+
+@pytest.fixture
+def users(client):
+    create_user("alice", "pw", role="user")
+    create_user("bob", "pw", role="user")
+    create_user("root", "pw", role="admin")
+
+
+@pytest.fixture
+def thread(client, users):
+    """alice's thread: 5 top-level comments, the 2nd with a reply chain."""
+    _login(client, "alice")
+    r = client.post("/forum/new", data={"title": "MPI hangs", "body": "at startup"})
+    tid = int(r.headers["Location"].rstrip("/").rsplit("/", 1)[-1])
+    _login(client, "bob")
+    for i in range(5):
+        client.post(f"/forum/{tid}/comment", data={"body": f"top {i}"})
+    with session_scope() as s:
+        top = [c.id for c in s.query(ForumComment).order_by(ForumComment.id)]
+    _login(client, "root")
+    client.post(f"/forum/{tid}/comment", data={"body": "reply", "parent_id": top[1]})
+    with session_scope() as s:
+        reply = s.query(ForumComment).filter_by(body="reply").one().id
+    _login(client, "bob")
+    client.post(f"/forum/{tid}/comment", data={"body": "nested", "parent_id": reply})
+    return tid, top, reply
+
+
+@pytest.mark.db
+def test_loader_pages_by_top_level_comment_in_two_queries(client, thread):
+    tid, top, reply = thread
+    _login(client, "alice")
+    client.post(f"/forum/{tid}/vote", data={"v": 1})
+    client.post(f"/forum/comment/{top[1]}/vote", data={"v": 1})
+    client.post(f"/forum/{tid}/solve/{reply}")
+    _login(client, "bob")
+    client.post(f"/forum/comment/{top[1]}/vote", data={"v": 1})
+    client.post(f"/forum/comment/{reply}/vote", data={"v": -1})
+
+    engine, _ = init_engine_and_session()
+    statements = []
+
+    def _count(*_a):
+        statements.append(1)
+
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        with session_scope() as s:
+            v = load_thread_view(s, tid, "bob", page=1, per_page=2)
+            texts = [c.body for c in v.comments]
+            names = {c.author.role for c in v.comments}
+            sols = [(sol.comment_id, sol.comment.body) for sol in v.solutions]
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+
+    assert len(statements) == 2
+    assert texts == ["top 0", "top 1", "reply", "nested"]
+    assert names == {"user", "admin"}
+    assert sols == [(reply, "reply")]
+    assert (v.thread.score, v.my_vote, v.page, v.pages) == (1, 0, 1, 3)
+    assert v.comment_scores == {top[1]: 2, reply: -1}
+    assert v.my_comment_votes == {top[1]: 1, reply: -1}
+
+    with session_scope() as s:
+        v = load_thread_view(s, tid, None, page=9, per_page=2)
+        assert [c.body for c in v.comments] == ["top 4"]
+        assert (v.page, v.my_comment_votes) == (3, {})
+        assert load_thread_view(s, tid + 1, None) is None
+
+        nested = s.query(ForumComment).filter_by(body="nested").one().id
+        assert comment_page(s, tid, nested, per_page=2) == 1
+        assert comment_page(s, tid, top[4], per_page=2) == 3
+        assert comment_page(s, tid + 1, top[4], per_page=2) is None
+
+
+@pytest.mark.db
+def test_thread_page_renders_labels_pager_and_deep_links(client, thread, monkeypatch):
+    import controllers.forum as forum
+    monkeypatch.setattr(forum, "COMMENTS_PER_PAGE", 2)
+    tid, top, reply = thread
+
+    html = client.get(f"/forum/{tid}").get_data(as_text=True)
+    assert "top 1" in html and "nested" in html and "top 2" not in html
+    assert "<b>(Admin)</b>" in html
+    assert "Page 1 / 3" in html and "Comments (7)" in html
+
+    html = client.get(f"/forum/{tid}?page=3").get_data(as_text=True)
+    assert "top 4" in html and "top 0" not in html
+
+    # replying redirects to the page holding the new comment
+    r = client.post(f"/forum/{tid}/comment", data={"body": "late"})
+    assert "comment=" in r.headers["Location"]
+    html = client.get(r.headers["Location"]).get_data(as_text=True)
+    assert "late" in html and "Page 3 / 3" in html
+
+    assert client.get(f"/forum/{tid + 1}").status_code == 404
@@ -0,0 +1,131 @@
+# tests/test_gl_balances.py
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+from models.base import session_scope
+from models.gl import AccountBalance, JournalBatch, GLEntry
+from services import accounting as acc
+from services.gl_balances import posted_trial_balance, rebuild_account_balances
+
+
+def _post(s, ref, when, lines):
+    b = JournalBatch(source="billing", source_ref=ref, kind="issue",
+                     posted_at=when, posted_by="t",
+                     period_year=when.year, period_month=when.month)
+    s.add(b)
+    s.flush()
+    for name, dr, cr in lines:
+        aid = acc._acc(name)
+        s.add(GLEntry(batch_id=b.id, date=when, ref=ref, memo=ref,
+                      account_id=aid, account_name=acc._ACC[aid]["name"],
+                      account_type=acc._ACC[aid]["type"], debit=dr, credit=cr))
+
+
+def _seed():
+    with session_scope() as s:
+        for i, (y, m, d) in enumerate([(2024, 11, 30), (2024, 12, 15), (2025, 1, 1),
+                                       (2025, 1, 31), (2025, 2, 10), (2025, 3, 2)]):
+            amt = 100 + i
+            _post(s, f"R{i}", datetime(y, m, d, 12, tzinfo=timezone.utc), [
+                ("Accounts Receivable", amt, 0),
+                ("Service Revenue", 0, amt),
+            ])
+
+
+def _journal_tb(start, end):
+    with session_scope() as s:
+        rows = s.execute(select(GLEntry.account_id, GLEntry.account_name, GLEntry.account_type,
+                                GLEntry.debit, GLEntry.credit, GLEntry.date)).all()
+    j = pd.DataFrame(rows, columns=["account_id", "account_name", "account_type",
+                                    "debit", "credit", "date"])
+    d = pd.to_datetime(j["date"], utc=True).dt.date.astype(str)
+    j = j[(d >= start) & (d <= end)].copy()
+    j["debit"] = j["debit"].astype(float)
+    j["credit"] = j["credit"].astype(float)
+    return acc.trial_balance(j)
+
+
+@pytest.mark.db
+def test_balances_follow_postings_per_month():
+    _seed()
+    with session_scope() as s:
+        got = {(b.account_id, b.period_year, b.period_month): float(b.debit)
+               for b in s.scalars(select(AccountBalance))}
+    ar = acc._acc("Accounts Receivable")
+    assert got[(ar, 2025, 1)] == pytest.approx(102 + 103)
+    assert got[(ar, 2024, 11)] == pytest.approx(100)
+
+
+@pytest.mark.db
+@pytest.mark.parametrize("start,end", [
+    ("2024-11-01", "2025-03-31"),   # whole months only
+    ("2024-11-30", "2025-02-10"),   # partial edges
+    ("2025-01-05", "2025-01-31"),   # inside a single month
+    ("2025-04-01", "2025-04-30"),   # empty
+])
+def test_posted_trial_balance_matches_journal(start, end):
+    _seed()
+    tb = posted_trial_balance(start, end)
+    ref = _journal_tb(start, end)
+    assert tb.empty == ref.empty
+    if ref.empty:
+        return
+    cols = ["account_id", "debits", "credits", "balance"]
+    pd.testing.assert_frame_equal(
+        tb[cols].sort_values("account_id").reset_index(drop=True),
+        ref[cols].sort_values("account_id").reset_index(drop=True))
+    assert tb.attrs["out_of_balance"] == 0.0
+    assert acc.income_statement_from_tb(tb).equals(acc.income_statement_from_tb(ref))
+
+
+@pytest.mark.db
+def test_delete_and_rebuild_keep_balances_consistent():
+    _seed()
+    with session_scope() as s:
+        e = s.scalars(select(GLEntry).where(GLEntry.ref == "R2")).all()
+        for x in e:
+            s.delete(x)
+    live = posted_trial_balance("2024-01-01", "2025-12-31")
+    assert live.attrs["sum_debits"] == pytest.approx(sum(100 + i for i in (0, 1, 3, 4, 5)))
+
+    with session_scope() as s:
+        s.query(AccountBalance).delete()
+    assert rebuild_account_balances() > 0
+    rebuilt = posted_trial_balance("2024-01-01", "2025-12-31")
+    assert rebuilt.attrs == live.attrs
+
+
+@pytest.mark.db
+def test_bulk_statements_and_batch_cascade_keep_balances_consistent():
+    from sqlalchemy import delete, update
+    _seed()
+    with session_scope() as s:
+        s.execute(update(GLEntry).where(GLEntry.ref == "R1")
+                  .values(date=datetime(2025, 3, 5, 12, tzinfo=timezone.utc)))
+        s.execute(delete(GLEntry).where(GLEntry.ref == "R0"))
+        s.execute(delete(JournalBatch).where(JournalBatch.source_ref == "R4"))
+        s.delete(s.scalars(select(JournalBatch)
+                           .where(JournalBatch.source_ref == "R5")).one())
+    ref = _journal_tb("2024-01-01", "2025-12-31")
+    tb = posted_trial_balance("2024-01-01", "2025-12-31")
+    assert tb.attrs["sum_debits"] == pytest.approx(101 + 102 + 103)
+    assert float(ref["debits"].sum()) == pytest.approx(tb.attrs["sum_debits"])
+    assert posted_trial_balance("2024-12-01", "2024-12-31").attrs["sum_debits"] == 0
+    march = posted_trial_balance("2025-03-01", "2025-03-31")
+    assert march.attrs["sum_debits"] == pytest.approx(101)
+
+
+@pytest.mark.db
+def test_ledger_page_flags_a_truncated_journal(client, admin_user, monkeypatch):
+    monkeypatch.setattr("controllers.admin.LEDGER_JOURNAL_PREVIEW_ROWS", 3)
+    _seed()
+    html = client.get("/admin/ledger?start=2024-01-01&end=2025-12-31").get_data(as_text=True)
+    assert "Showing the latest 3 of 12 lines" in html
+    assert "/admin/export/ledger.csv" in html
+
+    monkeypatch.setattr("controllers.admin.LEDGER_JOURNAL_PREVIEW_ROWS", 50)
+    html = client.get("/admin/ledger?start=2024-01-01&end=2025-12-31").get_data(as_text=True)
+    assert "Showing the latest" not in html
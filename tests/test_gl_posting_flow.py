@@ -1,5 +1,4 @@
 # tests/test_gl_posting_flow.py
-import io
 import zipfile
 from datetime import datetime, timezone
 
@@ -27,7 +26,7 @@ def _dt(y, m, d, h=0, M=0, s=0):
 
 
 @pytest.mark.db
-def test_gl_postings_drcr_close_reopen_and_formal_export(client, admin_user):
+def test_gl_postings_drcr_close_reopen_and_formal_export(client, admin_user, monkeypatch, tmp_path):
     """
     Flow:
       R1: accrual (service Jan), issue (Jan), paid (Jan) → fully settled in Jan
@@ -121,9 +120,10 @@ def test_gl_postings_drcr_close_reopen_and_formal_export(client, admin_user):
         assert has_rev
 
     # ---- Formal export (locks/exported_at; returns a ZIP) ----
-    fname, blob = run_formal_gl_export("2025-01-01", "2025-01-31", actor)
-    assert fname and blob
-    z = zipfile.ZipFile(io.BytesIO(blob), "r")
+    monkeypatch.setattr("services.accounting_export.GL_EXPORT_DIR", str(tmp_path))
+    fname, path = run_formal_gl_export("2025-01-01", "2025-01-31", actor)
+    assert fname and path and path.parent == tmp_path
+    z = zipfile.ZipFile(path, "r")
     names = set(z.namelist())
     assert any(n.endswith(".csv") for n in names)
     assert any(n.startswith("manifest_run_") and n.endswith(".json")
@@ -132,8 +132,8 @@ def test_gl_postings_drcr_close_reopen_and_formal_export(client, admin_user):
                for n in names)
 
     # Running export again should be NOOP (already exported/locked)
-    fname2, blob2 = run_formal_gl_export("2025-01-01", "2025-01-31", actor)
-    assert fname2 is None and blob2 is None
+    fname2, path2 = run_formal_gl_export("2025-01-01", "2025-01-31", actor)
+    assert fname2 is None and path2 is None
 
     # GL persistence Dr=Cr for posted lines: sum across all posted entries equals
     with session_scope() as s:
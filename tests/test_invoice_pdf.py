@@ -0,0 +1,133 @@
+# tests/test_invoice_pdf.py
+import pytest
+
+from models.base import session_scope
+from models.schema import Receipt
+from models.billing_store import create_receipt_from_rows, get_receipt_summary
+from services import invoice_pdf, pdf_render
+
+
+class _CountingHTML:
+    calls = 0
+
+    def __init__(self, *a, **k):
+        pass
+
+    def write_pdf(self, **kw):
+        type(self).calls += 1
+        return b"%PDF-1.4 fake " + str(self.calls).encode()
+
+
+@pytest.fixture
+def pdf_cache(monkeypatch, tmp_path):
+    _CountingHTML.calls = 0
+    monkeypatch.setattr(pdf_render, "HTML", _CountingHTML)
+    monkeypatch.setattr(invoice_pdf, "INVOICE_PDF_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _receipt(job="P-1"):
+    rid, _, _ = create_receipt_from_rows(
+        "admin", "2025-01-01", "2025-01-31",
+        [{"JobID": job, "Cost (฿)": 100, "CPU_Core_Hours": 1.0, "GPU_Hours": 0.0,
+          "Mem_GB_Hours_Used": 0.0, "tier": "mu", "User": "admin"}])
+    return rid
+
+
+@pytest.mark.db
+def test_repeat_downloads_come_from_cache(client, admin_user, pdf_cache):
+    rid = _receipt()
+    first = client.get(f"/admin/receipts/{rid}.pdf").data
+    again = client.get(f"/me/receipts/{rid}.pdf").data
+    assert first == again
+    assert _CountingHTML.calls == 1
+    assert len(list(pdf_cache.glob(f"{rid}-en-*.pdf"))) == 1
+
+    client.get(f"/admin/receipts/{rid}.th.pdf")
+    assert _CountingHTML.calls == 2
+
+
+@pytest.mark.db
+def test_content_change_rerenders_and_drops_old_file(client, admin_user, pdf_cache):
+    rid = _receipt()
+    client.get(f"/admin/receipts/{rid}.pdf")
+    old = set(pdf_cache.glob(f"{rid}-en-*.pdf"))
+
+    with session_scope() as s:
+        s.get(Receipt, rid).status = "paid"
+    client.get(f"/admin/receipts/{rid}.pdf")
+    new = set(pdf_cache.glob(f"{rid}-en-*.pdf"))
+    assert _CountingHTML.calls == 2
+    assert len(new) == 1 and new != old
+
+
+@pytest.mark.db
+def test_prerender_fills_cache_in_background(app, admin_user, pdf_cache, monkeypatch):
+    monkeypatch.setenv("INVOICE_PDF_PRERENDER", "1")
+    rid = _receipt()
+    with app.test_request_context("/"):
+        invoice_pdf.schedule_invoice_pdfs(rid)
+    invoice_pdf._prerender_q.join()
+    assert {p.name.split("-")[1] for p in pdf_cache.glob(f"{rid}-*.pdf")} == {"en", "th"}
+
+    with app.test_request_context("/"):
+        rec, totals = get_receipt_summary(rid)
+        invoice_pdf.render_invoice_pdf(rec, totals, "en")
+    assert _CountingHTML.calls == 2
+
+
+@pytest.mark.db
+def test_month_batch_renders_one_zip(client, admin_user, pdf_cache):
+    import io
+    import time
+    import zipfile
+
+    ids = [_receipt(f"P-{i}") for i in range(3)]
+    with session_scope() as s:
+        s.get(Receipt, ids[2]).status = "void"
+    client.get(f"/admin/receipts/{ids[0]}.pdf")   # already cached
+    assert _CountingHTML.calls == 1
+
+    r = client.post("/admin/invoices/pdf_batch",
+                    data={"year": "2025", "month": "1", "locale": "en"})
+    assert r.status_code == 202
+    job = r.get_json()
+
+    for _ in range(200):
+        st = client.get(job["status_url"]).get_json()
+        if st["status"] in ("done", "failed"):
+            break
+        time.sleep(0.05)
+    assert st["status"] == "done" and st["done"] == 2
+
+    z = zipfile.ZipFile(io.BytesIO(client.get(job["download_url"]).data))
+    assert sorted(z.namelist()) == sorted(f"invoice_{i}_en.pdf" for i in ids[:2])
+    assert _CountingHTML.calls == 2   # only the uncached invoice was rendered
+
+
+def test_old_batch_folders_are_pruned(monkeypatch, tmp_path):
+    import os
+    import time
+
+    monkeypatch.setattr(pdf_render, "PDF_BATCH_DIR", str(tmp_path))
+    for job, age in (("old", 3 * 86400), ("fresh", 60)):
+        pdf_render._write_status(job, status="done")
+        (tmp_path / job / "invoices.zip").write_bytes(b"PK")
+        then = time.time() - age
+        os.utime(tmp_path / job / "status.json", (then, then))
+    assert pdf_render.prune_pdf_batches() == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["fresh"]
+    assert pdf_render.prune_pdf_batches(max_age_sec=0) == 1
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_render_pdf_uses_process_pool(monkeypatch):
+    monkeypatch.setattr(pdf_render, "PDF_RENDER_WORKERS", 1)
+    try:
+        pdfs = dict(pdf_render.render_many(
+            [("a", "<p>a</p>"), ("b", "<p>b</p>")]))
+        assert set(pdfs) == {"a", "b"}
+        assert all(p.startswith(b"%PDF") for p in pdfs.values())
+        assert pdf_render.render_pdf("<p>c</p>").startswith(b"%PDF")
+    finally:
+        pdf_render.shutdown_pdf_pool()
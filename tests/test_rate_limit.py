@@ -0,0 +1,70 @@
+# tests/test_rate_limit.py
+import multiprocessing
+import time
+
+import pytest
+
+from services import rate_limit
+
+
+def _spend(path, n, out):
+    rate_limit.RATE_LIMIT_DB = path
+    out.put(sum(rate_limit.take("shared", 20, 3600) for _ in range(n)))
+
+
+def test_token_bucket_limits_and_refills(monkeypatch):
+    assert [rate_limit.take("ip", 3, 60) for _ in range(4)] == [True, True, True, False]
+    assert rate_limit.take("other-ip", 3, 60)
+
+    real = time.time
+    monkeypatch.setattr(time, "time", lambda: real() + 20)   # one token back
+    assert rate_limit.take("ip", 3, 60)
+    assert not rate_limit.take("ip", 3, 60)
+
+
+def test_bucket_is_shared_between_processes():
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_spend, args=(rate_limit.RATE_LIMIT_DB, 10, out))
+             for _ in range(4)]
+    for p in procs:
+        p.start()
+    granted = sum(out.get(timeout=60) for _ in procs)
+    for p in procs:
+        p.join(timeout=60)
+    assert granted == 20
+    assert not rate_limit.take("shared", 20, 3600)
+
+
+def test_failures_lock_then_clear():
+    for _ in range(2):
+        assert rate_limit.record_failure("u", 60, 3, 300)[1] is None
+    count, until = rate_limit.record_failure("u", 60, 3, 300)
+    assert count == 3 and until == pytest.approx(time.time() + 300, abs=5)
+    assert rate_limit.failure_status("u")[2] == until
+
+    rate_limit.clear_failures("u")
+    assert rate_limit.failure_status("u") == (0, None, None)
+
+
+def test_expired_rows_are_collected(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_GC_SEC", 0)
+    rate_limit.take("old", 5, 60)
+    rate_limit.record_failure("old", 60, 5, 300)
+    real = time.time
+    monkeypatch.setattr(time, "time", lambda: real() + 3600)
+    rate_limit.take("new", 5, 60)
+    c = rate_limit._conn()
+    assert c.execute("SELECT key FROM buckets").fetchall() == [("new",)]
+    assert c.execute("SELECT count(*) FROM failures").fetchone()[0] == 0
+
+
+def test_login_lockout_uses_the_shared_limiter(app, client, admin_user):
+    for _ in range(int(app.config["AUTH_THROTTLE_MAX_FAILS"])):
+        r = client.post("/login", data={"username": "admin", "password": "nope"})
+    assert "err=locked" in r.headers["Location"]
+    r = client.post("/login", data={"username": "admin", "password": "admin"})
+    assert "err=locked" in r.headers["Location"]
+    rate_limit.clear_all()
+    r = client.post("/login", data={"username": "admin", "password": "admin"})
+    assert "err=" not in r.headers.get("Location", "")
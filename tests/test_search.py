@@ -0,0 +1,162 @@
+# tests/test_search.py
+import pytest
+from sqlalchemy import select
+
+from models.base import session_scope
+from models.schema import ForumThread, ForumComment, Ticket, TicketComment
+from models.search_store import matches, search, snippet_html, ensure_search_index
+from models.users_db import create_user
+
+
+@pytest.fixture
+def users(client):
+    for u in ("alice", "bob"):
+        create_user(u, "pw", role="user")
+
+
+def _thread(s, title, body, **kw):
+    t = ForumThread(title=title, body=body, author_username="alice", **kw)
+    s.add(t)
+    s.flush()
+    return t.id
+
+
+def _ticket(s, title, body, requester="alice"):
+    t = Ticket(title=title, body=body, requester_username=requester)
+    s.add(t)
+    s.flush()
+    return t.id
+
+
+def _ids(model, q):
+    with session_scope() as s:
+        return set(s.execute(select(model.id).where(matches(model, q))).scalars())
+
+
+@pytest.mark.db
+def test_threads_match_title_body_and_visible_comments(users):
+    with session_scope() as s:
+        a = _thread(s, "Slurm queue stuck", "Jobs stay pending for hours")
+        b = _thread(s, "Conda environments", "How do I share one?")
+        s.add(ForumComment(thread_id=b, author_username="bob", body="Try mamba instead"))
+        s.add(ForumComment(thread_id=b, author_username="bob", body="secret walrus",
+                           is_deleted=True))
+
+    assert _ids(ForumThread, "slurm") == {a}
+    assert _ids(ForumThread, "pending") == {a}         # body, stemmed
+    assert _ids(ForumThread, "mamba") == {b}           # comment
+    assert _ids(ForumThread, "walrus") == set()        # deleted comment
+    assert _ids(ForumThread, "slurm -conda") == {a}
+
+    with session_scope() as s:
+        c = s.execute(select(ForumComment).where(ForumComment.thread_id == b)
+                      .order_by(ForumComment.id)).scalars().first()
+        c.is_deleted = True
+    assert _ids(ForumThread, "mamba") == set()
+
+    with session_scope() as s:
+        s.get(ForumThread, a).is_deleted = True
+    assert _ids(ForumThread, "pending") == set()       # body of a deleted thread
+    assert _ids(ForumThread, "slurm") == {a}           # title stays searchable
+
+
+@pytest.mark.db
+def test_ticket_internal_notes_are_not_indexed(users):
+    with session_scope() as s:
+        t = _ticket(s, "Quota request", "Need more scratch space")
+        s.add(TicketComment(ticket_id=t, author_username="bob", body="approved by finance"))
+        s.add(TicketComment(ticket_id=t, author_username="bob", body="vip customer",
+                            is_internal=True))
+    assert _ids(Ticket, "scratch") == {t}
+    assert _ids(Ticket, "finance") == {t}
+    assert _ids(Ticket, "vip") == set()
+
+
+@pytest.mark.db
+def test_ranking_keyset_paging_and_snippets(users):
+    with session_scope() as s:
+        in_body = _thread(s, "Unrelated", "the gpu nodes <b>reboot</b> nightly")
+        in_title = _thread(s, "GPU drivers", "nothing else here")
+        for i in range(5):
+            _thread(s, f"Filler {i}", "gpu")
+
+    with session_scope() as s:
+        hits, nxt = search(s, ForumThread, "gpu", limit=50)
+        ids = [t.id for t, _r, _snip in hits]
+        assert nxt is None and len(ids) == 7
+        assert ids.index(in_title) < ids.index(in_body)
+        snip = dict((t.id, snip) for t, _r, snip in hits)[in_body]
+        assert "<mark>gpu</mark>" in snip
+        assert "reboot" in snip and "<b>" not in snip
+
+        seen, after = [], None
+        while True:
+            page, after = search(s, ForumThread, "gpu", limit=3, after=after)
+            seen += [t.id for t, _r, _snip in page]
+            if after is None:
+                break
+        assert seen == ids
+
+        # a garbage cursor is ignored
+        assert len(search(s, ForumThread, "gpu", limit=3, after="nope")[0]) == 3
+
+    assert snippet_html("<b>⟦gpu⟧</b>") == "&lt;b&gt;<mark>gpu</mark>&lt;/b&gt;"
+    assert snippet_html(None) == ""
+    assert ensure_search_index() == {"forum_threads": 7, "forum_comments": 0,
+                                     "tickets": 0, "ticket_comments": 0}
+    assert _ids(ForumThread, "reboot") == {in_body}
+
+
+@pytest.mark.db
+def test_list_routes_search_and_respect_visibility(client, users):
+    with session_scope() as s:
+        _thread(s, "Storage full", "home directory quota exceeded")
+        mine = _ticket(s, "Scratch quota", "please raise my quota", requester="alice")
+        _ticket(s, "Other quota", "bob wants quota too", requester="bob")
+
+    r = client.get("/forum/?q=quota")
+    html = r.get_data(as_text=True)
+    assert r.status_code == 200
+    assert "Storage full" in html and "<mark>quota</mark>" in html
+    assert "Best match" in html
+
+    r = client.get("/forum/?q=quota&sort=latest_post")
+    assert "Storage full" in r.get_data(as_text=True)
+    assert "Storage full" not in client.get("/forum/?q=walrus").get_data(as_text=True)
+
+    client.post("/login", data={"username": "alice", "password": "pw"})
+    html = client.get("/tickets/?q=quota").get_data(as_text=True)
+    assert f"#{mine}</b>" in html and "Other quota" not in html
+    html = client.get("/tickets/?q=quota&sort=updated").get_data(as_text=True)
+    assert "Scratch quota" in html and "Other quota" not in html
+
+
+@pytest.mark.db
+def test_token_heavy_threads_index_per_comment(users):
+    import hashlib
+
+    # ~1.4 MB of distinct lexemes: more than one tsvector can hold
+    def _blob(i):
+        return " ".join(hashlib.sha1(f"{i}-{j}".encode()).hexdigest() for j in range(48))
+
+    with session_scope() as s:
+        tid = _thread(s, "Pasted job logs", "scheduler output below")
+        s.add_all(ForumComment(thread_id=tid, author_username="bob", body=_blob(i))
+                  for i in range(700))
+
+    needle = hashlib.sha1(b"650-7").hexdigest()
+    assert _ids(ForumThread, needle) == {tid}
+    with session_scope() as s:
+        s.add(ForumComment(thread_id=tid, author_username="bob", body="late walrus"))
+        s.get(ForumThread, tid).title = "Pasted job logs (solved)"
+        c = s.execute(select(ForumComment).where(ForumComment.thread_id == tid)
+                      .order_by(ForumComment.id)).scalars().first()
+        c.is_deleted = True
+    assert _ids(ForumThread, "walrus") == {tid}
+    assert _ids(ForumThread, "solved") == {tid}
+    assert _ids(ForumThread, hashlib.sha1(b"0-3").hexdigest()) == set()
+
+    with session_scope() as s:
+        hits, _ = search(s, ForumThread, "walrus", limit=5)
+        assert [t.id for t, _r, _snip in hits] == [tid]
+